@@ -0,0 +1,184 @@
+"""
+HTTP load benchmark for the chat API.
+
+Runs the API in-process with the same wiring as the test-suite (aiosqlite + fakeredis),
+drives every scenario at a fixed concurrency and reports latency percentiles and throughput.
+
+Usage (from the backend directory):
+
+    python -m benchmarks.http_load --concurrency 32 --requests 2000
+    python -m benchmarks.http_load --compare benchmarks/results/baseline.json --threshold 0.15
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sys
+import tempfile
+from datetime import datetime, timezone
+from time import perf_counter
+from typing import Any, Awaitable, Callable
+
+import fakeredis
+import httpx
+from asgi_lifespan import LifespanManager
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from src.database.models.base import Base
+from src.dependencies import admit_auth, admit_read, admit_write, limiter
+from tests.conftest import create_test_app
+
+from .stats import compare, print_table, read_results, summarize, write_results
+
+SCENARIOS = ("token", "send-message", "messages", "update-message")
+USERNAME = "benchmark"
+PASSWORD = "benchmark-password"
+
+Request = Callable[[httpx.AsyncClient, random.Random], Awaitable[httpx.Response]]
+
+
+def build_scenarios(access_token: str, seeded_ids: list[int]) -> dict[str, Request]:
+    headers = {"Authorization": f"Bearer {access_token}"}
+
+    async def token(client: httpx.AsyncClient, rng: random.Random) -> httpx.Response:
+        return await client.post("/api/token", data={"username": USERNAME, "password": PASSWORD})
+
+    async def send_message(client: httpx.AsyncClient, rng: random.Random) -> httpx.Response:
+        body = {"content": "benchmark", "created_at": datetime.now(timezone.utc).isoformat(), "created_by": USERNAME}
+        return await client.post("/api/send-message", json=body, headers=headers)
+
+    async def messages(client: httpx.AsyncClient, rng: random.Random) -> httpx.Response:
+        params = {"first_id": rng.choice(seeded_ids)} if rng.random() < 0.5 else {}
+        return await client.get("/api/messages", params=params, headers=headers)
+
+    async def update_message(client: httpx.AsyncClient, rng: random.Random) -> httpx.Response:
+        body = {"id": rng.choice(seeded_ids), "content": "benchmark edit"}
+        return await client.patch("/api/update-message", json=body, headers=headers)
+
+    return {
+        "token": token,
+        "send-message": send_message,
+        "messages": messages,
+        "update-message": update_message,
+    }
+
+
+async def run_scenario(
+    client: httpx.AsyncClient, request: Request, total: int, concurrency: int, seed: int
+) -> dict[str, float]:
+    latencies: list[float] = []
+    errors = 0
+    remaining = total
+
+    async def worker(worker_id: int) -> None:
+        nonlocal errors, remaining
+        rng = random.Random(seed + worker_id)
+        while remaining > 0:
+            remaining -= 1
+            start = perf_counter()
+            response = await request(client, rng)
+            latencies.append(perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    start = perf_counter()
+    await asyncio.gather(*(worker(worker_id) for worker_id in range(concurrency)))
+    return summarize(latencies, perf_counter() - start, errors)
+
+
+async def run(args: argparse.Namespace) -> dict[str, dict[str, float]]:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(tmp_dir, 'benchmark.db')}")
+        session_factory = async_sessionmaker(bind=engine, autocommit=False, autoflush=False)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+        # Match the production client, which decodes responses to str.
+        redis_connection = fakeredis.FakeAsyncRedis(decode_responses=True)
+        app = create_test_app(redis_connection, session_factory)
+        # The per-client rate limit would turn the benchmark into a 429 benchmark.
+        app.dependency_overrides[limiter] = lambda: None
+        # So would admission control: measure latency, not load shedding.
+        for admit in (admit_auth, admit_read, admit_write):
+            app.dependency_overrides[admit] = lambda: None
+
+        try:
+            async with LifespanManager(app) as manager:
+                transport = httpx.ASGITransport(app=manager.app)
+                async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                    await client.post("/api/sign-up", json={"username": USERNAME, "password": PASSWORD})
+                    token_response = await client.post("/api/token", data={"username": USERNAME, "password": PASSWORD})
+                    access_token = token_response.json()["access_token"]
+
+                    seeded_ids = []
+                    for _ in range(args.seed_messages):
+                        response = await client.post(
+                            "/api/send-message",
+                            json={
+                                "content": "seed",
+                                "created_at": datetime.now(timezone.utc).isoformat(),
+                                "created_by": USERNAME,
+                            },
+                            headers={"Authorization": f"Bearer {access_token}"},
+                        )
+                        seeded_ids.append(response.json()["id"])
+
+                    scenarios = build_scenarios(access_token, seeded_ids)
+                    results = {}
+                    for name in args.scenarios:
+                        results[name] = await run_scenario(
+                            client, scenarios[name], args.requests, args.concurrency, args.seed
+                        )
+        finally:
+            await redis_connection.aclose()
+            await engine.dispose()
+
+    return results
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=16, help="number of concurrent clients")
+    parser.add_argument("--requests", type=int, default=1000, help="requests per scenario")
+    parser.add_argument("--seed-messages", type=int, default=200, help="messages created before measuring")
+    parser.add_argument("--seed", type=int, default=0, help="random seed for request parameters")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--output", default="benchmarks/results/http_load.json", help="JSON file for results")
+    parser.add_argument("--compare", help="baseline JSON file; exit with status 1 on regression")
+    parser.add_argument("--threshold", type=float, default=0.1, help="allowed regression as a fraction")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    # Read the baseline up front: it may be the same file the results are written to.
+    baseline = read_results(args.compare) if args.compare else None
+    # Failed requests are counted as errors; their tracebacks would drown the report.
+    logging.getLogger("src").setLevel(logging.CRITICAL)
+    results = asyncio.run(run(args))
+    print_table(results)
+
+    meta: dict[str, Any] = {
+        "benchmark": "http_load",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "concurrency": args.concurrency,
+        "requests": args.requests,
+        "seed_messages": args.seed_messages,
+        "seed": args.seed,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    write_results(args.output, meta, results)
+
+    if baseline is not None:
+        regressions = compare(baseline, results, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+import json
+import math
+from typing import Any, Sequence
+
+
+def percentile(sorted_values: Sequence[float], q: float) -> float:
+    """
+    Nearest-rank percentile of already sorted values, ``q`` in [0, 100].
+    """
+
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(latencies: Sequence[float], elapsed: float, errors: int = 0) -> dict[str, float]:
+    """
+    Summarize latencies given in seconds into milliseconds percentiles and throughput.
+    """
+
+    ordered = sorted(latencies)
+    return {
+        "requests": len(ordered),
+        "errors": errors,
+        "error_rate": errors / len(ordered) if ordered else 0.0,
+        "rps": len(ordered) / elapsed if elapsed > 0 else 0.0,
+        "p50_ms": percentile(ordered, 50) * 1000,
+        "p95_ms": percentile(ordered, 95) * 1000,
+        "p99_ms": percentile(ordered, 99) * 1000,
+        "max_ms": (ordered[-1] if ordered else 0.0) * 1000,
+    }
+
+
+def compare(
+    baseline: dict[str, dict[str, float]],
+    current: dict[str, dict[str, float]],
+    threshold: float,
+    latency_keys: Sequence[str] = ("p50_ms", "p95_ms", "p99_ms"),
+    throughput_keys: Sequence[str] = ("rps",),
+    error_keys: Sequence[str] = ("error_rate",),
+) -> list[str]:
+    """
+    Return a description of every metric that regressed past ``threshold`` (a fraction, e.g. 0.1).
+    Latencies regress when they grow, throughput regresses when it drops.
+    Errors regress when they grow, from zero too: a change that fails fast would otherwise pass for faster.
+    Scenarios present in only one of the runs are ignored.
+    """
+
+    regressions = []
+    for scenario, result in current.items():
+        base = baseline.get(scenario)
+        if base is None:
+            continue
+        for key in latency_keys:
+            if key in base and base[key] > 0 and result[key] > base[key] * (1 + threshold):
+                regressions.append(f"{scenario}.{key}: {base[key]:.2f} -> {result[key]:.2f}")
+        for key in throughput_keys:
+            if key in base and base[key] > 0 and result[key] < base[key] * (1 - threshold):
+                regressions.append(f"{scenario}.{key}: {base[key]:.2f} -> {result[key]:.2f}")
+        for key in error_keys:
+            if key in base and result[key] > base[key] * (1 + threshold):
+                regressions.append(f"{scenario}.{key}: {base[key]:.4f} -> {result[key]:.4f}")
+    return regressions
+
+
+def print_table(results: dict[str, dict[str, float]]) -> None:
+    if not results:
+        return
+    columns = list(next(iter(results.values())))
+    widths = [max(14, len(column) + 2) for column in columns]
+    print(f"{'scenario':<24}" + "".join(f"{column:>{width}}" for column, width in zip(columns, widths)))
+    for scenario, result in results.items():
+        print(f"{scenario:<24}" + "".join(f"{result[column]:>{width}.2f}" for column, width in zip(columns, widths)))
+
+
+def write_results(path: str, meta: dict[str, Any], results: dict[str, dict[str, float]]) -> None:
+    with open(path, "w") as file:
+        json.dump({"meta": meta, "results": results}, file, indent=2)
+
+
+def read_results(path: str) -> dict[str, dict[str, float]]:
+    with open(path) as file:
+        return json.load(file)["results"]  # type: ignore[no-any-return]
@@ -0,0 +1,298 @@
+"""
+WebSocket fan-out benchmark for ConnectionManager.
+
+Attaches thousands of in-process fake WebSocket peers to a fresh ConnectionManager, injects chat
+frames at a fixed rate and measures delivery latency, CPU time per injected message, memory
+per connection and egress bytes. Scenarios cover healthy peers, slow and stalled peers and
+connect/disconnect churn; a share of the peers can negotiate the binary MessagePack subprotocol.
+
+Usage (from the backend directory):
+
+    python -m benchmarks.ws_fanout --clients 10000 --messages 200 --rate 50
+    python -m benchmarks.ws_fanout --scenarios slow stalled --slow-fraction 0.05
+    python -m benchmarks.ws_fanout --scenarios baseline --msgpack-fraction 1
+    python -m benchmarks.ws_fanout --scenarios baseline --rate 500 --batch-window 0.05
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from time import perf_counter, process_time
+from typing import Any, Iterator
+
+import msgpack
+
+from src.core.connection_manager import ConnectionManager
+from src.core.ws_protocol import MSGPACK_PROTOCOL
+from src.schemas.message import DEFAULT_ROOM
+
+from .stats import compare, percentile, print_table, read_results, write_results
+
+SCENARIOS = ("baseline", "slow", "stalled", "churn")
+
+
+class Recorder:
+    """
+    Shared sink for every delivery, so peers stay small and no per-peer bookkeeping skews memory.
+    """
+
+    def __init__(self) -> None:
+        self.sent_at: dict[str | bytes, float] = {}
+        self.latencies: list[float] = []
+        self.egress_bytes = 0
+        self.frames = 0
+        # Batched frame -> send times of the messages in it, decoded once rather than per peer
+        self.batches: dict[str | bytes, list[float]] = {}
+
+    def deliver(self, data: str | bytes) -> None:
+        # Frames are ASCII JSON, so the text length is the UTF-8 length.
+        self.egress_bytes += len(data)
+        self.frames += 1
+        now = perf_counter()
+        sent_at = self.sent_at.get(data)
+        if sent_at is not None:
+            self.latencies.append(now - sent_at)
+            return
+        batch = self.batches.get(data)
+        if batch is None:
+            batch = self.batches[data] = self._batch_sent_at(data)
+        self.latencies.extend(now - sent_at for sent_at in batch)
+
+    def _batch_sent_at(self, data: str | bytes) -> list[float]:
+        if isinstance(data, bytes):
+            messages = msgpack.unpackb(data)
+            keys: list[str | bytes] = (
+                [msgpack.packb(message) for message in messages] if isinstance(messages, list) else []
+            )
+        else:
+            messages = json.loads(data) if data.startswith("[") else None
+            keys = [json.dumps(message) for message in messages] if isinstance(messages, list) else []
+        return [self.sent_at[key] for key in keys if key in self.sent_at]
+
+
+class FakeWebSocket:
+    """
+    The subset of starlette's WebSocket used by ConnectionManager.
+    A positive ``delay`` makes the peer slow; ``stalled`` makes every send block forever,
+    like a client whose TCP window never opens again.
+    """
+
+    def __init__(self, recorder: Recorder, delay: float = 0.0, stalled: bool = False, binary: bool = False) -> None:
+        self.recorder = recorder
+        self.delay = delay
+        self.stalled = stalled
+        self.binary = binary
+
+    async def accept(self, subprotocol: str | None = None) -> None:
+        return None
+
+    async def close(self, code: int = 1000, reason: str | None = None) -> None:
+        return None
+
+    async def send_text(self, data: str) -> None:
+        await self._send(data)
+
+    async def send_bytes(self, data: bytes) -> None:
+        await self._send(data)
+
+    async def _send(self, data: str | bytes) -> None:
+        if self.stalled:
+            await asyncio.Event().wait()
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.recorder.deliver(data)
+
+
+@contextmanager
+def roster_broadcasts_suppressed(manager: ConnectionManager) -> Iterator[None]:
+    """
+    Bulk attaching N peers one by one would send O(N^2) roster frames before the measurement starts.
+    """
+
+    original = manager.broadcast_userlist
+
+    async def noop(room: str = DEFAULT_ROOM) -> None:
+        return None
+
+    manager.broadcast_userlist = noop  # type: ignore[method-assign]
+    try:
+        yield
+    finally:
+        manager.broadcast_userlist = original  # type: ignore[method-assign]
+
+
+def build_peers(args: argparse.Namespace, scenario: str, recorder: Recorder) -> list[FakeWebSocket]:
+    peers = []
+    for index in range(args.clients):
+        slow = scenario == "slow" and index % round(1 / args.slow_fraction) == 0
+        stalled = scenario == "stalled" and index % round(1 / args.stalled_fraction) == 0
+        binary = index < args.clients * args.msgpack_fraction
+        peers.append(FakeWebSocket(recorder, delay=args.slow_delay if slow else 0.0, stalled=stalled, binary=binary))
+    return peers
+
+
+async def attach(manager: ConnectionManager, peers: list[FakeWebSocket]) -> float:
+    """
+    Connect every peer and return the bytes the manager allocates per connection.
+    The fake sockets themselves are created beforehand and are not counted.
+    """
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    with roster_broadcasts_suppressed(manager):
+        for index, peer in enumerate(peers):
+            subprotocol = MSGPACK_PROTOCOL if peer.binary else None
+            await manager.connect(peer, f"user{index}", subprotocol=subprotocol)  # type: ignore[arg-type]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / len(peers) if peers else 0.0
+
+
+async def churn(manager: ConnectionManager, recorder: Recorder, rate: float, stop: asyncio.Event) -> int:
+    """
+    Connect a new peer and disconnect it again ``rate`` times per second until stopped.
+    """
+
+    cycles = 0
+    while not stop.is_set():
+        peer = FakeWebSocket(recorder)
+        await manager.connect(peer, f"churn{cycles}")  # type: ignore[arg-type]
+        await manager.disconnect(peer)  # type: ignore[arg-type]
+        cycles += 1
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=1 / rate)
+        except TimeoutError:
+            pass
+    return cycles
+
+
+async def run_scenario(args: argparse.Namespace, scenario: str) -> dict[str, float]:
+    manager = ConnectionManager(
+        presence_window=args.presence_window,
+        batch_window=args.batch_window,
+        batch_rate_threshold=args.batch_threshold,
+    )
+    recorder = Recorder()
+    peers = build_peers(args, scenario, recorder)
+    bytes_per_connection = await attach(manager, peers)
+
+    stop_churn = asyncio.Event()
+    churn_task = None
+    if scenario == "churn":
+        churn_task = asyncio.create_task(churn(manager, recorder, args.churn_rate, stop_churn))
+
+    interval = 1 / args.rate
+    broadcasts = []
+    cpu_start = process_time()
+    wall_start = perf_counter()
+    for seq in range(args.messages):
+        message = {"id": seq, "content": "benchmark", "created_by": "benchmark"}
+        payload = json.dumps(message)
+        recorder.sent_at[payload] = recorder.sent_at[msgpack.packb(message)] = perf_counter()
+        broadcasts.append(asyncio.create_task(manager.broadcast(payload)))
+        next_at = wall_start + (seq + 1) * interval
+        await asyncio.sleep(max(0.0, next_at - perf_counter()))
+
+    done, pending = await asyncio.wait(broadcasts, timeout=args.drain_timeout)
+    # Batched messages are still queued when their broadcast() returns.
+    await manager.drain(args.drain_timeout)
+    wall_elapsed = perf_counter() - wall_start
+    cpu_elapsed = process_time() - cpu_start
+    for task in pending:
+        task.cancel()
+    stop_churn.set()
+    churn_cycles = await churn_task if churn_task else 0
+
+    latencies = sorted(recorder.latencies)
+    expected = args.messages * len(peers)
+    return {
+        "clients": len(peers),
+        "messages": args.messages,
+        "delivered": len(latencies),
+        "undelivered": expected - len(latencies),
+        "incomplete_broadcasts": len(pending),
+        "churn_cycles": churn_cycles,
+        "deliveries_per_s": len(latencies) / wall_elapsed if wall_elapsed > 0 else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "max_ms": (latencies[-1] if latencies else 0.0) * 1000,
+        "cpu_per_message_ms": cpu_elapsed / args.messages * 1000 if args.messages else 0.0,
+        "bytes_per_connection": bytes_per_connection,
+        "egress_bytes_per_message": recorder.egress_bytes / args.messages if args.messages else 0.0,
+        "frames_per_message": recorder.frames / args.messages if args.messages else 0.0,
+    }
+
+
+async def run(args: argparse.Namespace) -> dict[str, dict[str, float]]:
+    return {scenario: await run_scenario(args, scenario) for scenario in args.scenarios}
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=10000, help="simulated WebSocket peers")
+    parser.add_argument("--messages", type=int, default=100, help="chat frames injected per scenario")
+    parser.add_argument("--rate", type=float, default=50, help="injected frames per second")
+    parser.add_argument("--slow-fraction", type=float, default=0.01, help="share of slow peers in 'slow'")
+    parser.add_argument("--slow-delay", type=float, default=0.05, help="seconds a slow peer takes per frame")
+    parser.add_argument("--stalled-fraction", type=float, default=0.001, help="share of stalled peers in 'stalled'")
+    parser.add_argument("--churn-rate", type=float, default=200, help="connect/disconnect cycles per second")
+    parser.add_argument("--msgpack-fraction", type=float, default=0.0, help="share of peers speaking MessagePack")
+    parser.add_argument("--batch-window", type=float, default=0.0, help="adaptive batching window in seconds")
+    parser.add_argument("--batch-threshold", type=float, default=20, help="room messages per second to batch above")
+    parser.add_argument("--presence-window", type=float, default=0.5, help="roster coalescing window in seconds")
+    parser.add_argument("--drain-timeout", type=float, default=30, help="seconds to wait for broadcasts to finish")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--output", default="benchmarks/results/ws_fanout.json", help="JSON file for results")
+    parser.add_argument("--compare", help="baseline JSON file; exit with status 1 on regression")
+    parser.add_argument("--threshold", type=float, default=0.1, help="allowed regression as a fraction")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    baseline = read_results(args.compare) if args.compare else None
+    logging.getLogger("src").setLevel(logging.CRITICAL)
+    results = asyncio.run(run(args))
+    print_table(results)
+
+    meta: dict[str, Any] = {
+        "benchmark": "ws_fanout",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        **{key: value for key, value in vars(args).items() if key not in ("output", "compare", "threshold")},
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    write_results(args.output, meta, results)
+
+    if baseline is not None:
+        regressions = compare(
+            baseline,
+            results,
+            args.threshold,
+            latency_keys=(
+                "p50_ms",
+                "p95_ms",
+                "p99_ms",
+                "cpu_per_message_ms",
+                "bytes_per_connection",
+                "egress_bytes_per_message",
+                "frames_per_message",
+            ),
+            throughput_keys=("deliveries_per_s",),
+            error_keys=("undelivered",),
+        )
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,30 @@
+"""add message room
+
+Revision ID: 3f9c2a7b1e4d
+Revises: d603de1ed05e
+Create Date: 2026-10-19 10:12:43.518220
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "3f9c2a7b1e4d"
+down_revision: Union[str, Sequence[str], None] = "d603de1ed05e"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("messages", sa.Column("room", sa.String(), server_default="general", nullable=False))
+    op.create_index("ix_messages_room_id", "messages", ["room", "id"], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_messages_room_id", table_name="messages")
+    op.drop_column("messages", "room")
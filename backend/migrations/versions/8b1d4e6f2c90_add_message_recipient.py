@@ -0,0 +1,30 @@
+"""add message recipient
+
+Revision ID: 8b1d4e6f2c90
+Revises: 3f9c2a7b1e4d
+Create Date: 2026-10-19 11:02:17.904311
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "8b1d4e6f2c90"
+down_revision: Union[str, Sequence[str], None] = "3f9c2a7b1e4d"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("messages", sa.Column("recipient", sa.String(), nullable=True))
+    op.create_index("ix_messages_recipient_created_by_id", "messages", ["recipient", "created_by", "id"], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_messages_recipient_created_by_id", table_name="messages")
+    op.drop_column("messages", "recipient")
@@ -0,0 +1,28 @@
+"""add user is_admin
+
+Revision ID: a9d4c6e2f713
+Revises: f1b8d3a6c924
+Create Date: 2026-10-19 21:12:40.518306
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "a9d4c6e2f713"
+down_revision: Union[str, Sequence[str], None] = "f1b8d3a6c924"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("users", sa.Column("is_admin", sa.Boolean(), server_default=sa.false(), nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("users", "is_admin")
@@ -0,0 +1,44 @@
+"""add message revision and tombstones
+
+Revision ID: c45e9a1d7b02
+Revises: 8b1d4e6f2c90
+Create Date: 2026-10-19 14:36:52.120845
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "c45e9a1d7b02"
+down_revision: Union[str, Sequence[str], None] = "8b1d4e6f2c90"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("messages", sa.Column("revision", sa.BigInteger(), nullable=True))
+    op.add_column("messages", sa.Column("deleted_at", sa.DateTime(timezone=True), nullable=True))
+    # Existing messages get their id as revision; the sequence continues after the largest one.
+    op.execute("UPDATE messages SET revision = id")
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute(sa.schema.CreateSequence(sa.Sequence("messages_revision_seq")))
+        op.execute(
+            "SELECT setval('messages_revision_seq', (SELECT coalesce(max(revision), 0) + 1 FROM messages), false)"
+        )
+    op.alter_column("messages", "revision", nullable=False)
+    op.create_index("ix_messages_room_revision", "messages", ["room", "revision"], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_messages_room_revision", table_name="messages")
+    # Tombstones have no content to restore.
+    op.execute("DELETE FROM messages WHERE deleted_at IS NOT NULL")
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute(sa.schema.DropSequence(sa.Sequence("messages_revision_seq")))
+    op.drop_column("messages", "deleted_at")
+    op.drop_column("messages", "revision")
@@ -0,0 +1,29 @@
+"""add message created_at index
+
+Revision ID: e7a2f5c31b86
+Revises: c45e9a1d7b02
+Create Date: 2026-10-19 16:12:40.518327
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e7a2f5c31b86"
+down_revision: Union[str, Sequence[str], None] = "c45e9a1d7b02"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # BRIN on Postgres: created_at grows with the physical row order, so block range summaries stay tiny.
+    # Other dialects ignore postgresql_using and build a B-tree.
+    op.create_index("ix_messages_created_at", "messages", ["created_at"], unique=False, postgresql_using="brin")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_messages_created_at", table_name="messages")
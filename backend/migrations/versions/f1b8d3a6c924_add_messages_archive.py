@@ -0,0 +1,51 @@
+"""add messages archive
+
+Revision ID: f1b8d3a6c924
+Revises: e7a2f5c31b86
+Create Date: 2026-10-19 17:25:03.664190
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "f1b8d3a6c924"
+down_revision: Union[str, Sequence[str], None] = "e7a2f5c31b86"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "messages_archive",
+        sa.Column("id", sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column("content", sa.String(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("created_by", sa.String(), nullable=False),
+        sa.Column("room", sa.String(), server_default="general", nullable=False),
+        sa.Column("recipient", sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_messages_archive_id"), "messages_archive", ["id"], unique=False)
+    op.create_index("ix_messages_archive_room_id", "messages_archive", ["room", "id"], unique=False)
+    op.create_index(
+        "ix_messages_archive_created_at", "messages_archive", ["created_at"], unique=False, postgresql_using="brin"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Archived messages go back to the live table before the archive is dropped.
+    op.execute(
+        "INSERT INTO messages (id, content, created_at, updated_at, created_by, room, recipient, revision) "
+        "SELECT id, content, created_at, updated_at, created_by, room, recipient, id FROM messages_archive"
+    )
+    op.drop_index("ix_messages_archive_created_at", table_name="messages_archive")
+    op.drop_index("ix_messages_archive_room_id", table_name="messages_archive")
+    op.drop_index(op.f("ix_messages_archive_id"), table_name="messages_archive")
+    op.drop_table("messages_archive")
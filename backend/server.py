@@ -1,11 +1,11 @@
 import logging
-from logging.config import fileConfig
 from os import path
 
 from src.app import app
+from src.core.logging_setup import configure_logging
 
 logging_config_file_path = path.join(path.dirname(path.abspath(__file__)), "logging_config.ini")
-fileConfig(logging_config_file_path, disable_existing_loggers=False)
+configure_logging(logging_config_file_path)
 logger = logging.getLogger(__name__)
 logger.debug("Server module imported; logging configured")
 
@@ -13,4 +13,5 @@ logger.debug("Server module imported; logging configured")
 if __name__ == "__main__":
     import uvicorn
 
-    uvicorn.run(app=app, port=8000, reload=True)
+    # Logging is configured above; uvicorn's own config would put synchronous handlers back on its loggers.
+    uvicorn.run(app=app, port=8000, reload=True, log_config=None)
@@ -1,3 +1,4 @@
+import asyncio
 import logging
 from contextlib import asynccontextmanager
 from datetime import datetime, timezone
@@ -5,24 +6,55 @@ from typing import Any, AsyncGenerator
 
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.responses import JSONResponse
 from fastapi_limiter import FastAPILimiter
 
+from .core.connection_manager import manager
+from .core.loop_monitor import LoopMonitor
+from .core.message_stream import MessageStream, consumer_name
+from .core.metrics import MetricsMiddleware
 from .core.redis_client import get_redis_connection
+from .core.retention import run_retention
+from .core.tracing import FileSpanExporter, TracingMiddleware
+from .database.db import SessionLocal, get_max_message_id
 from .exceptions import AuthenticationError, ChangingPasswordError, DuplicateUserError
+from .routes.admin import router as admin_router
 from .routes.chat import router
+from .routes.metrics import router as metrics_router
+from .schemas.config import settings
 
 logger = logging.getLogger(__name__)
 loggerChat = logging.getLogger("src.chat")
 
+span_exporter = FileSpanExporter(settings.TRACE_EXPORT_PATH) if settings.TRACE_EXPORT_PATH else None
+
 
 @asynccontextmanager
 async def lifespan(_: FastAPI) -> AsyncGenerator[None, Any]:
     logger.info("Initializing rate limiter")
     await FastAPILimiter.init(get_redis_connection())
+    tasks = [asyncio.create_task(manager.run_reaper())]
+    if settings.LOOP_LAG_INTERVAL > 0:
+        tasks.append(asyncio.create_task(LoopMonitor().run()))
+    if settings.MESSAGE_LOG_MODE == "stream":
+        logger.info("Starting message stream fan-out and persister")
+        stream = MessageStream(get_redis_connection())
+        async with SessionLocal() as session:
+            await stream.seed_ids(await get_max_message_id(session))
+        tasks.append(asyncio.create_task(stream.tail(manager.deliver)))
+        tasks.append(asyncio.create_task(stream.persist(SessionLocal, consumer_name())))
+    if settings.MESSAGE_RETENTION_DAYS > 0:
+        logger.info(f"Archiving messages older than {settings.MESSAGE_RETENTION_DAYS} days")
+        tasks.append(asyncio.create_task(run_retention(SessionLocal)))
     yield
+    for task in tasks:
+        task.cancel()
+    await manager.shutdown()
     logger.info("Closing rate limiter")
     await FastAPILimiter.close()
+    if span_exporter:
+        span_exporter.shutdown()
 
 
 app = FastAPI(lifespan=lifespan)
@@ -70,6 +102,8 @@ async def changing_password_error_handler(request: Request, exc: ChangingPasswor
     )
 
 
+# Message pages are compressed once, in the cache; the middleware passes responses with a Content-Encoding through.
+app.add_middleware(GZipMiddleware, minimum_size=settings.COMPRESS_MIN_BYTES, compresslevel=settings.COMPRESS_LEVEL)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:5173", "http://localhost:5174", "http://localhost:3000"],
@@ -77,5 +111,10 @@ app.add_middleware(
     allow_methods=["GET", "POST", "DELETE", "PATCH"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
+# Outermost, so the trace covers the other middleware as well.
+app.add_middleware(TracingMiddleware, exporter=span_exporter)
 
 app.include_router(router, prefix="/api")
+app.include_router(admin_router, prefix="/api")
+app.include_router(metrics_router)
@@ -0,0 +1,68 @@
+import asyncio
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from time import perf_counter
+
+from ..exceptions import ServiceOverloadedError
+from ..schemas.config import settings
+from .metrics import ADMISSION_QUEUE_WAIT, ADMISSION_REJECTED
+
+
+class AdmissionGate:
+    """
+    Caps the requests of one budget in flight. Requests over the cap wait in a bounded queue for up to
+    queue_timeout seconds; a full queue or a timed out wait fails fast with 503, so an overloaded worker sheds
+    load instead of letting every request wait on the database pool. A limit of 0 admits everything.
+    """
+
+    def __init__(
+        self,
+        budget: str,
+        limit: int,
+        queue_size: int = settings.ADMISSION_QUEUE_SIZE,
+        queue_timeout: float = settings.ADMISSION_QUEUE_TIMEOUT,
+        retry_after: int = settings.ADMISSION_RETRY_AFTER,
+    ) -> None:
+        self.budget = budget
+        self.limit = limit
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.waiting = 0
+        self._slots = asyncio.Semaphore(max(limit, 1))
+
+    def _reject(self, reason: str) -> ServiceOverloadedError:
+        ADMISSION_REJECTED.inc(budget=self.budget, reason=reason)
+        return ServiceOverloadedError(self.retry_after)
+
+    @asynccontextmanager
+    async def admit(self) -> AsyncIterator[None]:
+        if self.limit <= 0:
+            yield
+            return
+
+        if self._slots.locked():
+            if self.waiting >= self.queue_size:
+                raise self._reject("queue_full")
+            self.waiting += 1
+            start = perf_counter()
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+            except TimeoutError:
+                raise self._reject("queue_timeout") from None
+            finally:
+                self.waiting -= 1
+                ADMISSION_QUEUE_WAIT.observe(perf_counter() - start, budget=self.budget)
+        else:
+            await self._slots.acquire()
+
+        try:
+            yield
+        finally:
+            self._slots.release()
+
+
+# Separate budgets, so a flood of logins (bcrypt) or writes cannot starve reads, and the other way round.
+auth_gate = AdmissionGate("auth", settings.ADMISSION_AUTH_LIMIT)
+write_gate = AdmissionGate("writes", settings.ADMISSION_WRITE_LIMIT)
+read_gate = AdmissionGate("reads", settings.ADMISSION_READ_LIMIT)
@@ -0,0 +1,461 @@
+import asyncio
+import json
+import logging
+import math
+import sys
+from dataclasses import dataclass, field
+from time import monotonic, perf_counter
+from typing import Any
+
+from fastapi import WebSocket, status
+
+from ..schemas.config import settings
+from ..schemas.message import DEFAULT_ROOM
+from .metrics import (
+    WS_ACTIVE_CONNECTIONS,
+    WS_BATCH_SIZE,
+    WS_BROADCAST_DURATION,
+    WS_EVICTIONS,
+    WS_RECLAIMED_BYTES,
+    WS_REJECTED_FRAMES,
+)
+from .rate_meter import RateMeter
+from .replay_buffer import ReplayBuffer
+from .token_bucket import TokenBucket
+from .ws_protocol import MSGPACK_PROTOCOL, EncodedFrame
+
+logger = logging.getLogger(__name__)
+
+PING_FRAME = json.dumps({"type": "ping"})
+PING = EncodedFrame(PING_FRAME)
+PONG_FRAMES = frozenset({'{"type":"pong"}', '{"type": "pong"}'})
+
+REPLAY_GAP_TYPE = "replay_gap"
+
+HEARTBEAT_TIMEOUT_CLOSE_CODE = 4408
+CLOSE_TIMEOUT = 1.0
+
+
+def direct_recipient(data: str) -> str | None:
+    """
+    Return the recipient of a direct message frame, or None for a room frame.
+    Only frames mentioning a recipient are parsed, so room traffic stays a plain substring check.
+    """
+
+    if '"recipient"' not in data:
+        return None
+    try:
+        payload = json.loads(data)
+    except ValueError:
+        return None
+    recipient = payload.get("recipient") if isinstance(payload, dict) else None
+    return recipient if isinstance(recipient, str) else None
+
+
+def with_sender(data: str, sender: str) -> str:
+    """
+    The direct message frame with created_by set to the authenticated sender, so it cannot be spoofed.
+    """
+
+    return json.dumps({**json.loads(data), "created_by": sender})
+
+
+def message_id(data: str) -> int | None:
+    """
+    Return the id of a persisted chat message frame, or None for frames without one.
+    """
+
+    if '"id"' not in data:
+        return None
+    try:
+        payload = json.loads(data)
+    except ValueError:
+        return None
+    value = payload.get("id") if isinstance(payload, dict) else None
+    return value if isinstance(value, int) and not isinstance(value, bool) else None
+
+
+def frame_payload(data: str) -> Any:
+    """
+    The decoded frame to embed in a batch array; frames that are not JSON are embedded as strings.
+    """
+
+    try:
+        return json.loads(data)
+    except ValueError:
+        return data
+
+
+@dataclass(slots=True)
+class ConnectionState:
+    username: str
+    room: str
+    bucket: TokenBucket
+    last_seen: float = field(default_factory=monotonic)
+    # Negotiated MessagePack subprotocol: frames go out as binary instead of JSON text
+    binary: bool = False
+
+
+class ConnectionManager:
+    def __init__(
+        self,
+        presence_window: float = settings.PRESENCE_FLUSH_WINDOW,
+        heartbeat_interval: float = settings.WS_HEARTBEAT_INTERVAL,
+        heartbeat_timeout: float = settings.WS_HEARTBEAT_TIMEOUT,
+        rate_limit: float = settings.WS_RATE_LIMIT,
+        rate_burst: int = settings.WS_RATE_BURST,
+        max_frame_bytes: int = settings.WS_MAX_FRAME_BYTES,
+        limit_action: str = settings.WS_LIMIT_ACTION,
+        replay_buffer_size: int = settings.WS_REPLAY_BUFFER_SIZE,
+        batch_window: float = settings.WS_BATCH_WINDOW,
+        batch_rate_threshold: float = settings.WS_BATCH_RATE_THRESHOLD,
+        send_timeout: float = settings.WS_SEND_TIMEOUT,
+    ) -> None:
+        self.activate_connections: dict[WebSocket, ConnectionState] = {}
+        # room -> sockets in it (a dict as an insertion-ordered set, so the roster keeps join order),
+        # so fan-out cost is proportional to the room size
+        self.rooms: dict[str, dict[WebSocket, None]] = {}
+        # username -> that user's sockets (one per open tab), for direct messages
+        self.users: dict[str, dict[WebSocket, None]] = {}
+        self.presence_window = presence_window
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.rate_limit = rate_limit
+        self.rate_burst = rate_burst
+        self.max_frame_bytes = max_frame_bytes
+        self.limit_action = limit_action
+        self.replay_buffer_size = replay_buffer_size
+        # room -> recent frames of the rooms with sockets on this node; dropped with the room's last socket
+        self.replay_buffers: dict[str, ReplayBuffer] = {}
+        self.batch_window = batch_window
+        self.batch_rate_threshold = batch_rate_threshold
+        self.send_timeout = send_timeout
+        self._room_rates: dict[str, RateMeter] = {}
+        self._pending_batches: dict[str, list[Any]] = {}
+        self._batch_flushes: dict[str, asyncio.Task[None]] = {}
+        self._last_userlist_at: dict[str, float] = {}
+        self._pending_userlist: dict[str, asyncio.Task[None]] = {}
+
+    async def connect(
+        self,
+        websocket: WebSocket,
+        username: str,
+        room: str = DEFAULT_ROOM,
+        last_seen_id: int | None = None,
+        subprotocol: str | None = None,
+    ) -> None:
+        """
+        Register the socket in its room. With ``last_seen_id`` every buffered frame of the room
+        after that id is replayed first, or a replay_gap frame is sent if the buffer does not
+        reach back that far and the client has to refetch history over HTTP.
+        """
+
+        await websocket.accept(subprotocol=subprotocol)
+        self.activate_connections[websocket] = ConnectionState(
+            username=username,
+            room=room,
+            bucket=TokenBucket(rate=self.rate_limit, capacity=self.rate_burst),
+            binary=subprotocol == MSGPACK_PROTOCOL,
+        )
+        self.rooms.setdefault(room, {})[websocket] = None
+        self.users.setdefault(username, {})[websocket] = None
+        WS_ACTIVE_CONNECTIONS.set(len(self.activate_connections))
+        if last_seen_id is not None:
+            # Snapshot before the first await: anything broadcast from here on is delivered live.
+            replay = self._replay_since(room, last_seen_id)
+            if replay is None:
+                gap = EncodedFrame.from_payload({"type": REPLAY_GAP_TYPE, "last_seen_id": last_seen_id})
+                await self._send(websocket, gap)
+            else:
+                for frame in replay:
+                    await self._send(websocket, EncodedFrame(frame))
+        await self.schedule_userlist(room)
+
+    def _replay_since(self, room: str, last_seen_id: int) -> list[str] | None:
+        buffer = self.replay_buffers.get(room)
+        return buffer.since(last_seen_id) if buffer is not None else None
+
+    def _remember(self, room: str, message: str, frame_id: int) -> None:
+        if self.replay_buffer_size <= 0 or room not in self.rooms:
+            return
+        buffer = self.replay_buffers.get(room)
+        if buffer is None:
+            buffer = self.replay_buffers[room] = ReplayBuffer(self.replay_buffer_size)
+        buffer.append(frame_id, message)
+
+    async def disconnect(self, websocket: WebSocket) -> None:
+        # The socket may already have been evicted by the reaper.
+        state = self._remove(websocket)
+        if state is not None:
+            await self.schedule_userlist(state.room)
+
+    def _remove(self, websocket: WebSocket) -> ConnectionState | None:
+        state = self.activate_connections.pop(websocket, None)
+        if state is None:
+            return None
+        members = self.rooms[state.room]
+        members.pop(websocket, None)
+        if not members:
+            del self.rooms[state.room]
+            self._last_userlist_at.pop(state.room, None)
+            self._room_rates.pop(state.room, None)
+            self.replay_buffers.pop(state.room, None)
+        sockets = self.users[state.username]
+        sockets.pop(websocket, None)
+        if not sockets:
+            del self.users[state.username]
+        WS_ACTIVE_CONNECTIONS.set(len(self.activate_connections))
+        return state
+
+    async def broadcast(self, message: str, room: str = DEFAULT_ROOM, frame_id: int | None = None) -> None:
+        """
+        Send a message to everyone in the room. With batching enabled, while the room is busier
+        than the rate threshold the message is queued and goes out with the others arriving
+        within the batch window as one array frame; a quiet room gets it right away.
+        frame_id is the id the server assigned to the message; only such messages are kept for replay.
+        """
+
+        if frame_id is not None:
+            self._remember(room, message, frame_id)
+        if self.batch_window > 0 and room in self.rooms:
+            pending = self._pending_batches.get(room)
+            rate = self._room_rates.setdefault(room, RateMeter()).tick()
+            if pending is not None:
+                # Never let a message overtake the ones already waiting.
+                pending.append(frame_payload(message))
+                return
+            if rate > self.batch_rate_threshold:
+                self._pending_batches[room] = [frame_payload(message)]
+                self._batch_flushes[room] = asyncio.create_task(self._flush_batch(room))
+                return
+
+        start = perf_counter()
+        frame = EncodedFrame(message)
+        for connection in list(self.rooms.get(room, ())):
+            await self._send(connection, frame)
+        WS_BROADCAST_DURATION.observe(perf_counter() - start, kind="message")
+
+    async def _flush_batch(self, room: str) -> None:
+        await asyncio.sleep(self.batch_window)
+        payloads = self._pending_batches.pop(room)
+        del self._batch_flushes[room]
+        start = perf_counter()
+        WS_BATCH_SIZE.observe(len(payloads))
+        frame = EncodedFrame.from_payload(payloads)
+        try:
+            for connection in list(self.rooms.get(room, ())):
+                await self._send(connection, frame)
+        except Exception:
+            logger.exception("Failed to flush batched messages")
+        WS_BROADCAST_DURATION.observe(perf_counter() - start, kind="batch")
+
+    async def drain(self, timeout: float | None = None) -> None:
+        """
+        Wait up to timeout seconds for the batches queued so far to go out.
+        """
+
+        flushes = list(self._batch_flushes.values())
+        if flushes:
+            await asyncio.wait(flushes, timeout=timeout)
+
+    async def shutdown(self) -> None:
+        """
+        Cancel the pending batch flushes on shutdown; their messages would only go to closing sockets.
+        """
+
+        flushes = list(self._batch_flushes.values())
+        for flush in flushes:
+            flush.cancel()
+        await asyncio.gather(*flushes, return_exceptions=True)
+        self._batch_flushes.clear()
+        self._pending_batches.clear()
+
+    async def send_direct(self, sender: str, recipient: str, message: str) -> None:
+        """
+        Deliver a direct message to every socket of the recipient and echo it to every socket of the sender,
+        the sending one included, as its delivery acknowledgement.
+        """
+
+        start = perf_counter()
+        targets = list(self.users.get(recipient, ()))
+        if sender != recipient:
+            targets.extend(self.users.get(sender, ()))
+        frame = EncodedFrame(message)
+        for connection in targets:
+            await self._send(connection, frame)
+        WS_BROADCAST_DURATION.observe(perf_counter() - start, kind="direct")
+
+    async def deliver(self, message: str, room: str, sender: str, recipient: str | None) -> None:
+        """
+        Fan out a message read from the message stream to the sockets on this node.
+        """
+
+        if recipient is None:
+            await self.broadcast(message, room, message_id(message))
+        else:
+            await self.send_direct(sender, recipient, message)
+
+    async def broadcast_userlist(self, room: str = DEFAULT_ROOM) -> None:
+        start = perf_counter()
+        self._last_userlist_at[room] = monotonic()
+        members = list(self.rooms.get(room, ()))
+        frame = EncodedFrame.from_payload(
+            {"userlist": [self.activate_connections[member].username for member in members]}
+        )
+        for connection in members:
+            await self._send(connection, frame)
+        WS_BROADCAST_DURATION.observe(perf_counter() - start, kind="userlist")
+
+    async def _send(self, websocket: WebSocket, frame: EncodedFrame) -> None:
+        state = self.activate_connections.get(websocket)
+        if state is None:
+            # Evicted while an earlier send of this fan-out was in flight.
+            return
+        try:
+            send = websocket.send_bytes(frame.binary) if state.binary else websocket.send_text(frame.text)
+            # Fan-outs are sequential: a stalled peer must not hold up the rest of the room.
+            await asyncio.wait_for(send, timeout=self.send_timeout)
+        except TimeoutError:
+            logger.debug("Send to WebSocket timed out; evicting it")
+            await self.evict(websocket, reason="send_timeout", code=status.WS_1011_INTERNAL_ERROR)
+        except Exception:
+            # A dead peer must not abort the fan-out to everyone else.
+            logger.debug("Send to WebSocket failed; evicting it")
+            await self.evict(websocket, reason="send_error", code=status.WS_1011_INTERNAL_ERROR)
+
+    async def schedule_userlist(self, room: str = DEFAULT_ROOM) -> None:
+        """
+        Broadcast the room roster right away if none went out during the last presence window,
+        otherwise fold this change into a single flush at the end of the window.
+        A lone join on an idle server is delivered immediately while a reconnect storm
+        produces at most one roster per room and window.
+        """
+
+        if room not in self.rooms:
+            return
+        if self.presence_window <= 0:
+            await self.broadcast_userlist(room)
+            return
+        if room in self._pending_userlist:
+            return
+
+        delay = self._last_userlist_at.get(room, -math.inf) + self.presence_window - monotonic()
+        if delay <= 0:
+            await self.broadcast_userlist(room)
+        else:
+            self._pending_userlist[room] = asyncio.create_task(self._flush_userlist(room, delay))
+
+    async def _flush_userlist(self, room: str, delay: float) -> None:
+        await asyncio.sleep(delay)
+        del self._pending_userlist[room]
+        if room not in self.rooms:
+            return
+        try:
+            await self.broadcast_userlist(room)
+        except Exception:
+            logger.exception("Failed to flush coalesced userlist")
+
+    def touch(self, websocket: WebSocket) -> None:
+        state = self.activate_connections.get(websocket)
+        if state is not None:
+            state.last_seen = monotonic()
+
+    async def admit(self, websocket: WebSocket, data: str | None, size: int | None = None) -> bool:
+        """
+        Apply the per-connection frame size cap and token bucket, unless the rate limit is 0, to an inbound frame.
+        size is the frame's size in bytes on the wire when known, as for binary frames; data is None for
+        a frame that could not be decoded, which is counted against the limits all the same, then dropped.
+        Returns whether the frame may be broadcast. Depending on the configured action
+        a frame over the limits is dropped, delayed until the bucket refills (throttle,
+        which also stops reading from that client) or gets the socket closed.
+        """
+
+        state = self.activate_connections.get(websocket)
+        if state is None:
+            return False
+
+        if size is not None:
+            too_big = size > self.max_frame_bytes
+        else:
+            # A str never takes more than 4 bytes per character in UTF-8, so most frames skip the encode.
+            text = data or ""
+            too_big = len(text) * 4 > self.max_frame_bytes and len(text.encode()) > self.max_frame_bytes
+        if too_big:
+            action = "close" if self.limit_action == "close" else "drop"
+            WS_REJECTED_FRAMES.inc(reason="size", action=action)
+            if action == "close":
+                await self.evict(websocket, reason="frame_too_big", code=status.WS_1009_MESSAGE_TOO_BIG)
+            return False
+
+        # A rate limit of 0 switches the bucket off.
+        wait = state.bucket.consume() if self.rate_limit > 0 else 0.0
+        if wait:
+            WS_REJECTED_FRAMES.inc(reason="rate", action=self.limit_action)
+            if self.limit_action == "close":
+                await self.evict(websocket, reason="rate_limit", code=status.WS_1008_POLICY_VIOLATION)
+                return False
+            if self.limit_action != "throttle":
+                return False
+            await asyncio.sleep(wait)
+            if websocket not in self.activate_connections or state.bucket.consume():
+                return False
+
+        if data is None:
+            WS_REJECTED_FRAMES.inc(reason="malformed", action="drop")
+            return False
+        return True
+
+    async def heartbeat(self, websocket: WebSocket) -> bool:
+        """
+        Called when a socket has been idle for a heartbeat interval.
+        Evicts it if nothing was heard for the heartbeat timeout, otherwise pings it.
+        Returns whether the socket is still connected.
+        """
+
+        state = self.activate_connections.get(websocket)
+        if state is None:
+            return False
+        if monotonic() - state.last_seen >= self.heartbeat_timeout:
+            await self.evict(websocket, reason="heartbeat", code=HEARTBEAT_TIMEOUT_CLOSE_CODE)
+            return False
+        # A half-open peer may never drain its send buffer; _send gives up on it after the send timeout.
+        await self._send(websocket, PING)
+        return websocket in self.activate_connections
+
+    async def reap(self) -> int:
+        """
+        Evict every connection that has not been heard from within the heartbeat timeout.
+        Backstop for sockets whose endpoint coroutine is stuck and cannot run its own heartbeat.
+        """
+
+        deadline = monotonic() - self.heartbeat_timeout
+        stale = [websocket for websocket, state in self.activate_connections.items() if state.last_seen < deadline]
+        for websocket in stale:
+            await self.evict(websocket, reason="heartbeat", code=HEARTBEAT_TIMEOUT_CLOSE_CODE)
+        return len(stale)
+
+    async def run_reaper(self) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                evicted = await self.reap()
+            except Exception:
+                logger.exception("WebSocket reaper failed")
+                continue
+            if evicted:
+                logger.info(f"Reaped {evicted} idle WebSocket connections")
+
+    async def evict(self, websocket: WebSocket, reason: str, code: int) -> None:
+        state = self._remove(websocket)
+        if state is None:
+            return
+        WS_EVICTIONS.inc(reason=reason)
+        WS_RECLAIMED_BYTES.inc(sys.getsizeof(state) + sys.getsizeof(state.username))
+        try:
+            await asyncio.wait_for(websocket.close(code=code), timeout=CLOSE_TIMEOUT)
+        except Exception:
+            logger.debug("Closing evicted WebSocket failed")
+        await self.schedule_userlist(state.room)
+
+
+manager = ConnectionManager()
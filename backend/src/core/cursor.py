@@ -0,0 +1,59 @@
+import base64
+import hashlib
+import hmac
+from datetime import datetime, timedelta, timezone
+from typing import Literal
+
+from ..exceptions import InvalidCursorError
+from ..schemas.config import settings
+
+Direction = Literal["before", "after"]
+
+_DIRECTIONS: dict[str, Direction] = {"b": "before", "a": "after"}
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def epoch_us(moment: datetime) -> int:
+    # Exact, unlike timestamp(); naive moments are taken as UTC, like the stored ones.
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return (moment - EPOCH) // _MICROSECOND
+
+
+def _signature(room: str, body: str) -> str:
+    # Bound to the room, so a cursor from one room cannot page through another.
+    digest = hmac.new(settings.SECRET_KEY.encode(), f"{room}:{body}".encode(), hashlib.sha256).digest()[:12]
+    return base64.urlsafe_b64encode(digest).decode("ascii")
+
+
+def encode_cursor(room: str, direction: Direction, message_id: int, created_at: datetime | None = None) -> str:
+    """
+    An opaque token for the page of messages before or after a message id,
+    or, given the message's created_at, before or after that message in time order.
+    """
+
+    position = f"{direction[0]}{message_id}"
+    if created_at is not None:
+        position = f"t{position}:{epoch_us(created_at)}"
+    body = base64.urlsafe_b64encode(position.encode()).decode("ascii").rstrip("=")
+    return body + "." + _signature(room, body)
+
+
+def decode_cursor(room: str, cursor: str) -> tuple[Direction, int, datetime | None]:
+    """
+    The direction, message id and, for a time order cursor, created_at of a cursor.
+    """
+
+    body, _, signature = cursor.partition(".")
+    if not hmac.compare_digest(signature, _signature(room, body)):
+        raise InvalidCursorError()
+    try:
+        position = base64.urlsafe_b64decode(body + "=" * (-len(body) % 4)).decode("ascii")
+        if not position.startswith("t"):
+            return _DIRECTIONS[position[0]], int(position[1:]), None
+        message_id, _, created_at = position[2:].partition(":")
+        return _DIRECTIONS[position[1]], int(message_id), EPOCH + int(created_at) * _MICROSECOND
+    except (ValueError, KeyError, IndexError, OverflowError):
+        raise InvalidCursorError()
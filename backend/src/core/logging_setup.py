@@ -0,0 +1,119 @@
+import atexit
+import json
+import logging
+import queue
+from datetime import datetime, timezone
+from logging.config import fileConfig
+from logging.handlers import QueueHandler, QueueListener
+
+from ..schemas.config import settings
+from .tracing import current_request_id
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps one in every 1/rate DEBUG records of each configured logger and its children.
+    Records at INFO and above always pass.
+    """
+
+    def __init__(self, rates: dict[str, float]) -> None:
+        super().__init__()
+        self.rates = rates
+        self._every: dict[str, int] = {}
+        self._counts: dict[str, int] = {}
+
+    def _interval(self, name: str) -> int:
+        every = self._every.get(name)
+        if every is None:
+            # The most specific configured logger wins.
+            matches = [key for key in self.rates if name == key or name.startswith(key + ".")]
+            rate = self.rates[max(matches, key=len)] if matches else 1.0
+            every = 0 if rate <= 0 else max(1, round(1 / rate))
+            self._every[name] = every
+        return every
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or not self.rates:
+            return True
+        every = self._interval(record.name)
+        if every <= 1:
+            return every == 1
+        count = self._counts.get(record.name, 0)
+        self._counts[record.name] = count + 1
+        return count % every == 0
+
+
+class RequestIdFilter(logging.Filter):
+    """
+    Stamps records with the id of the request they were logged in, while still on the logging task:
+    the queue listener formats them on another thread, outside the request context.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = current_request_id()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per record, for log shippers.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            entry["request_id"] = request_id
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+
+# uvicorn gives these loggers handlers of their own, which do not propagate to the root;
+# the access log is written on every request.
+UVICORN_LOGGERS = ("uvicorn", "uvicorn.access")
+
+
+def _queue_handlers(logger: logging.Logger, log_format: str, sample_rates: dict[str, float]) -> QueueListener:
+    handlers = list(logger.handlers)
+    for handler in handlers:
+        logger.removeHandler(handler)
+        if log_format == "json":
+            handler.setFormatter(JsonFormatter())
+
+    log_queue: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+    queue_handler = QueueHandler(log_queue)
+    # Sampled before enqueueing, so dropped records cost no queue traffic.
+    queue_handler.addFilter(SamplingFilter(sample_rates))
+    queue_handler.addFilter(RequestIdFilter())
+    logger.addHandler(queue_handler)
+
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+
+def configure_logging(
+    config_path: str,
+    log_format: str = settings.LOG_FORMAT,
+    sample_rates: dict[str, float] = settings.LOG_SAMPLE_RATES,
+) -> list[QueueListener]:
+    """
+    Load the logging config file, then put its root handlers, and those uvicorn installed if it runs us,
+    behind queues: callers only enqueue records, and background threads do the formatting and the writes.
+    Returns the queue listeners, the root's first.
+    """
+
+    fileConfig(config_path, disable_existing_loggers=False)
+    listeners = [_queue_handlers(logging.getLogger(), log_format, sample_rates)]
+    for name in UVICORN_LOGGERS:
+        logger = logging.getLogger(name)
+        if logger.handlers:
+            listeners.append(_queue_handlers(logger, log_format, sample_rates))
+    return listeners
@@ -0,0 +1,59 @@
+import asyncio
+import logging
+import sys
+import threading
+import traceback
+from time import monotonic
+
+from ..schemas.config import settings
+from .metrics import EVENT_LOOP_BLOCKS, EVENT_LOOP_LAG
+
+logger = logging.getLogger(__name__)
+
+
+class LoopMonitor:
+    """
+    Samples event loop lag: how much later than asked a sleep of interval seconds wakes up.
+    Code that holds the loop only shows up in the lag once it returns, so a watchdog thread also
+    checks that the loop keeps ticking, and logs the stack of the loop thread while it is blocked.
+    """
+
+    def __init__(
+        self,
+        interval: float = settings.LOOP_LAG_INTERVAL,
+        threshold: float = settings.LOOP_BLOCK_THRESHOLD,
+    ) -> None:
+        self.interval = interval
+        self.threshold = threshold
+        self._last_tick = monotonic()
+        self._loop_thread: int | None = None
+        self._stopped = threading.Event()
+
+    async def run(self) -> None:
+        self._loop_thread = threading.get_ident()
+        self._last_tick = monotonic()
+        self._stopped.clear()
+        watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        watchdog.start()
+        try:
+            while True:
+                await asyncio.sleep(self.interval)
+                now = monotonic()
+                EVENT_LOOP_LAG.observe(max(0.0, now - self._last_tick - self.interval))
+                self._last_tick = now
+        finally:
+            self._stopped.set()
+
+    def _watch(self) -> None:
+        reported = None
+        while not self._stopped.wait(self.threshold / 2):
+            tick = self._last_tick
+            blocked = monotonic() - tick - self.interval
+            # One report per stall: the loop has not ticked since this one was logged.
+            if blocked < self.threshold or tick == reported:
+                continue
+            reported = tick
+            EVENT_LOOP_BLOCKS.inc()
+            frame = sys._current_frames().get(self._loop_thread) if self._loop_thread else None
+            stack = "".join(traceback.format_stack(frame)) if frame else "(stack unavailable)\n"
+            logger.warning(f"Event loop blocked for {blocked * 1000:.0f} ms, in:\n{stack.rstrip()}")
@@ -0,0 +1,214 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+from datetime import datetime
+from typing import Any, Awaitable, Callable
+
+from redis.exceptions import ResponseError
+from sqlalchemy.ext.asyncio.session import AsyncSession, async_sessionmaker
+
+from ..database.db import persist_messages
+from ..schemas.config import settings
+from .metrics import STREAM_DEAD_LETTERS
+from .page_version import bump_max_id, bump_modifications
+from .redis_client import CACHE_MESSAGES_PREFIX, delete_keys
+
+logger = logging.getLogger(__name__)
+
+STREAM_KEY = "chat:stream:messages"
+NEXT_ID_KEY = "chat:stream:next_id"
+# Entries the persister cannot turn into a message, kept for inspection instead of being retried forever
+DEAD_LETTER_KEY = "chat:stream:dead_letters"
+PERSISTER_GROUP = "persisters"
+# Seconds to back off after a failed round, so an outage does not turn into a busy loop
+RETRY_DELAY = 1.0
+
+# (frame, room, sender, recipient) of one stream entry
+Deliver = Callable[[str, str, str, str | None], Awaitable[None]]
+
+
+def consumer_name() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def parse_entry(fields: dict[str, str]) -> dict[str, Any]:
+    """
+    The message row of a stream entry. Raises ValueError, KeyError or TypeError if the entry is malformed.
+    """
+
+    payload = json.loads(fields["frame"])
+    row = {key: payload[key] for key in ("id", "content", "created_by", "room")}
+    recipient = payload.get("recipient")
+    if not isinstance(row["id"], int) or not all(
+        isinstance(row[key], str) for key in ("content", "created_by", "room")
+    ):
+        raise ValueError("Message fields of the wrong type")
+    if recipient is not None and not isinstance(recipient, str):
+        raise ValueError("Recipient is not a string")
+    row["recipient"] = recipient
+    row["created_at"] = datetime.fromisoformat(payload["created_at"])
+    return row
+
+
+class MessageStream:
+    """
+    Redis Stream used as the durable, ordered log of chat messages.
+
+    Accepted messages are appended with XADD and get their id from a Redis counter, so the request
+    does not wait for the database. Every node tails the stream to fan messages out to its own
+    WebSocket clients, and the persister consumer group writes them to the database in batches.
+    The stream is trimmed to roughly ``maxlen`` entries, which must stay well above the persister lag.
+    """
+
+    def __init__(
+        self,
+        redis_connection: Any,
+        key: str = STREAM_KEY,
+        maxlen: int = settings.MESSAGE_STREAM_MAXLEN,
+    ) -> None:
+        self.redis = redis_connection
+        self.key = key
+        self.maxlen = maxlen
+
+    async def seed_ids(self, max_id: int) -> None:
+        """
+        Make sure the id counter is not behind the database, e.g. after switching from direct mode.
+        """
+
+        if await self.redis.set(NEXT_ID_KEY, max_id, nx=True):
+            return
+        current = await self.redis.get(NEXT_ID_KEY)
+        if int(current or 0) < max_id:
+            await self.redis.set(NEXT_ID_KEY, max_id)
+
+    async def append(
+        self,
+        content: str,
+        created_at: datetime,
+        created_by: str,
+        room: str,
+        recipient: str | None = None,
+    ) -> int:
+        message_id = int(await self.redis.incr(NEXT_ID_KEY))
+        payload: dict[str, Any] = {
+            "id": message_id,
+            "content": content,
+            "created_at": created_at.isoformat(),
+            "created_by": created_by,
+            "room": room,
+        }
+        fields = {"room": room, "created_by": created_by}
+        if recipient is not None:
+            payload["recipient"] = recipient
+            fields["recipient"] = recipient
+        fields["frame"] = json.dumps(payload)
+        await self.redis.xadd(self.key, fields, maxlen=self.maxlen, approximate=True)
+        return message_id
+
+    async def fan_out(
+        self, deliver: Deliver, last_id: str = "$", block_ms: int = settings.MESSAGE_STREAM_BLOCK_MS
+    ) -> str:
+        """
+        Deliver the entries appended after ``last_id`` and return the id to continue from.
+        """
+
+        response = await self.redis.xread({self.key: last_id}, block=block_ms)
+        for _, entries in response:
+            for entry_id, fields in entries:
+                last_id = entry_id
+                try:
+                    await deliver(fields["frame"], fields["room"], fields["created_by"], fields.get("recipient"))
+                except Exception:
+                    logger.exception("Failed to fan out stream entry")
+        return last_id
+
+    async def tail(self, deliver: Deliver) -> None:
+        # Only messages accepted from now on; clients catch up on older ones over HTTP.
+        last_id = "$"
+        while True:
+            try:
+                last_id = await self.fan_out(deliver, last_id)
+            except Exception:
+                logger.exception("Message stream tail failed")
+                await asyncio.sleep(RETRY_DELAY)
+
+    async def create_group(self) -> None:
+        try:
+            await self.redis.xgroup_create(self.key, PERSISTER_GROUP, id="0", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def persist_batch(
+        self,
+        session_factory: async_sessionmaker[AsyncSession],
+        consumer: str,
+        batch_size: int = settings.MESSAGE_STREAM_BATCH_SIZE,
+        block_ms: int = settings.MESSAGE_STREAM_BLOCK_MS,
+        claim_idle_ms: int = settings.MESSAGE_STREAM_CLAIM_IDLE_MS,
+    ) -> int:
+        """
+        Write one batch of stream entries to the database and acknowledge them.
+        When no new entries arrive, entries left unacknowledged for ``claim_idle_ms`` by a crashed
+        or failing persister are claimed instead. Malformed entries go to the dead-letter stream,
+        so they do not hold back the rest of their batch. Returns the number of entries processed.
+        """
+
+        response = await self.redis.xreadgroup(
+            PERSISTER_GROUP, consumer, {self.key: ">"}, count=batch_size, block=block_ms
+        )
+        entries = [entry for _, stream_entries in response for entry in stream_entries]
+        if not entries:
+            _, claimed, _ = await self.redis.xautoclaim(
+                self.key, PERSISTER_GROUP, consumer, min_idle_time=claim_idle_ms, start_id="0-0", count=batch_size
+            )
+            entries = claimed
+        if not entries:
+            return 0
+
+        rows = []
+        for entry_id, fields in entries:
+            try:
+                rows.append(parse_entry(fields))
+            except (ValueError, KeyError, TypeError) as e:
+                logger.error(f"Dead-lettering malformed stream entry {entry_id}: {e!r}")
+                await self.redis.xadd(
+                    DEAD_LETTER_KEY,
+                    {**fields, "entry_id": entry_id, "error": repr(e)},
+                    maxlen=self.maxlen,
+                    approximate=True,
+                )
+                STREAM_DEAD_LETTERS.inc()
+        backfilled: set[str] = set()
+        if rows:
+            async with session_factory() as session:
+                backfilled = await persist_messages(session, rows)
+        await self.redis.xack(self.key, PERSISTER_GROUP, *(entry_id for entry_id, _ in entries))
+
+        # Pages before a cursor are validated without the max id; messages filled in below it change them too.
+        if backfilled:
+            await bump_modifications(self.redis)
+
+        # Pages cached while the messages were only in the stream are stale now.
+        room_max_ids: dict[str, int] = {}
+        for row in rows:
+            if row.get("recipient") is None:
+                room_max_ids[row["room"]] = max(row["id"], room_max_ids.get(row["room"], 0))
+        for room, max_id in room_max_ids.items():
+            await delete_keys(self.redis, CACHE_MESSAGES_PREFIX + room + ":*")
+            await bump_max_id(self.redis, room, max_id)
+        return len(entries)
+
+    async def persist(self, session_factory: async_sessionmaker[AsyncSession], consumer: str) -> None:
+        await self.create_group()
+        while True:
+            try:
+                persisted = await self.persist_batch(session_factory, consumer)
+            except Exception:
+                logger.exception("Message stream persister failed")
+                await asyncio.sleep(RETRY_DELAY)
+                continue
+            if persisted:
+                logger.debug(f"Persisted {persisted} messages from the stream")
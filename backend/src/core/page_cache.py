@@ -0,0 +1,40 @@
+from dataclasses import dataclass
+from typing import Any
+
+# Freshness markers live outside the page key prefix, so scans over cached pages never see them.
+FRESH_KEY_PREFIX = "chat:fresh:"
+
+
+@dataclass(frozen=True, slots=True)
+class CachePolicy:
+    """
+    Soft/hard TTLs of a cached endpoint. Past the soft TTL a value is still served, but refreshed in the
+    background; the hard TTL bounds it, so hard_ttl - soft_ttl is the staleness budget of the endpoint.
+    """
+
+    soft_ttl: int
+    hard_ttl: int
+
+
+def fresh_key(key: str) -> str:
+    return FRESH_KEY_PREFIX + key
+
+
+async def get_cached(redis_connection: Any, key: str) -> tuple[str | None, bool]:
+    """
+    The cached value of a key, or None, and whether it is past its soft TTL, in one round trip.
+    """
+
+    value, fresh = await redis_connection.mget(key, fresh_key(key))
+    return value, value is not None and fresh is None
+
+
+async def is_fresh(redis_connection: Any, key: str) -> bool:
+    return bool(await redis_connection.exists(fresh_key(key)))
+
+
+async def set_cached(redis_connection: Any, key: str, value: str, policy: CachePolicy) -> None:
+    async with redis_connection.pipeline(transaction=False) as pipeline:
+        pipeline.set(key, value, ex=policy.hard_ttl)
+        pipeline.set(fresh_key(key), 1, ex=policy.soft_ttl)
+        await pipeline.execute()
@@ -0,0 +1,43 @@
+import base64
+import gzip
+
+# Cached page entries are JSON text, or, from the compression threshold on, this marker followed by
+# the base64 of the gzipped JSON: the Redis client decodes every value as text.
+GZIP_MARKER = "gz:"
+
+
+def encode_page(serialized: str, min_bytes: int, level: int) -> str:
+    data = serialized.encode()
+    if len(data) < min_bytes:
+        return serialized
+    # mtime=0 keeps the bytes of one page, and so of its ETag-matched body, stable across fills.
+    return GZIP_MARKER + base64.b64encode(gzip.compress(data, compresslevel=level, mtime=0)).decode("ascii")
+
+
+def gzipped_page(entry: str) -> bytes | None:
+    """
+    The gzipped JSON of a compressed entry, ready to be sent as a Content-Encoding: gzip body.
+    """
+
+    if not entry.startswith(GZIP_MARKER):
+        return None
+    return base64.b64decode(entry.removeprefix(GZIP_MARKER))
+
+
+def decode_page(entry: str) -> str:
+    gzipped = gzipped_page(entry)
+    return entry if gzipped is None else gzip.decompress(gzipped).decode()
+
+
+def accepts_gzip(accept_encoding: str | None) -> bool:
+    if not accept_encoding:
+        return False
+    for coding in accept_encoding.split(","):
+        name, _, params = coding.partition(";")
+        if name.strip().lower() in ("gzip", "*"):
+            quality = params.strip().removeprefix("q=")
+            try:
+                return not quality or float(quality) > 0
+            except ValueError:
+                return False
+    return False
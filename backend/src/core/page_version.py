@@ -0,0 +1,70 @@
+import hashlib
+from time import time_ns
+from typing import Any
+
+VERSION_KEY_PREFIX = "chat:version:"
+# Bumped by every edit and delete. The room of an edited message is not known without a query,
+# so one counter covers all rooms; edits are rare next to reads.
+MODIFICATIONS_KEY = VERSION_KEY_PREFIX + "modifications"
+
+
+# Persisters may finish batches out of order; the marker must never move back to an earlier value.
+SET_IF_GREATER = """
+if tonumber(ARGV[1]) > tonumber(redis.call('GET', KEYS[1]) or '0') then
+    redis.call('SET', KEYS[1], ARGV[1])
+end
+"""
+
+
+def max_id_key(room: str) -> str:
+    return VERSION_KEY_PREFIX + "max_id:" + room
+
+
+async def get_page_version(redis_connection: Any, room: str) -> tuple[str, str]:
+    """
+    The (max message id, modification counter) marker of a room in one round trip.
+    A counter lost with Redis restarts from the clock, so it never repeats an earlier value.
+    """
+
+    max_id, modifications = await redis_connection.mget(max_id_key(room), MODIFICATIONS_KEY)
+    if modifications is None:
+        await redis_connection.set(MODIFICATIONS_KEY, time_ns(), nx=True)
+        modifications = await redis_connection.get(MODIFICATIONS_KEY)
+    return max_id or "0", modifications
+
+
+async def get_max_id(redis_connection: Any, room: str) -> int:
+    return int(await redis_connection.get(max_id_key(room)) or 0)
+
+
+async def bump_max_id(redis_connection: Any, room: str, message_id: int) -> None:
+    await redis_connection.eval(SET_IF_GREATER, 1, max_id_key(room), message_id)
+
+
+async def bump_modifications(redis_connection: Any) -> None:
+    if not await redis_connection.exists(MODIFICATIONS_KEY):
+        await redis_connection.set(MODIFICATIONS_KEY, time_ns(), nx=True)
+    await redis_connection.incr(MODIFICATIONS_KEY)
+
+
+def page_etag(room: str, page: str, limit: int, max_id: str, modifications: str) -> str:
+    """
+    Pages before a message only change through edits, deletes and messages persisted out of order,
+    which all bump the modification counter, so only the newest page and pages after a message depend on the max id.
+    """
+
+    version = f"{room}:{page}:{limit}:{modifications}:{'' if page.startswith('b') else max_id}"
+    return '"' + hashlib.blake2b(version.encode(), digest_size=12).hexdigest() + '"'
+
+
+def gzip_etag(etag: str) -> str:
+    # A strong validator names one representation, so the gzipped one gets an ETag of its own.
+    return etag[:-1] + '-gzip"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(candidate.strip().removeprefix("W/") == etag for candidate in if_none_match.split(","))
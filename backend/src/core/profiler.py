@@ -0,0 +1,100 @@
+import os
+import sys
+import threading
+from collections import Counter
+from dataclasses import dataclass, field
+from time import monotonic, sleep
+from types import CodeType, FrameType
+from typing import Any
+
+SPEEDSCOPE_SCHEMA = "https://www.speedscope.app/file-format-schema.json"
+
+# Longest first, so frames are named relative to the most specific import root.
+_PATH_PREFIXES = sorted((os.path.join(path, "") for path in sys.path if path), key=len, reverse=True)
+
+
+@dataclass(slots=True)
+class Profile:
+    """
+    Sampled stacks, root first, each starting with its thread's name, and how often each one was seen.
+    """
+
+    interval: float
+    duration: float = 0.0
+    stacks: Counter[tuple[str, ...]] = field(default_factory=Counter)
+
+
+def _frame_name(code: CodeType) -> str:
+    path = code.co_filename
+    for prefix in _PATH_PREFIXES:
+        if path.startswith(prefix):
+            path = path.removeprefix(prefix)
+            break
+    return f"{code.co_qualname} ({path}:{code.co_firstlineno})"
+
+
+def _stack(frame: FrameType | None) -> list[str]:
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame.f_code))
+        frame = frame.f_back
+    names.reverse()
+    return names
+
+
+def sample(seconds: float, interval: float) -> Profile:
+    """
+    Sample the stacks of every other thread of the process every interval seconds for the given time.
+    Blocking: run it in a thread of its own, so the event loop keeps running, and keeps being sampled.
+    """
+
+    profile = Profile(interval)
+    own_thread = threading.get_ident()
+    start = monotonic()
+    deadline = start + seconds
+    while monotonic() < deadline:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id != own_thread:
+                profile.stacks[(names.get(thread_id, str(thread_id)), *_stack(frame))] += 1
+        sleep(interval)
+    profile.duration = monotonic() - start
+    return profile
+
+
+def to_collapsed(profile: Profile) -> str:
+    """
+    The profile in Brendan Gregg's collapsed stack format, as read by flamegraph.pl, speedscope and others.
+    """
+
+    return "".join(f"{';'.join(stack)} {count}\n" for stack, count in sorted(profile.stacks.items()))
+
+
+def to_speedscope(profile: Profile) -> dict[str, Any]:
+    """
+    The profile as a speedscope file: one sampled profile per thread, samples weighted in seconds.
+    """
+
+    frames: dict[str, int] = {}
+    threads: dict[str, dict[str, Any]] = {}
+    for (thread, *stack), count in sorted(profile.stacks.items()):
+        thread_profile = threads.setdefault(
+            thread,
+            {
+                "type": "sampled",
+                "name": thread,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": profile.duration,
+                "samples": [],
+                "weights": [],
+            },
+        )
+        thread_profile["samples"].append([frames.setdefault(name, len(frames)) for name in stack])
+        thread_profile["weights"].append(count * profile.interval)
+    return {
+        "$schema": SPEEDSCOPE_SCHEMA,
+        "exporter": "chat-backend",
+        "shared": {"frames": [{"name": name} for name in frames]},
+        "profiles": list(threads.values()),
+    }
@@ -0,0 +1,31 @@
+import math
+from dataclasses import dataclass, field
+from time import monotonic
+
+
+@dataclass(slots=True)
+class RateMeter:
+    """
+    Events per second over a sliding one-second window, approximated from the counts
+    of the current and the previous fixed one-second window.
+    """
+
+    window_start: float = field(default_factory=monotonic)
+    current: int = 0
+    previous: int = 0
+
+    def tick(self) -> float:
+        """
+        Record one event and return the rate including it.
+        """
+
+        now = monotonic()
+        elapsed = now - self.window_start
+        if elapsed >= 1.0:
+            windows = math.floor(elapsed)
+            self.previous = self.current if windows == 1 else 0
+            self.current = 0
+            self.window_start += windows
+            elapsed -= windows
+        self.current += 1
+        return self.previous * (1.0 - elapsed) + self.current
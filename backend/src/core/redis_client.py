@@ -1,14 +1,21 @@
 import logging
 from typing import Any
 
-import redis.asyncio as redis
-
 from ..config import REDIS_HOST, REDIS_PORT
+from .tracing import TracedRedis
 
 logger = logging.getLogger(__name__)
 
+CACHE_MESSAGES_PREFIX = "chat:messages:"
+
 
 def get_redis_connection() -> Any:
     redis_url = f"redis://{REDIS_HOST}:{REDIS_PORT}"
     logger.debug("Initialized Redis connection")
-    return redis.from_url(url=redis_url, decode_responses=True)  # type: ignore[no-untyped-call]
+    return TracedRedis.from_url(url=redis_url, decode_responses=True)
+
+
+async def delete_keys(redis_connection: Any, pattern: str) -> None:
+    keys = [key async for key in redis_connection.scan_iter(pattern)]
+    if keys:
+        await redis_connection.delete(*keys)
@@ -0,0 +1,44 @@
+from bisect import bisect_left
+from collections import deque
+
+
+class ReplayBuffer:
+    """
+    The most recent frames of one room, keyed by message id, for replay to reconnecting clients.
+
+    ``horizon`` is the id after which the buffer is known to hold every frame of the room:
+    it starts just below the first id seen by this process and moves up as frames fall off the end.
+    A client that last saw an id below the horizon may have missed frames that are no longer here.
+    """
+
+    def __init__(self, size: int) -> None:
+        self.frames: deque[tuple[int, str]] = deque(maxlen=size)
+        self.horizon: int | None = None
+
+    def append(self, message_id: int, frame: str) -> None:
+        # Ids can arrive out of order (concurrent senders, stream id races), so frames are kept sorted by id.
+        if self.horizon is None:
+            self.horizon = message_id - 1
+        if message_id <= self.horizon:
+            return
+        index = bisect_left(self.frames, message_id, key=lambda entry: entry[0])
+        if index < len(self.frames) and self.frames[index][0] == message_id:
+            return
+        if len(self.frames) == self.frames.maxlen:
+            if index == 0:
+                # Older than everything held: it falls off right away.
+                self.horizon = message_id
+                return
+            self.horizon = max(self.horizon, self.frames.popleft()[0])
+            index -= 1
+        self.frames.insert(index, (message_id, frame))
+
+    def since(self, last_seen_id: int) -> list[str] | None:
+        """
+        Frames with an id above ``last_seen_id`` in id order,
+        or None if the buffer does not reach back that far.
+        """
+
+        if self.horizon is None or last_seen_id < self.horizon:
+            return None
+        return [frame for message_id, frame in self.frames if message_id > last_seen_id]
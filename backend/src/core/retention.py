@@ -0,0 +1,35 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.ext.asyncio.session import AsyncSession, async_sessionmaker
+
+from ..database.db import archive_messages
+from ..schemas.config import settings
+from .metrics import MESSAGES_ARCHIVED
+
+logger = logging.getLogger(__name__)
+
+
+async def run_retention(
+    session_factory: async_sessionmaker[AsyncSession],
+    days: int = settings.MESSAGE_RETENTION_DAYS,
+    batch_size: int = settings.MESSAGE_ARCHIVE_BATCH_SIZE,
+    interval: float = settings.MESSAGE_ARCHIVE_INTERVAL,
+) -> None:
+    """
+    Every interval seconds, move the messages older than the retention period to the archive table.
+    """
+
+    while True:
+        cutoff = datetime.now(timezone.utc) - timedelta(days=days)
+        try:
+            async with session_factory() as session:
+                archived = await archive_messages(session, cutoff, batch_size)
+        except Exception:
+            logger.exception("Message archiving failed")
+        else:
+            if archived:
+                MESSAGES_ARCHIVED.inc(archived)
+                logger.info(f"Archived {archived} messages created before {cutoff.isoformat()}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,68 @@
+import asyncio
+import secrets
+from time import monotonic
+from typing import Any, Awaitable, Callable
+
+from ..schemas.config import settings
+
+LEASE_KEY_PREFIX = "chat:fill:"
+# How often a worker waiting on another worker's fill checks the cache
+POLL_INTERVAL = 0.05
+
+# Drop the lease only while it still holds this filler's token, so a lease that expired
+# and was taken over by another worker is left alone.
+RELEASE_LEASE = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent fills of one cache key. Within a process the callers share one in-flight fill;
+    across workers a short Redis lease lets one filler query the database while the others poll the cache.
+    """
+
+    def __init__(self, lease_ms: int = settings.CACHE_FILL_LEASE_MS, wait: float = settings.CACHE_FILL_WAIT) -> None:
+        self.lease_ms = lease_ms
+        self.wait = wait
+        self._flights: dict[str, asyncio.Task[tuple[str, bool]]] = {}
+
+    async def get(self, redis_connection: Any, key: str, fill: Callable[[], Awaitable[str]]) -> tuple[str, bool]:
+        """
+        Return the value of a missing cache key and whether this caller ran the fill.
+        The fill must store the value under the key and return it.
+        """
+
+        flight = self._flights.get(key)
+        if flight is not None:
+            value, _ = await asyncio.shield(flight)
+            return value, False
+
+        flight = asyncio.create_task(self._fill(redis_connection, key, fill))
+        self._flights[key] = flight
+        flight.add_done_callback(lambda done: self._flights.pop(key) if self._flights.get(key) is done else None)
+        # Shielded, so the callers sharing the flight are not failed by the first caller going away.
+        return await asyncio.shield(flight)
+
+    async def _fill(self, redis_connection: Any, key: str, fill: Callable[[], Awaitable[str]]) -> tuple[str, bool]:
+        token = secrets.token_hex(8)
+        lease_key = LEASE_KEY_PREFIX + key
+        if not await redis_connection.set(lease_key, token, nx=True, px=self.lease_ms):
+            deadline = monotonic() + self.wait
+            while monotonic() < deadline:
+                await asyncio.sleep(POLL_INTERVAL)
+                value = await redis_connection.get(key)
+                if value is not None:
+                    return value, False
+                # The other filler failed or its lease ran out: take over.
+                if await redis_connection.set(lease_key, token, nx=True, px=self.lease_ms):
+                    break
+            # Past the wait the database is queried anyway rather than failing the request.
+
+        try:
+            return await fill(), True
+        finally:
+            await redis_connection.eval(RELEASE_LEASE, 1, lease_key, token)
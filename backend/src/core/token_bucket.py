@@ -0,0 +1,34 @@
+from dataclasses import dataclass, field
+from time import monotonic
+
+
+@dataclass(slots=True)
+class TokenBucket:
+    """
+    Classic token bucket: ``rate`` tokens per second refill up to ``capacity``.
+    """
+
+    rate: float
+    capacity: float
+    tokens: float = -1.0
+    updated_at: float = field(default_factory=monotonic)
+
+    def __post_init__(self) -> None:
+        if self.tokens < 0:
+            self.tokens = self.capacity
+
+    def consume(self, amount: float = 1.0) -> float:
+        """
+        Take ``amount`` tokens if available and return 0, otherwise leave the bucket
+        untouched and return how many seconds to wait until enough tokens accumulate.
+        """
+
+        now = monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return 0.0
+        if self.rate <= 0:
+            return float("inf")
+        return (amount - self.tokens) / self.rate
@@ -0,0 +1,264 @@
+import json
+import logging
+import os
+import queue
+import threading
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from time import perf_counter_ns, time_ns
+from typing import Any
+
+import redis.asyncio as redis
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, ExceptionContext
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from ..schemas.config import settings
+
+logger = logging.getLogger(__name__)
+
+REQUEST_ID_HEADER = "X-Request-ID"
+SERVICE_NAME = "chat-backend"
+# Statements are cut to this many characters in span attributes
+MAX_STATEMENT_LENGTH = 500
+
+
+@dataclass(slots=True)
+class Span:
+    name: str
+    span_id: str
+    parent_id: str | None
+    start_ns: int
+    attributes: dict[str, str] = field(default_factory=dict)
+    started: int = field(default_factory=perf_counter_ns)
+    duration_ns: int = 0
+
+
+@dataclass(slots=True)
+class Trace:
+    """
+    The spans of one request. The request id doubles as the OpenTelemetry trace id.
+    """
+
+    request_id: str = field(default_factory=lambda: os.urandom(16).hex())
+    start_ns: int = field(default_factory=time_ns)
+    spans: list[Span] = field(default_factory=list)
+
+    def breakdown(self) -> list[tuple[str, int, float]]:
+        """
+        (span name, count, total milliseconds) per span name, the most expensive first.
+        """
+
+        totals: dict[str, tuple[int, int]] = {}
+        for span in self.spans:
+            count, duration = totals.get(span.name, (0, 0))
+            totals[span.name] = (count + 1, duration + span.duration_ns)
+        return sorted(
+            ((name, count, duration / 1e6) for name, (count, duration) in totals.items()),
+            key=lambda item: item[2],
+            reverse=True,
+        )
+
+
+_trace: ContextVar[Trace | None] = ContextVar("trace", default=None)
+_current_span: ContextVar[Span | None] = ContextVar("current_span", default=None)
+
+
+def current_request_id() -> str | None:
+    trace = _trace.get()
+    return trace.request_id if trace else None
+
+
+def start_span(name: str, **attributes: str) -> Span | None:
+    """
+    Open a span in the current request, or do nothing outside one. Close it with end_span.
+    """
+
+    trace = _trace.get()
+    if trace is None:
+        return None
+    parent = _current_span.get()
+    opened = Span(name, os.urandom(8).hex(), parent.span_id if parent else None, time_ns(), attributes)
+    trace.spans.append(opened)
+    return opened
+
+
+def end_span(span: Span | None) -> None:
+    if span is not None:
+        span.duration_ns = perf_counter_ns() - span.started
+
+
+@contextmanager
+def span(name: str, **attributes: str) -> Iterator[Span | None]:
+    opened = start_span(name, **attributes)
+    token = _current_span.set(opened) if opened else None
+    try:
+        yield opened
+    finally:
+        end_span(opened)
+        if token is not None:
+            _current_span.reset(token)
+
+
+def instrument_engine(engine: Engine) -> None:
+    """
+    Record a db.execute span around every statement the engine sends.
+    """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn: Any, cursor: Any, statement: str, *args: Any) -> None:
+        opened = start_span("db.execute", **{"db.statement": statement[:MAX_STATEMENT_LENGTH]})
+        if opened:
+            conn.info.setdefault("trace_spans", []).append(opened)
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn: Any, *args: Any) -> None:
+        spans = conn.info.get("trace_spans")
+        if spans:
+            end_span(spans.pop())
+
+    # A failed statement gets no after_cursor_execute; its span must not stay behind on the pooled connection.
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context: ExceptionContext) -> None:
+        spans = context.connection.info.get("trace_spans") if context.connection is not None else None
+        if spans:
+            failed = spans.pop()
+            failed.attributes["error"] = type(context.original_exception).__name__
+            end_span(failed)
+
+
+class TracedRedis(redis.Redis):
+    """
+    Redis client recording a span per command.
+    """
+
+    async def execute_command(self, *args: Any, **options: Any) -> Any:
+        with span(f"redis.{str(args[0]).lower()}"):
+            return await super().execute_command(*args, **options)  # type: ignore[no-untyped-call]
+
+
+def to_otlp(trace: Trace, method: str, route: str, status: int, duration_ns: int) -> dict[str, Any]:
+    """
+    The trace as an OTLP/JSON ExportTraceServiceRequest, the line format of the OpenTelemetry
+    Collector's file exporter and file receiver. The request itself is the root span.
+    """
+
+    root_id = os.urandom(8).hex()
+
+    def attributes(values: dict[str, Any]) -> list[dict[str, Any]]:
+        return [
+            {"key": key, "value": {"intValue": str(value)} if isinstance(value, int) else {"stringValue": value}}
+            for key, value in values.items()
+        ]
+
+    spans = [
+        {
+            "traceId": trace.request_id,
+            "spanId": root_id,
+            "name": f"{method} {route}",
+            "kind": 2,
+            "startTimeUnixNano": str(trace.start_ns),
+            "endTimeUnixNano": str(trace.start_ns + duration_ns),
+            "attributes": attributes(
+                {"http.request.method": method, "http.route": route, "http.response.status_code": status}
+            ),
+        }
+    ]
+    spans.extend(
+        {
+            "traceId": trace.request_id,
+            "spanId": child.span_id,
+            "parentSpanId": child.parent_id or root_id,
+            "name": child.name,
+            "kind": 3 if child.name.startswith(("db.", "redis.")) else 1,
+            "startTimeUnixNano": str(child.start_ns),
+            "endTimeUnixNano": str(child.start_ns + child.duration_ns),
+            "attributes": attributes(child.attributes),
+        }
+        for child in trace.spans
+    )
+    return {
+        "resourceSpans": [
+            {
+                "resource": {"attributes": attributes({"service.name": SERVICE_NAME})},
+                "scopeSpans": [{"scope": {"name": __name__}, "spans": spans}],
+            }
+        ]
+    }
+
+
+class FileSpanExporter:
+    """
+    Appends traces to a file as OTLP/JSON lines from a background thread, off the event loop.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._queue: queue.SimpleQueue[tuple[Trace, str, str, int, int] | None] = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, trace: Trace, method: str, route: str, status: int, duration_ns: int) -> None:
+        self._queue.put((trace, method, route, status, duration_ns))
+
+    def shutdown(self) -> None:
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self) -> None:
+        with open(self.path, "a", encoding="utf-8") as file:
+            while (item := self._queue.get()) is not None:
+                file.write(json.dumps(to_otlp(*item), separators=(",", ":")) + "\n")
+                file.flush()
+
+
+class TracingMiddleware:
+    """
+    Opens a trace per HTTP request, returns its id in X-Request-ID, logs requests slower than
+    TRACE_SLOW_REQUEST_MS with a per-span breakdown and hands every trace to the exporter, if any.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        slow_request_ms: float = settings.TRACE_SLOW_REQUEST_MS,
+        exporter: FileSpanExporter | None = None,
+    ) -> None:
+        self.app = app
+        self.slow_request_ms = slow_request_ms
+        self.exporter = exporter
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace = Trace()
+        token = _trace.set(trace)
+        start = perf_counter_ns()
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                MutableHeaders(scope=message)[REQUEST_ID_HEADER] = trace.request_id
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _trace.reset(token)
+            duration_ns = perf_counter_ns() - start
+            route = getattr(scope.get("route"), "path", "unmatched")
+            if self.slow_request_ms and duration_ns / 1e6 >= self.slow_request_ms:
+                breakdown = ", ".join(f"{name} {count}x {total:.1f} ms" for name, count, total in trace.breakdown())
+                logger.warning(
+                    f"Slow request {scope['method']} {route} took {duration_ns / 1e6:.1f} ms "
+                    f"[{trace.request_id}]: {breakdown or 'no spans'}"
+                )
+            if self.exporter:
+                self.exporter.export(trace, scope["method"], route, status_code, duration_ns)
@@ -0,0 +1,87 @@
+import json
+from typing import Any
+
+import msgpack
+from fastapi import WebSocket, WebSocketDisconnect, status
+
+# Sec-WebSocket-Protocol values the server accepts. Clients that offer none get JSON text frames.
+JSON_PROTOCOL = "chat.json"
+MSGPACK_PROTOCOL = "chat.msgpack"
+
+_UNSET = object()
+
+
+def negotiate(offered: list[str]) -> str | None:
+    """
+    Pick the subprotocol to accept from the ones offered by the client, preferring MessagePack.
+    """
+
+    if MSGPACK_PROTOCOL in offered:
+        return MSGPACK_PROTOCOL
+    if JSON_PROTOCOL in offered:
+        return JSON_PROTOCOL
+    return None
+
+
+def decode_msgpack(data: bytes) -> str:
+    """
+    Turn an inbound MessagePack frame into the JSON text every other code path works with.
+    Raises ValueError for malformed frames and for values JSON cannot carry, such as bin and ext.
+    """
+
+    try:
+        payload = msgpack.unpackb(data)
+        return payload if isinstance(payload, str) else json.dumps(payload)
+    except TypeError as error:
+        raise ValueError(f"MessagePack frame is not JSON compatible: {error}") from error
+
+
+async def receive_frame(websocket: WebSocket, binary: bool) -> tuple[str | None, int | None]:
+    """
+    Receive the next frame as JSON text, or None for a malformed MessagePack frame,
+    along with the size in bytes of a binary frame, so limits apply to what was actually sent.
+    A MessagePack connection also takes JSON text frames.
+    """
+
+    if not binary:
+        return await websocket.receive_text(), None
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", status.WS_1000_NORMAL_CLOSURE), message.get("reason"))
+    data = message.get("bytes")
+    if data is None:
+        return message.get("text"), None
+    try:
+        return decode_msgpack(data), len(data)
+    except ValueError:
+        return None, len(data)
+
+
+class EncodedFrame:
+    """
+    An outbound frame encoded at most once per wire format, however many sockets it goes to.
+    Chat frames are relayed as the JSON text the client sent; text that is not JSON is packed as a string.
+    """
+
+    __slots__ = ("text", "_payload", "_binary")
+
+    def __init__(self, text: str, payload: Any = _UNSET) -> None:
+        self.text = text
+        self._payload = payload
+        self._binary: bytes | None = None
+
+    @classmethod
+    def from_payload(cls, payload: Any) -> "EncodedFrame":
+        return cls(json.dumps(payload), payload)
+
+    @property
+    def binary(self) -> bytes:
+        if self._binary is None:
+            payload = self._payload
+            if payload is _UNSET:
+                try:
+                    payload = json.loads(self.text)
+                except ValueError:
+                    payload = self.text
+            self._binary = msgpack.packb(payload)
+        return self._binary
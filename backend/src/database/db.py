@@ -1,29 +1,69 @@
+import asyncio
 import logging
 from datetime import datetime, timezone
-from typing import Any, AsyncGenerator, Sequence
+from time import perf_counter
+from typing import Any, AsyncGenerator, Iterable, Sequence
 
 from passlib.context import CryptContext
-from sqlalchemy import select
+from sqlalchemy import ColumnElement, Select, and_, delete, func, insert, or_, select, text, union_all
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio.engine import create_async_engine
 from sqlalchemy.ext.asyncio.session import AsyncSession, async_sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, ConnectionPoolEntry
 
 from ..config import DATABASE_URL
+from ..core.metrics import DB_POOL_CHECKED_OUT, DB_POOL_CHECKOUT_WAIT
+from ..core.tracing import instrument_engine
 from ..exceptions import AuthenticationError, ChangingPasswordError, DuplicateUserError
+from ..schemas.config import settings
+from ..schemas.message import DEFAULT_ROOM
 from .models.base import Base
-from .models.message import Message
+from .models.message import REVISION_SEQUENCE, ArchivedMessage, Message
 from .models.user import User
 
 logger = logging.getLogger(__name__)
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+StoredMessage = Message | ArchivedMessage
+
+# First key of the advisory locks ordering the revisions of a room; the second one is the room's hash.
+REVISION_LOCK_NAMESPACE = 0x52455600
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Queue pool which reports how long callers wait for a free connection.
+    """
+
+    def _do_get(self) -> ConnectionPoolEntry:
+        start = perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_CHECKOUT_WAIT.observe(perf_counter() - start)
+
+
 engine = create_async_engine(
-    url=DATABASE_URL, echo=True, echo_pool=True, pool_size=20, max_overflow=0, pool_recycle=3600, pool_pre_ping=True
+    url=DATABASE_URL,
+    echo=settings.DB_ECHO,
+    echo_pool=settings.DB_ECHO,
+    poolclass=InstrumentedQueuePool,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=0,
+    pool_recycle=3600,
+    pool_pre_ping=True,
 )
+instrument_engine(engine.sync_engine)
+DB_POOL_CHECKED_OUT.set_function(lambda: engine.pool.checkedout())  # type: ignore[attr-defined]
 
 SessionLocal = async_sessionmaker(bind=engine, autocommit=False, autoflush=False)
 
 
+def get_session_factory() -> async_sessionmaker[AsyncSession]:
+    # For work that may outlive the request, or be shared with other requests: it opens sessions of its own.
+    return SessionLocal
+
+
 async def get_db() -> AsyncGenerator[AsyncSession, Any]:
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
@@ -38,11 +78,167 @@ async def get_db() -> AsyncGenerator[AsyncSession, Any]:
             await session.close()
 
 
-async def get_paginated_messages(session: AsyncSession, first_id: int | None, limit: int) -> Sequence[Message]:
-    stmt = select(Message).order_by(Message.id.desc()).limit(limit)
-
+def next_revision(session: AsyncSession) -> ColumnElement[int]:
+    """
+    SQL expression for the next value of the message change sequence.
+    """
+
+    if session.get_bind().dialect.name == "postgresql":
+        return REVISION_SEQUENCE.next_value()
+    # SQLite has no sequences, but it serializes writers, so max + 1 cannot be handed out twice.
+    return select(func.coalesce(func.max(Message.revision), 0) + 1).scalar_subquery()
+
+
+async def lock_revisions(session: AsyncSession, rooms: Iterable[str]) -> None:
+    """
+    Hold the rooms' revision locks until the transaction ends. Call it before taking revisions:
+    a sequence value is taken at insert time but visible at commit, and without the lock a writer
+    committing revision N after another one committed N + 1 would slip behind a client's sync cursor.
+    With it, the revisions of a room become visible in order.
+    """
+
+    if session.get_bind().dialect.name != "postgresql":
+        # SQLite holds its single write lock until commit, which orders revisions already.
+        return
+    # Sorted, so writers of several rooms cannot deadlock.
+    for room in sorted(set(rooms)):
+        await session.execute(
+            text("SELECT pg_advisory_xact_lock(:namespace, hashtext(:room))"),
+            {"namespace": REVISION_LOCK_NAMESPACE, "room": room},
+        )
+
+
+def _room_messages(model: type[Message] | type[ArchivedMessage], room: str) -> Select[Any]:
+    stmt = select(model).where(model.room == room, model.recipient.is_(None))
+    if model is Message:
+        stmt = stmt.where(Message.deleted_at.is_(None))
+    return stmt
+
+
+async def _messages_by_id(
+    session: AsyncSession,
+    model: type[Message] | type[ArchivedMessage],
+    limit: int,
+    room: str,
+    before: int | None,
+    after: int | None,
+) -> list[StoredMessage]:
+    stmt = _room_messages(model, room)
+    if after is not None:
+        result = await session.execute(stmt.where(model.id > after).order_by(model.id).limit(limit))
+        return list(result.scalars())
+    if before is not None:
+        stmt = stmt.where(model.id < before)
+    result = await session.execute(stmt.order_by(model.id.desc()).limit(limit))
+    return list(result.scalars())[::-1]
+
+
+async def _messages_by_time(
+    session: AsyncSession,
+    model: type[Message] | type[ArchivedMessage],
+    limit: int,
+    room: str,
+    before: datetime | None,
+    after: datetime | None,
+    anchor_id: int | None = None,
+) -> list[StoredMessage]:
+    # With an anchor id the bound is the message (moment, anchor_id) in (created_at, id) order.
+    stmt = _room_messages(model, room)
+    if after is not None:
+        bound = model.created_at > after
+        if anchor_id is not None:
+            bound = or_(bound, and_(model.created_at == after, model.id > anchor_id))
+        result = await session.execute(stmt.where(bound).order_by(model.created_at, model.id).limit(limit))
+        return list(result.scalars())
+    bound = model.created_at < before
+    if anchor_id is not None:
+        bound = or_(bound, and_(model.created_at == before, model.id < anchor_id))
+    stmt = stmt.where(bound).order_by(model.created_at.desc(), model.id.desc())
+    result = await session.execute(stmt.limit(limit))
+    return list(result.scalars())[::-1]
+
+
+async def get_paginated_messages(
+    session: AsyncSession,
+    limit: int,
+    room: str = DEFAULT_ROOM,
+    before: int | None = None,
+    after: int | None = None,
+) -> Sequence[StoredMessage]:
+    """
+    Up to limit messages of a room in id order: the newest ones, those just before an id or those just after it.
+    Either way one keyset range scan over the primary key. The archive holds the oldest ids of all,
+    so a page running past the start of the live table goes on there.
+    """
+
+    if after is not None:
+        archived = await _messages_by_id(session, ArchivedMessage, limit, room, None, after)
+        if len(archived) == limit:
+            return archived
+        live = await _messages_by_id(
+            session, Message, limit - len(archived), room, None, archived[-1].id if archived else after
+        )
+        return [*archived, *live]
+
+    live = await _messages_by_id(session, Message, limit, room, before, None)
+    if len(live) == limit:
+        return live
+    archived = await _messages_by_id(
+        session, ArchivedMessage, limit - len(live), room, live[0].id if live else before, None
+    )
+    return [*archived, *live]
+
+
+async def get_messages_by_time(
+    session: AsyncSession,
+    limit: int,
+    room: str = DEFAULT_ROOM,
+    before: datetime | None = None,
+    after: datetime | None = None,
+    anchor_id: int | None = None,
+) -> Sequence[StoredMessage]:
+    """
+    Up to limit messages of a room in (created_at, id) order, just before or just after a moment,
+    or, with anchor_id, just before or after the message with that id created at that moment.
+    A range scan on the created_at index, going on in the archive like get_paginated_messages.
+    """
+
+    if after is not None:
+        archived = await _messages_by_time(session, ArchivedMessage, limit, room, None, after, anchor_id)
+        if len(archived) == limit:
+            return archived
+        if archived:
+            after, anchor_id = archived[-1].created_at, archived[-1].id
+        live = await _messages_by_time(session, Message, limit - len(archived), room, None, after, anchor_id)
+        return [*archived, *live]
+
+    live = await _messages_by_time(session, Message, limit, room, before, None, anchor_id)
+    if len(live) == limit:
+        return live
+    if live:
+        before, anchor_id = live[0].created_at, live[0].id
+    archived = await _messages_by_time(session, ArchivedMessage, limit - len(live), room, before, None, anchor_id)
+    return [*archived, *live]
+
+
+def _direct_message_ids(sender: str, recipient: str, first_id: int | None, limit: int) -> Select[Any]:
+    stmt = select(Message.id).where(
+        Message.recipient == recipient, Message.created_by == sender, Message.deleted_at.is_(None)
+    )
     if first_id:
         stmt = stmt.where(Message.id < first_id)
+    return stmt.order_by(Message.id.desc()).limit(limit)
+
+
+async def get_direct_messages(
+    session: AsyncSession, username: str, other: str, first_id: int | None, limit: int
+) -> Sequence[Message]:
+    # One index range scan on (recipient, created_by, id) per direction, each stopping at limit rows;
+    # an OR of the two would be planned as a bitmap OR and a sort of the whole conversation.
+    sent = _direct_message_ids(username, other, first_id, limit).subquery()
+    received = _direct_message_ids(other, username, first_id, limit).subquery()
+    ids = union_all(select(sent.c.id), select(received.c.id)).subquery()
+    stmt = select(Message).where(Message.id.in_(select(ids.c.id))).order_by(Message.id.desc()).limit(limit)
 
     result = await session.execute(stmt)
     messages = result.scalars().all()
@@ -50,8 +246,23 @@ async def get_paginated_messages(session: AsyncSession, first_id: int | None, li
     return messages[::-1]
 
 
-async def create_message(session: AsyncSession, content: str, created_at: datetime, created_by: str) -> Message:
-    db_message = Message(content=content, created_at=created_at, created_by=created_by)
+async def create_message(
+    session: AsyncSession,
+    content: str,
+    created_at: datetime,
+    created_by: str,
+    room: str = DEFAULT_ROOM,
+    recipient: str | None = None,
+) -> Message:
+    await lock_revisions(session, [room])
+    db_message = Message(
+        content=content,
+        created_at=created_at,
+        created_by=created_by,
+        room=room,
+        recipient=recipient,
+        revision=next_revision(session),
+    )
 
     session.add(db_message)
     await session.commit()
@@ -60,26 +271,144 @@ async def create_message(session: AsyncSession, content: str, created_at: dateti
     return db_message
 
 
+async def persist_messages(session: AsyncSession, rows: Sequence[dict[str, Any]]) -> set[str]:
+    """
+    Insert messages that already carry their id, skipping ids that are stored already,
+    so a batch redelivered after a crash is written once.
+    Returns the rooms where the batch filled in ids below a message stored before it, as happens when
+    persisters finish out of order: pages cached over that range are missing the new messages.
+    """
+
+    ids = [row["id"] for row in rows]
+    existing = set((await session.execute(select(Message.id).where(Message.id.in_(ids)))).scalars())
+    new_rows = [row for row in rows if row["id"] not in existing]
+    await lock_revisions(session, [row["room"] for row in new_rows])
+    # Under the room locks, so any batch committed before this one is visible here.
+    min_ids: dict[str, int] = {}
+    for row in new_rows:
+        if row.get("recipient") is None:
+            min_ids[row["room"]] = min(row["id"], min_ids.get(row["room"], row["id"]))
+    backfilled = set()
+    for room, min_id in min_ids.items():
+        stored_max = (await session.execute(select(func.max(Message.id)).where(Message.room == room))).scalar()
+        if stored_max is not None and stored_max > min_id:
+            backfilled.add(room)
+    session.add_all(
+        Message(
+            id=row["id"],
+            content=row["content"],
+            created_at=row["created_at"],
+            created_by=row["created_by"],
+            room=row["room"],
+            recipient=row.get("recipient"),
+            revision=next_revision(session),
+        )
+        for row in new_rows
+    )
+    await session.flush()
+    if session.get_bind().dialect.name == "postgresql":
+        # Explicit ids do not advance the serial sequence; keep it ahead for direct mode.
+        await session.execute(
+            text("SELECT setval(pg_get_serial_sequence('messages', 'id'), (SELECT max(id) FROM messages))")
+        )
+    await session.commit()
+
+    return backfilled
+
+
+async def get_max_message_id(session: AsyncSession) -> int:
+    # The archive counts too: with every message archived, ids must still not be handed out again.
+    live = (await session.execute(select(func.max(Message.id)))).scalar()
+    archived = (await session.execute(select(func.max(ArchivedMessage.id)))).scalar()
+    return max(live or 0, archived or 0)
+
+
+async def archive_messages(session: AsyncSession, cutoff: datetime, batch_size: int) -> int:
+    """
+    Move the room messages created before the cutoff to the archive in batches of batch_size ids, each its own
+    short transaction, and return how many were archived. Only ids below the oldest kept message go, so the
+    archive always holds the oldest ids of all. Direct messages stay in the live table. Deletion tombstones
+    stay until they are older than the cutoff too, so clients syncing within the retention period still
+    learn about the delete; then they are dropped rather than archived.
+    """
+
+    oldest_kept = (await session.execute(select(func.min(Message.id)).where(Message.created_at >= cutoff))).scalar()
+    await session.commit()
+    archived = 0
+    while True:
+        stmt = (
+            select(Message.id, Message.deleted_at)
+            .where(
+                Message.created_at < cutoff,
+                Message.recipient.is_(None),
+                or_(Message.deleted_at.is_(None), Message.deleted_at < cutoff),
+            )
+            .order_by(Message.id)
+            .limit(batch_size)
+        )
+        stmt = stmt.where(Message.id < oldest_kept) if oldest_kept is not None else stmt
+        # Other workers running the job skip the rows this one is moving.
+        batch = (await session.execute(stmt.with_for_update(skip_locked=True))).all()
+        if not batch:
+            return archived
+
+        ids = [row.id for row in batch]
+        columns = [column.name for column in ArchivedMessage.__table__.columns]
+        rows = select(*(Message.__table__.c[name] for name in columns)).where(
+            Message.id.in_(ids), Message.deleted_at.is_(None)
+        )
+        await session.execute(insert(ArchivedMessage).from_select(columns, rows))
+        await session.execute(delete(Message).where(Message.id.in_(ids)))
+        await session.commit()
+        archived += sum(row.deleted_at is None for row in batch)
+        # Let request handlers in between batches.
+        await asyncio.sleep(0)
+
+
+async def get_message_changes(session: AsyncSession, room: str, since: int, limit: int) -> Sequence[Message]:
+    """
+    Inserts, edits and deletion tombstones of a room after revision ``since``, oldest change first.
+    One range scan on (room, revision). Writers take lock_revisions, so no revision of the room below
+    one returned here can still become visible later.
+    """
+
+    stmt = (
+        select(Message)
+        .where(Message.room == room, Message.revision > since, Message.recipient.is_(None))
+        .order_by(Message.revision)
+        .limit(limit)
+    )
+
+    result = await session.execute(stmt)
+    return result.scalars().all()
+
+
 async def delete_message_from_db(session: AsyncSession, id: int) -> bool:
-    stmt = select(Message).filter_by(id=id)
+    stmt = select(Message).filter_by(id=id, deleted_at=None)
     result = await session.execute(stmt)
     message = result.scalar_one()
 
     if message:
-        await session.delete(message)
+        # Keep a tombstone so syncing clients learn about the delete.
+        await lock_revisions(session, [message.room])
+        message.content = ""
+        message.deleted_at = datetime.now(timezone.utc)
+        message.revision = next_revision(session)
         await session.commit()
         return True
     return False
 
 
 async def update_message_from_db(session: AsyncSession, id: int, content: str) -> bool:
-    stmt = select(Message).filter_by(id=id)
+    stmt = select(Message).filter_by(id=id, deleted_at=None)
     result = await session.execute(stmt)
     message = result.scalar_one()
 
     if message:
+        await lock_revisions(session, [message.room])
         message.content = content
         message.updated_at = datetime.now(timezone.utc)
+        message.revision = next_revision(session)
         await session.commit()
         return True
     return False
@@ -1,20 +1,26 @@
 from datetime import datetime
 
-from sqlalchemy import DateTime
+from sqlalchemy import BigInteger, DateTime, Index, Sequence
 from sqlalchemy.orm import Mapped, mapped_column
 
-from ...schemas.message import MessageListResponse
+from ...schemas.message import DEFAULT_ROOM, DirectMessageListResponse, MessageListResponse, SyncResponse
 from .base import Base
 
+REVISION_SEQUENCE = Sequence("messages_revision_seq")
 
-class Message(Base):
-    __tablename__ = "messages"
+
+class MessageFields:
+    """
+    Columns and conversions shared by live and archived messages.
+    """
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
     content: Mapped[str] = mapped_column(nullable=False)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
     updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=None, nullable=True)
     created_by: Mapped[str] = mapped_column(nullable=False)
+    room: Mapped[str] = mapped_column(nullable=False, default=DEFAULT_ROOM, server_default=DEFAULT_ROOM)
+    recipient: Mapped[str | None] = mapped_column(default=None, nullable=True)
 
     def to_pydantic(self) -> MessageListResponse.MessageListResponseItem:
         return MessageListResponse.MessageListResponseItem(
@@ -24,3 +30,55 @@ class Message(Base):
             updated_at=self.updated_at,
             created_by=self.created_by,
         )
+
+    def to_direct_pydantic(self) -> DirectMessageListResponse.DirectMessageListResponseItem:
+        return DirectMessageListResponse.DirectMessageListResponseItem(
+            id=self.id,
+            content=self.content,
+            created_at=self.created_at,
+            updated_at=self.updated_at,
+            created_by=self.created_by,
+            recipient=self.recipient,
+        )
+
+
+class Message(MessageFields, Base):
+    __tablename__ = "messages"
+    __table_args__ = (
+        Index("ix_messages_room_id", "room", "id"),
+        Index("ix_messages_recipient_created_by_id", "recipient", "created_by", "id"),
+        Index("ix_messages_room_revision", "room", "revision"),
+        # BRIN on Postgres, B-tree elsewhere
+        Index("ix_messages_created_at", "created_at", postgresql_using="brin"),
+    )
+
+    # Change sequence: every insert, edit and delete takes the next value, so a client can sync "since revision N"
+    revision: Mapped[int] = mapped_column(BigInteger, REVISION_SEQUENCE, nullable=False)
+    # Deleted messages stay as tombstones with their content cleared until clients have synced them
+    deleted_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), default=None, nullable=True)
+
+    def to_sync_pydantic(self) -> SyncResponse.SyncResponseItem:
+        return SyncResponse.SyncResponseItem(
+            id=self.id,
+            content=self.content,
+            created_at=self.created_at,
+            updated_at=self.updated_at,
+            created_by=self.created_by,
+            revision=self.revision,
+            deleted=self.deleted_at is not None,
+        )
+
+
+class ArchivedMessage(MessageFields, Base):
+    """
+    Messages past the retention period, moved out of the live table. Always the oldest ids of all.
+    """
+
+    __tablename__ = "messages_archive"
+    __table_args__ = (
+        Index("ix_messages_archive_room_id", "room", "id"),
+        Index("ix_messages_archive_created_at", "created_at", postgresql_using="brin"),
+    )
+
+    # Ids are carried over from the live table
+    id: Mapped[int] = mapped_column(primary_key=True, index=True, autoincrement=False)
@@ -1,3 +1,4 @@
+from sqlalchemy import false
 from sqlalchemy.orm import Mapped, mapped_column
 
 from .base import Base
@@ -9,3 +10,5 @@ class User(Base):
     id: Mapped[int] = mapped_column(primary_key=True)
     username: Mapped[str] = mapped_column(unique=True, index=True)
     hashed_password: Mapped[str] = mapped_column(nullable=False)
+    # Granted in the database only, never through the API.
+    is_admin: Mapped[bool] = mapped_column(default=False, server_default=false())
@@ -1,9 +1,13 @@
-from typing import Annotated
+from typing import Annotated, AsyncGenerator
 
 from fastapi import Depends
 from fastapi.security import OAuth2PasswordBearer
 from fastapi_limiter.depends import RateLimiter
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from .core.admission import auth_gate, read_gate, write_gate
+from .database.db import get_by_username, get_db
+from .exceptions import AdminRequiredError
 from .schemas.user import TokenData
 from .utils import verify_token
 
@@ -12,8 +16,35 @@ limiter = RateLimiter(times=100, seconds=60)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/token")
 
 
+# Listed before any other dependency of a route, so shed requests never reach the rate limiter or the database.
+async def admit_auth() -> AsyncGenerator[None, None]:
+    async with auth_gate.admit():
+        yield
+
+
+async def admit_write() -> AsyncGenerator[None, None]:
+    async with write_gate.admit():
+        yield
+
+
+async def admit_read() -> AsyncGenerator[None, None]:
+    async with read_gate.admit():
+        yield
+
+
 def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]) -> TokenData:
     payload = verify_token(token)
     username = payload.get("sub")
 
     return TokenData(username=username)
+
+
+async def get_admin_user(
+    current_user: Annotated[TokenData, Depends(get_current_user)],
+    session: Annotated[AsyncSession, Depends(get_db)],
+) -> TokenData:
+    # The flag lives on the user row, so nobody becomes an admin by signing up with a reserved name.
+    user = await get_by_username(session, current_user.username) if current_user.username else None
+    if user is None or not user.is_admin:
+        raise AdminRequiredError()
+    return current_user
@@ -36,3 +36,39 @@ class ChangingPasswordError(UserException):
             detail=f"New password is not fit in validation or user with username {username} does not exist",
             headers={"X-Error-Code": "CHANGING_PASSWORD"},
         )
+
+
+class InvalidCursorError(UserException):
+    def __init__(self) -> None:
+        super().__init__(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid or tampered pagination cursor",
+            headers={"X-Error-Code": "INVALID_CURSOR"},
+        )
+
+
+class AdminRequiredError(UserException):
+    def __init__(self) -> None:
+        super().__init__(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="This operation is restricted to administrators",
+            headers={"X-Error-Code": "ADMIN_REQUIRED"},
+        )
+
+
+class ProfilerBusyError(UserException):
+    def __init__(self) -> None:
+        super().__init__(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A profile is already being taken on this worker",
+            headers={"X-Error-Code": "PROFILER_BUSY"},
+        )
+
+
+class ServiceOverloadedError(UserException):
+    def __init__(self, retry_after: int) -> None:
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is overloaded, retry later",
+            headers={"Retry-After": str(retry_after), "X-Error-Code": "OVERLOADED"},
+        )
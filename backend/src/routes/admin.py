@@ -0,0 +1,51 @@
+import asyncio
+import json
+import logging
+from typing import Annotated, Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+
+from ..core.profiler import sample, to_collapsed, to_speedscope
+from ..dependencies import get_admin_user
+from ..exceptions import ProfilerBusyError
+from ..schemas.config import settings
+from ..schemas.user import TokenData
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/admin")
+
+# One profile at a time per worker: concurrent ones would only sample each other.
+profiling = asyncio.Lock()
+
+
+def profiler_enabled() -> None:
+    # Switched off, the endpoint does not exist as far as clients can tell.
+    if not settings.PROFILER_ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+
+
+@router.get("/profile", dependencies=[Depends(profiler_enabled)], include_in_schema=False)
+async def profile(
+    admin: Annotated[TokenData, Depends(get_admin_user)],
+    seconds: Annotated[float, Query(gt=0, le=settings.PROFILER_MAX_SECONDS)] = 10.0,
+    format: Annotated[Literal["collapsed", "speedscope"], Query()] = "collapsed",
+) -> Response:
+    """
+    Sample the stacks of every thread of this worker, the event loop included, for the given number of seconds.
+    Returns collapsed stacks as text, or a speedscope JSON file.
+    """
+
+    if profiling.locked():
+        raise ProfilerBusyError()
+    async with profiling:
+        logger.info(f"Profiling requested by {admin.username} for {seconds} s")
+        result = await asyncio.to_thread(sample, seconds, settings.PROFILER_INTERVAL)
+
+    if format == "speedscope":
+        return Response(
+            json.dumps(to_speedscope(result)),
+            media_type="application/json",
+            headers={"Content-Disposition": 'attachment; filename="profile.speedscope.json"'},
+        )
+    return Response(to_collapsed(result), media_type="text/plain")
@@ -1,14 +1,48 @@
+import asyncio
 import json
 import logging
-from typing import Annotated
-
-from fastapi import APIRouter, Body, Cookie, Depends, HTTPException, Query, Response, WebSocket, WebSocketDisconnect
+from datetime import datetime, timezone
+from typing import Annotated, Awaitable, Callable
+
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    Body,
+    Cookie,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    Response,
+    WebSocket,
+    WebSocketDisconnect,
+    status,
+)
 from fastapi.encoders import jsonable_encoder
 from fastapi.security import OAuth2PasswordRequestForm
 from redis.asyncio.client import Redis
-from sqlalchemy.ext.asyncio.session import AsyncSession
-
-from ..core.redis_client import get_redis_connection
+from sqlalchemy.ext.asyncio.session import AsyncSession, async_sessionmaker
+from starlette.datastructures import MutableHeaders
+
+from ..core.connection_manager import PONG_FRAMES, direct_recipient, manager, message_id, with_sender
+from ..core.cursor import decode_cursor, encode_cursor, epoch_us
+from ..core.message_stream import MessageStream
+from ..core.metrics import CACHE_REQUESTS
+from ..core.page_cache import CachePolicy, get_cached, is_fresh, set_cached
+from ..core.page_codec import accepts_gzip, decode_page, encode_page, gzipped_page
+from ..core.page_version import (
+    bump_max_id,
+    bump_modifications,
+    etag_matches,
+    get_max_id,
+    get_page_version,
+    gzip_etag,
+    page_etag,
+)
+from ..core.redis_client import CACHE_MESSAGES_PREFIX, delete_keys, get_redis_connection
+from ..core.single_flight import SingleFlight
+from ..core.tracing import span
+from ..core.ws_protocol import MSGPACK_PROTOCOL, negotiate, receive_frame
 from ..database.db import (
     authenticate_user,
     change_password_in_db,
@@ -16,16 +50,26 @@ from ..database.db import (
     create_user,
     delete_message_from_db,
     get_db,
+    get_direct_messages,
+    get_message_changes,
+    get_messages_by_time,
     get_paginated_messages,
+    get_session_factory,
     update_message_from_db,
 )
-from ..dependencies import get_current_user, limiter
+from ..dependencies import admit_auth, admit_read, admit_write, get_current_user, limiter
+from ..exceptions import AuthenticationError
+from ..schemas.config import settings
 from ..schemas.message import (
+    DEFAULT_ROOM,
+    ROOM_PATTERN,
     CreateMessageRequest,
     CreateMessageResponse,
     DeleteMessageRequest,
     DeleteMessageResponse,
+    DirectMessageListResponse,
     MessageListResponse,
+    SyncResponse,
     UpdateMessageRequest,
     UpdateMessageResponse,
 )
@@ -34,45 +78,71 @@ from ..schemas.user import (
     ChangeUserPasswordRequest,
     ChangeUserPasswordResponse,
     RefreshTokenResponse,
+    TokenData,
     UserRequest,
     UserResponse,
 )
 from ..utils import create_access_token, create_refresh_token, verify_token
 
-CACHE_MESSAGES_PREFIX = "chat:messages:"
-
 logger = logging.getLogger(__name__)
 
+router = APIRouter()
+
+page_fills = SingleFlight()
+MESSAGES_CACHE = CachePolicy(settings.MESSAGES_CACHE_SOFT_TTL, settings.MESSAGES_CACHE_HARD_TTL)
 
-class ConnectionManager:
-    def __init__(self) -> None:
-        self.activate_connections: dict[WebSocket, str] = {}
 
-    async def connect(self, websocket: WebSocket, username: str) -> None:
-        await websocket.accept()
-        self.activate_connections[websocket] = username
-        await self.broadcast_userlist()
+async def invalidate_messages_cache(redis_connection: Redis) -> None:
+    # In stream mode the message stream and its id counter share the Redis database with the cache.
+    # Page version markers are restored right after by the callers.
+    if settings.MESSAGE_LOG_MODE == "stream":
+        await delete_keys(redis_connection, CACHE_MESSAGES_PREFIX + "*")
+    else:
+        await redis_connection.flushdb()
 
-    async def disconnect(self, websocket: WebSocket) -> None:
-        del self.activate_connections[websocket]
-        await self.broadcast_userlist()
 
-    async def broadcast(self, message: str) -> None:
-        for connection in self.activate_connections:
-            await connection.send_text(message)
+def utc(moment: datetime | None) -> datetime | None:
+    # Naive query timestamps are taken as UTC, like the stored ones.
+    if moment is None:
+        return None
+    if moment.tzinfo is None:
+        return moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc)
 
-    async def broadcast_userlist(self) -> None:
-        for connection in self.activate_connections:
-            message = json.dumps({"userlist": list(self.activate_connections.values())})
-            await connection.send_text(message)
 
+def messages_cache_key(room: str, limit: int, page: str) -> str:
+    return CACHE_MESSAGES_PREFIX + f"{room}:{limit}:{page}"
 
-manager = ConnectionManager()
 
-router = APIRouter()
+def page_response(entry: str, accept_encoding: str | None, headers: MutableHeaders) -> Response:
+    """
+    Send a cached page entry as is: compressed entries go out as their gzip bytes to clients accepting gzip,
+    with the gzip variant of the ETag.
+    """
 
+    headers["Vary"] = "Accept-Encoding"
+    with span("serialize"):
+        gzipped = gzipped_page(entry) if accepts_gzip(accept_encoding) else None
+        if gzipped is not None:
+            headers["Content-Encoding"] = "gzip"
+            if "ETag" in headers:
+                headers["ETag"] = gzip_etag(headers["ETag"])
+            return Response(gzipped, media_type="application/json", headers=headers)
+        return Response(decode_page(entry), media_type="application/json", headers=headers)
+
+
+async def revalidate(redis_connection: Redis, key: str, fill: Callable[[], Awaitable[str]]) -> None:
+    # Stale hits queued before an earlier refresh finished find the page fresh again.
+    if await is_fresh(redis_connection, key):
+        return
+    try:
+        await page_fills.get(redis_connection, key, fill)
+        logger.debug("Stale messages cache entry refreshed")
+    except Exception:
+        logger.exception("Error refreshing messages cache")
 
-@router.post("/sign-up", dependencies=[Depends(limiter)])
+
+@router.post("/sign-up", dependencies=[Depends(admit_auth), Depends(limiter)])
 async def sign_up(
     user_request: Annotated[UserRequest, Body],
     session: Annotated[AsyncSession, Depends(get_db)],
@@ -88,7 +158,7 @@ async def sign_up(
     return user_response
 
 
-@router.post("/token", dependencies=[Depends(limiter)])
+@router.post("/token", dependencies=[Depends(admit_auth), Depends(limiter)])
 async def login_for_access_and_refresh_token(
     response: Response,
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
@@ -108,7 +178,7 @@ async def login_for_access_and_refresh_token(
     return token_response
 
 
-@router.post("/refresh", dependencies=[Depends(limiter)])
+@router.post("/refresh", dependencies=[Depends(admit_auth), Depends(limiter)])
 async def refresh_access_token(refresh_token: Annotated[str | None, Cookie()] = None) -> RefreshTokenResponse:
     """
     Refresh access token and return it
@@ -121,7 +191,7 @@ async def refresh_access_token(refresh_token: Annotated[str | None, Cookie()] =
     return token_response
 
 
-@router.patch("/change-password", dependencies=[Depends(limiter)])
+@router.patch("/change-password", dependencies=[Depends(admit_auth), Depends(limiter)])
 async def change_password(
     request: Annotated[ChangeUserPasswordRequest, Body],
     session: Annotated[AsyncSession, Depends(get_db)],
@@ -137,74 +207,242 @@ async def change_password(
     return ChangeUserPasswordResponse(success=success)
 
 
-@router.get("/messages", dependencies=[Depends(limiter), Depends(get_current_user)])
+@router.get(
+    "/messages",
+    dependencies=[Depends(admit_read), Depends(limiter), Depends(get_current_user)],
+    response_model=MessageListResponse,
+)
 async def get_messages(
     response: Response,
-    session: Annotated[AsyncSession, Depends(get_db)],
+    background_tasks: BackgroundTasks,
+    session_factory: Annotated[async_sessionmaker[AsyncSession], Depends(get_session_factory)],
     redis_connection: Annotated[Redis, Depends(get_redis_connection)],
-    first_id: Annotated[int | None, Query()] = None,
-    limit: Annotated[int, Query()] = 20,
-) -> MessageListResponse:
+    cursor: Annotated[str | None, Query()] = None,
+    first_id: Annotated[int | None, Query(deprecated=True, description="Same as a cursor before this id")] = None,
+    before: Annotated[datetime | None, Query(description="Jump to the messages created before this moment")] = None,
+    after: Annotated[datetime | None, Query(description="Jump to the messages created after this moment")] = None,
+    limit: Annotated[int, Query(ge=1)] = 20,
+    room: Annotated[str, Query(pattern=ROOM_PATTERN)] = DEFAULT_ROOM,
+    if_none_match: Annotated[str | None, Header()] = None,
+    accept_encoding: Annotated[str | None, Header()] = None,
+) -> Response:
     """
-    Retrieve all messages from the chat.
-    Returns a list of all messages with their details including id, sender, content, and timestamp.
-    Results are cached in Redis for 1 hour.
+    Retrieve a page of messages from the chat room: the newest ones, those before or after a cursor
+    taken from an earlier page, or those before or after a moment in time, whose page carries cursors
+    to go on from there. Pages hold at most MESSAGES_MAX_PAGE_SIZE messages.
+    Returns the messages with their details including id, sender, content, and timestamp.
+    Results are cached in Redis; past the soft TTL a page is still served and refreshed in the background,
+    and concurrent misses of one page are filled by a single query.
+    Every page carries an ETag; a request whose If-None-Match still matches gets 304 Not Modified.
+    Large pages are cached gzipped and sent without recompression to clients that accept gzip.
     """
 
-    cache_key_messages = CACHE_MESSAGES_PREFIX + "last_messages"
-    if first_id:
-        if first_id - 20 < 0:
-            cache_key_messages = CACHE_MESSAGES_PREFIX + "1-" + str(first_id - 1)
+    # Clamped rather than rejected, so clients asking for more still get full pages.
+    limit = min(limit, settings.MESSAGES_MAX_PAGE_SIZE)
+    if sum(anchor is not None for anchor in (cursor, before, after)) > 1:
+        raise HTTPException(status_code=422, detail="Pass at most one of cursor, before and after")
+    before_id = after_id = None
+    before = utc(before)
+    after = utc(after)
+    if cursor:
+        # Pages jumped to by time go on in time order: their cursors carry the message's created_at too.
+        direction, position, created_at = decode_cursor(room, cursor)
+        if direction == "before":
+            before_id, before = position, created_at
         else:
-            cache_key_messages = CACHE_MESSAGES_PREFIX + str(first_id - 20) + "-" + str(first_id - 1)
-
-    cached_messages_json = await redis_connection.get(cache_key_messages)
-
-    if cached_messages_json:
-        cached_payload = json.loads(cached_messages_json)
-        response.headers["X-Cache"] = "HIT"
-        logger.debug("Messages cache hit")
-        return MessageListResponse(**cached_payload)
+            after_id, after = position, created_at
+    elif first_id and before is None and after is None:
+        before_id = first_id
+    by_time = before is not None or after is not None
+
+    if before is not None:
+        page = f"tb{epoch_us(before)}" + (f":{before_id}" if before_id is not None else "")
+    elif after is not None:
+        page = f"ta{epoch_us(after)}" + (f":{after_id}" if after_id is not None else "")
+    elif before_id is not None:
+        page = f"b{before_id}"
+    elif after_id is not None:
+        page = f"a{after_id}"
+    else:
+        page = "last"
+
+    # Read before the page itself: a message landing in between then only makes the ETag stale, never wrong.
+    max_id, modifications = await get_page_version(redis_connection, room)
+    etag = page_etag(room, page, limit, max_id, modifications)
+    # The newest page may be stored by shared caches as long as they revalidate it on every request.
+    cache_control = "public, no-cache" if page == "last" else "private, no-cache"
+    for validator in (etag, gzip_etag(etag)):
+        if etag_matches(if_none_match, validator):
+            CACHE_REQUESTS.inc(result="not_modified")
+            return Response(
+                status_code=304,
+                headers={"ETag": validator, "Cache-Control": cache_control, "Vary": "Accept-Encoding"},
+            )
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = cache_control
+
+    cache_key_messages = messages_cache_key(room, limit, page)
+
+    async def fill() -> str:
+        # Shared with coalesced requests and run after the response for stale hits,
+        # so it must not borrow this request's session, which may be closed first.
+        async with session_factory() as session:
+            # One row past the page tells whether there is more in its direction.
+            if by_time:
+                anchor_id = before_id if before is not None else after_id
+                rows = await get_messages_by_time(session, limit + 1, room, before, after, anchor_id)
+            else:
+                rows = await get_paginated_messages(session, limit + 1, room, before_id, after_id)
+        if after_id is None and after is None:
+            messages, older = rows[-limit:], len(rows) > limit
+        else:
+            messages, older = rows[:limit], bool(rows)
+        newest_id, newest_at = (messages[-1].id, messages[-1].created_at) if messages else (after_id, after)
+        messages_response = MessageListResponse(
+            messages=[message.to_pydantic() for message in messages],
+            before_cursor=(
+                encode_cursor(room, "before", messages[0].id, messages[0].created_at if by_time else None)
+                if older
+                else None
+            ),
+            after_cursor=(
+                encode_cursor(room, "after", newest_id, newest_at if by_time else None)
+                if newest_id is not None
+                else None
+            ),
+        )
+        with span("serialize"):
+            serialized = (
+                messages_response.model_dump_json()
+                if hasattr(messages_response, "model_dump_json")
+                else json.dumps(jsonable_encoder(messages_response))
+            )
+            entry = encode_page(serialized, settings.COMPRESS_MIN_BYTES, settings.COMPRESS_LEVEL)
+        await set_cached(redis_connection, cache_key_messages, entry, MESSAGES_CACHE)
+        return entry
+
+    cached_entry, stale = await get_cached(redis_connection, cache_key_messages)
+
+    if cached_entry:
+        if stale:
+            # Runs after the response is sent, so the caller never waits for the database.
+            background_tasks.add_task(revalidate, redis_connection, cache_key_messages, fill)
+            response.headers["X-Cache"] = "STALE"
+            CACHE_REQUESTS.inc(result="stale")
+            logger.debug("Messages cache hit past the soft TTL; refreshing")
+        else:
+            response.headers["X-Cache"] = "HIT"
+            CACHE_REQUESTS.inc(result="hit")
+            logger.debug("Messages cache hit")
+        return page_response(cached_entry, accept_encoding, response.headers)
 
     try:
-        messages = await get_paginated_messages(session, first_id, limit)
-        messages_response = MessageListResponse(messages=[message.to_pydantic() for message in messages])
-        serialized = (
-            messages_response.model_dump_json()
-            if hasattr(messages_response, "model_dump_json")
-            else json.dumps(jsonable_encoder(messages_response))
-        )
-        await redis_connection.set(cache_key_messages, serialized, ex=3600)
+        # Concurrent misses of one page, here and on other workers, share a single database query.
+        entry, filled = await page_fills.get(redis_connection, cache_key_messages, fill)
 
-        response.headers["X-Cache"] = "MISS"
-        logger.debug("Messages cache miss; fetched from DB and cached")
-        return messages_response
+        if filled:
+            response.headers["X-Cache"] = "MISS"
+            CACHE_REQUESTS.inc(result="miss")
+            logger.debug("Messages cache miss; fetched from DB and cached")
+        else:
+            response.headers["X-Cache"] = "COALESCED"
+            CACHE_REQUESTS.inc(result="coalesced")
+            logger.debug("Messages cache miss; waited for a concurrent fill")
+        return page_response(entry, accept_encoding, response.headers)
     except Exception as e:
         logger.exception("Error fetching or caching messages")
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.post("/send-message", dependencies=[Depends(limiter), Depends(get_current_user)])
+@router.get("/direct-messages", dependencies=[Depends(admit_read), Depends(limiter)])
+async def get_direct_messages_with_user(
+    session: Annotated[AsyncSession, Depends(get_db)],
+    current_user: Annotated[TokenData, Depends(get_current_user)],
+    with_user: Annotated[str, Query()],
+    first_id: Annotated[int | None, Query()] = None,
+    limit: Annotated[int, Query(ge=1, le=settings.MESSAGES_MAX_PAGE_SIZE)] = 20,
+) -> DirectMessageListResponse:
+    """
+    Retrieve the direct message conversation between the current user and another user.
+    Paged by id like the room history: pass the smallest id seen as first_id to get older messages.
+    """
+
+    if current_user.username is None:
+        raise AuthenticationError()
+
+    messages = await get_direct_messages(session, current_user.username, with_user, first_id, limit)
+    return DirectMessageListResponse(messages=[message.to_direct_pydantic() for message in messages])
+
+
+@router.get("/sync", dependencies=[Depends(admit_read), Depends(limiter), Depends(get_current_user)])
+async def sync_messages(
+    session: Annotated[AsyncSession, Depends(get_db)],
+    since: Annotated[int, Query(ge=0)] = 0,
+    limit: Annotated[int, Query(ge=1, le=500)] = 100,
+    room: Annotated[str, Query(pattern=ROOM_PATTERN)] = DEFAULT_ROOM,
+) -> SyncResponse:
+    """
+    Retrieve what changed in the chat room since a previous sync.
+    Returns new and edited messages and tombstones of deleted ones in change order, with the cursor to pass
+    as since next time. Start with since=0; keep syncing while has_more is set.
+    """
+
+    # One extra row tells whether another page follows.
+    changes = await get_message_changes(session, room, since, limit + 1)
+    page = changes[:limit]
+    return SyncResponse(
+        messages=[message.to_sync_pydantic() for message in page],
+        cursor=page[-1].revision if page else since,
+        has_more=len(changes) > limit,
+    )
+
+
+@router.post("/send-message", dependencies=[Depends(admit_write), Depends(limiter)])
 async def send_message(
     session: Annotated[AsyncSession, Depends(get_db)],
     redis_connection: Annotated[Redis, Depends(get_redis_connection)],
+    current_user: Annotated[TokenData, Depends(get_current_user)],
     message_request: Annotated[CreateMessageRequest, Body],
 ) -> CreateMessageResponse:
     """
     Create and send a new message to the chat.
     Validates message content and stores it in the database.
     Returns the ID of the created message. Invalidates message cache.
+    In stream mode the message is appended to the message stream instead and stored asynchronously.
+    Direct messages are always sent as the authenticated user, whatever created_by says.
     """
 
+    if message_request.recipient is not None:
+        if current_user.username is None:
+            raise AuthenticationError()
+        message_request.created_by = current_user.username
+
     try:
+        if settings.MESSAGE_LOG_MODE == "stream":
+            # The persister invalidates the cached pages once the message is in the database.
+            new_message_id = await MessageStream(redis_connection).append(
+                content=message_request.content,
+                created_at=message_request.created_at,
+                created_by=message_request.created_by,
+                room=message_request.room,
+                recipient=message_request.recipient,
+            )
+            logger.info("Message appended to the stream")
+            return CreateMessageResponse(id=new_message_id)
+
         new_message = await create_message(
             session=session,
             content=message_request.content,
             created_at=message_request.created_at,
             created_by=message_request.created_by,
+            room=message_request.room,
+            recipient=message_request.recipient,
         )
 
-        await redis_connection.flushdb()
+        # Direct messages never appear on the cached room pages.
+        if new_message.recipient is None:
+            await invalidate_messages_cache(redis_connection)
+            await bump_max_id(redis_connection, new_message.room, new_message.id)
 
         message_response = CreateMessageResponse(id=new_message.id)
 
@@ -215,7 +453,7 @@ async def send_message(
         raise HTTPException(status_code=400, detail=str(e))
 
 
-@router.delete("/delete-message", dependencies=[Depends(limiter), Depends(get_current_user)])
+@router.delete("/delete-message", dependencies=[Depends(admit_write), Depends(limiter), Depends(get_current_user)])
 async def delete_message(
     session: Annotated[AsyncSession, Depends(get_db)],
     redis_connection: Annotated[Redis, Depends(get_redis_connection)],
@@ -230,7 +468,8 @@ async def delete_message(
     try:
         success = await delete_message_from_db(session, message_request.id)
 
-        await redis_connection.flushdb()
+        await invalidate_messages_cache(redis_connection)
+        await bump_modifications(redis_connection)
 
         logger.info("Message deleted")
         return DeleteMessageResponse(success=success)
@@ -239,7 +478,7 @@ async def delete_message(
         raise HTTPException(status_code=400, detail=str(e))
 
 
-@router.patch("/update-message", dependencies=[Depends(limiter), Depends(get_current_user)])
+@router.patch("/update-message", dependencies=[Depends(admit_write), Depends(limiter), Depends(get_current_user)])
 async def update_message(
     session: Annotated[AsyncSession, Depends(get_db)],
     redis_connection: Annotated[Redis, Depends(get_redis_connection)],
@@ -254,26 +493,35 @@ async def update_message(
     try:
         success = await update_message_from_db(session, message_request.id, message_request.content)
 
-        keys = []
-        async for key in redis_connection.scan_iter("chat:messages:*-*"):
-            words = key.split(":")
-            range = words[-1].split("-")
-            keys.append((int(range[-2]), int(range[-1])))
-
-        cache_key_messages = CACHE_MESSAGES_PREFIX + "last_messages"
-        for key in keys:
-            if key[0] <= message_request.id and message_request.id <= key[1]:
-                cache_key_messages = CACHE_MESSAGES_PREFIX + str(key[0]) + "-" + str(key[1])
-                break
-
-        cached_messages_json = await redis_connection.get(cache_key_messages)
-        cached_payload = json.loads(cached_messages_json)
-        for message in cached_payload["messages"]:
-            if message["id"] == message_request.id:
-                message["content"] = message_request.content
-                break
-        serialized = json.dumps(cached_payload)
-        await redis_connection.set(cache_key_messages, serialized, ex=3600)
+        # The message's room is not known here, so patch whichever cached page of any room holds it.
+        # A page before id N only holds smaller ids and a page after it only larger ones.
+        candidate_keys = []
+        with span("cache.scan"):
+            async for key in redis_connection.scan_iter(CACHE_MESSAGES_PREFIX + "*"):
+                page = key.split(":")[-1]
+                if page.startswith("b") and int(page[1:]) <= message_request.id:
+                    continue
+                if page.startswith("a") and int(page[1:]) >= message_request.id:
+                    continue
+                candidate_keys.append(key)
+
+        for cache_key_messages in candidate_keys:
+            cached_entry = await redis_connection.get(cache_key_messages)
+            if not cached_entry:
+                continue
+            with span("serialize"):
+                cached_payload = json.loads(decode_page(cached_entry))
+            for message in cached_payload["messages"]:
+                if message["id"] == message_request.id:
+                    message["content"] = message_request.content
+                    with span("serialize"):
+                        entry = encode_page(
+                            json.dumps(cached_payload), settings.COMPRESS_MIN_BYTES, settings.COMPRESS_LEVEL
+                        )
+                    await redis_connection.set(cache_key_messages, entry, keepttl=True)
+                    break
+
+        await bump_modifications(redis_connection)
 
         logger.info("Message updated")
         return UpdateMessageResponse(success=success)
@@ -283,19 +531,77 @@ async def update_message(
 
 
 @router.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket, username: Annotated[str, Query]) -> None:
+async def websocket_endpoint(
+    websocket: WebSocket,
+    redis_connection: Annotated[Redis, Depends(get_redis_connection)],
+    token: Annotated[str | None, Query()] = None,
+    room: Annotated[str, Query(pattern=ROOM_PATTERN)] = DEFAULT_ROOM,
+    last_seen_id: Annotated[int | None, Query()] = None,
+) -> None:
     """
     WebSocket endpoint for real-time chat functionality.
     Establishes connection for live message broadcasting and user status updates.
-    Requires username as query parameter for user identification.
+    Requires an access token as the token query parameter; the user is the token's subject,
+    and connections without a valid token are closed with 1008 before the handshake completes.
+    Messages and the user list are scoped to the room query parameter;
+    frames with a "recipient" field are delivered only to that user and to the sender's sockets,
+    stamped with the sender's username as created_by.
+    Reconnecting clients pass last_seen_id to get the room messages they missed replayed before live
+    delivery resumes, as long as someone stayed in the room on this node;
+    {"type": "replay_gap"} means the server no longer has them and history must be refetched.
+    Idle clients are pinged with {"type": "ping"} and must answer {"type": "pong"} (or send any frame)
+    within the heartbeat timeout, otherwise they are disconnected.
+    Inbound frames are subject to a per-connection rate limit and a maximum frame size.
+    In stream mode stored messages reach every node through the message stream,
+    so frames relaying one (frames with an "id") are not broadcast again.
+    Clients offering the "chat.msgpack" subprotocol exchange the same frames as binary MessagePack;
+    "chat.json" or no subprotocol means JSON text.
     """
 
+    try:
+        username = verify_token(token).get("sub")
+    except AuthenticationError:
+        username = None
+    if not isinstance(username, str) or not username:
+        logger.info("WebSocket connection rejected: missing or invalid token")
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
     logger.info(f"WebSocket connection attempt for user: {username}")
-    await manager.connect(websocket, username)
+    subprotocol = negotiate(websocket.scope.get("subprotocols", []))
+    binary = subprotocol == MSGPACK_PROTOCOL
+    await manager.connect(websocket, username, room, last_seen_id, subprotocol)
     try:
         while True:
-            data = await websocket.receive_text()
-            await manager.broadcast(data)
+            try:
+                data, size = await asyncio.wait_for(
+                    receive_frame(websocket, binary), timeout=manager.heartbeat_interval
+                )
+            except TimeoutError:
+                if not await manager.heartbeat(websocket):
+                    logger.info(f"WebSocket evicted for user: {username}")
+                    return
+                continue
+            manager.touch(websocket)
+            if data in PONG_FRAMES:
+                continue
+            # Malformed frames (data is None) count against the limits too, and are never admitted.
+            if not await manager.admit(websocket, data, size) or data is None:
+                if websocket not in manager.activate_connections:
+                    logger.info(f"WebSocket closed over inbound limits for user: {username}")
+                    return
+                continue
+            frame_id = message_id(data)
+            if settings.MESSAGE_LOG_MODE == "stream" and frame_id is not None:
+                continue
+            recipient = direct_recipient(data)
+            if recipient is not None:
+                await manager.send_direct(username, recipient, with_sender(data, username))
+                continue
+            # Only ids /send-message has handed out for this room go into the replay buffer.
+            if frame_id is not None and frame_id > await get_max_id(redis_connection, room):
+                frame_id = None
+            await manager.broadcast(data, room, frame_id)
     except WebSocketDisconnect:
         logger.info(f"WebSocket disconnected for user: {username}")
         await manager.disconnect(websocket)
@@ -0,0 +1,14 @@
+from fastapi import APIRouter, Response
+
+from ..core.metrics import CONTENT_TYPE_LATEST, registry
+
+router = APIRouter()
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics() -> Response:
+    """
+    Expose collected metrics in the Prometheus text exposition format.
+    """
+
+    return Response(content=registry.render(), media_type=CONTENT_TYPE_LATEST)
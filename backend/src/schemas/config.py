@@ -1,3 +1,6 @@
+from typing import Literal, Self
+
+from pydantic import model_validator
 from pydantic_settings import BaseSettings
 
 
@@ -7,6 +10,95 @@ class Settings(BaseSettings):
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     REFRESH_TOKEN_EXPIRE_DAYS: int = 7
 
+    # WebSocket presence: roster updates within this many seconds of the last one are coalesced
+    PRESENCE_FLUSH_WINDOW: float = 0.5
+    # WebSocket heartbeat: idle sockets are pinged every interval and evicted after the timeout without a frame
+    WS_HEARTBEAT_INTERVAL: float = 20.0
+    WS_HEARTBEAT_TIMEOUT: float = 60.0
+    # WebSocket inbound limits per connection; the action applies to frames over the limits: drop, throttle or close.
+    # A rate limit of 0 turns rate limiting off.
+    WS_RATE_LIMIT: float = 5.0
+    WS_RATE_BURST: int = 10
+    WS_MAX_FRAME_BYTES: int = 4096
+    WS_LIMIT_ACTION: Literal["drop", "throttle", "close"] = "drop"
+    # A send to a WebSocket client that takes longer than this evicts it, so one stalled peer cannot hold up a room
+    WS_SEND_TIMEOUT: float = 2.0
+    # Recent frames kept per room to replay to clients reconnecting with last_seen_id
+    WS_REPLAY_BUFFER_SIZE: int = 500
+    # Adaptive batching: while a room gets more than the threshold in messages per second, messages arriving
+    # within the window are sent as one JSON array frame; a window of 0 sends every message on its own
+    WS_BATCH_WINDOW: float = 0.0
+    WS_BATCH_RATE_THRESHOLD: float = 20.0
+    # Message log: "direct" stores each message in the request, "stream" appends it to a Redis Stream
+    # that every node tails for fan-out and a consumer group persists to the database in batches
+    MESSAGE_LOG_MODE: Literal["direct", "stream"] = "direct"
+    MESSAGE_STREAM_MAXLEN: int = 100000
+    MESSAGE_STREAM_BATCH_SIZE: int = 100
+    MESSAGE_STREAM_BLOCK_MS: int = 1000
+    MESSAGE_STREAM_CLAIM_IDLE_MS: int = 30000
+    # Message page cache fills: one worker holds a lease of this many milliseconds while it queries the database;
+    # the others wait up to CACHE_FILL_WAIT seconds for its result before querying the database themselves
+    CACHE_FILL_LEASE_MS: int = 5000
+    CACHE_FILL_WAIT: float = 2.0
+    # Message pages are served without a refresh for the soft TTL, then served stale while refreshed
+    # in the background until the hard TTL; the difference is the staleness budget of the endpoint
+    MESSAGES_CACHE_SOFT_TTL: int = 300
+    MESSAGES_CACHE_HARD_TTL: int = 3600
+    # Messages older than this many days are moved to the archive table, in batches, every interval seconds;
+    # 0 keeps every message in the live table
+    MESSAGE_RETENTION_DAYS: int = 0
+    MESSAGE_ARCHIVE_BATCH_SIZE: int = 1000
+    MESSAGE_ARCHIVE_INTERVAL: float = 3600.0
+    # Larger limits on message pages are clamped to this
+    MESSAGES_MAX_PAGE_SIZE: int = 100
+    # Cached message pages and HTTP responses from this size on are gzipped at this level
+    COMPRESS_MIN_BYTES: int = 1024
+    COMPRESS_LEVEL: int = 6
+
+    # Database connection pool size; there is no overflow, so this is the most connections a worker opens
+    DB_POOL_SIZE: int = 20
+    # Admission control: requests in flight per budget (auth, writes, reads; 0 turns a budget off). Requests over it
+    # wait in a queue of at most the queue size for up to the timeout, else get a 503 with Retry-After seconds.
+    # Every request holds a pooled connection, so the budgets must fit in the pool (a budget turned off is not
+    # bounded by it); the defaults leave two connections for background jobs
+    ADMISSION_AUTH_LIMIT: int = 3
+    ADMISSION_WRITE_LIMIT: int = 5
+    ADMISSION_READ_LIMIT: int = 10
+    ADMISSION_QUEUE_SIZE: int = 50
+    ADMISSION_QUEUE_TIMEOUT: float = 1.0
+    ADMISSION_RETRY_AFTER: int = 1
+
+    # Logging: "text" or one JSON object per line; DEBUG records of the listed loggers (and their children)
+    # are kept at the given rate, e.g. 0.01 keeps one in a hundred
+    LOG_FORMAT: Literal["text", "json"] = "text"
+    LOG_SAMPLE_RATES: dict[str, float] = {"src.routes.chat": 0.01}
+    # Event loop monitor: timer lag is sampled every interval seconds (0 turns the monitor off), and a watchdog
+    # thread logs the stack of the code holding the loop once it is blocked for longer than the threshold
+    LOOP_LAG_INTERVAL: float = 0.5
+    LOOP_BLOCK_THRESHOLD: float = 0.2
+    # Tracing: requests slower than this are logged with a per-span breakdown (0 turns it off), and with an
+    # export path every trace is appended to that file as OTLP/JSON lines
+    TRACE_SLOW_REQUEST_MS: float = 500.0
+    TRACE_EXPORT_PATH: str = ""
+    # Sampling profiler endpoint, GET /api/admin/profile: off unless enabled, and only for users with is_admin set.
+    # A profile samples every thread's stack each interval seconds, for at most the max seconds
+    PROFILER_ENABLED: bool = False
+    PROFILER_INTERVAL: float = 0.01
+    PROFILER_MAX_SECONDS: float = 60.0
+    # Log every SQL statement and pool event; costly, for debugging only
+    DB_ECHO: bool = False
+
+    @model_validator(mode="after")
+    def admission_fits_pool(self) -> Self:
+        # Admitted requests beyond the pool size would queue on the pool, past any admission timeout.
+        budgets = self.ADMISSION_AUTH_LIMIT + self.ADMISSION_WRITE_LIMIT + self.ADMISSION_READ_LIMIT
+        if budgets > self.DB_POOL_SIZE:
+            raise ValueError(
+                f"ADMISSION_AUTH_LIMIT + ADMISSION_WRITE_LIMIT + ADMISSION_READ_LIMIT ({budgets}) "
+                f"exceeds DB_POOL_SIZE ({self.DB_POOL_SIZE})"
+            )
+        return self
+
     class ConfigDict:
         env_file = "../.env"
 
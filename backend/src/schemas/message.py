@@ -2,6 +2,9 @@ from datetime import datetime
 
 from pydantic import BaseModel, Field
 
+DEFAULT_ROOM = "general"
+ROOM_PATTERN = r"^[A-Za-z0-9_-]{1,64}$"
+
 
 class MessageBase(BaseModel):
     content: str = Field(max_length=100, description="The content of the message", examples=["Hello world!"])
@@ -15,10 +18,36 @@ class MessageListResponse(BaseModel):
         id: int = Field(description="The number in the database")
 
     messages: list[MessageListResponseItem]
+    before_cursor: str | None = Field(
+        default=None, description="The cursor of the page of older messages, None when there are none"
+    )
+    after_cursor: str | None = Field(
+        default=None, description="The cursor of the page of newer messages; polled to pick up new ones"
+    )
+
+
+class DirectMessageListResponse(BaseModel):
+    class DirectMessageListResponseItem(MessageBase):
+        id: int = Field(description="The number in the database")
+        recipient: str | None = Field(description="The receiver of the direct message")
+
+    messages: list[DirectMessageListResponseItem]
+
+
+class SyncResponse(BaseModel):
+    class SyncResponseItem(MessageBase):
+        id: int = Field(description="The number in the database")
+        revision: int = Field(description="The change sequence number of the latest insert, edit or delete")
+        deleted: bool = Field(description="The flag of a deleted message; its content is cleared")
+
+    messages: list[SyncResponseItem]
+    cursor: int = Field(description="The revision to pass as since on the next sync")
+    has_more: bool = Field(description="The flag of more changes beyond this page")
 
 
 class CreateMessageRequest(MessageBase):
-    pass
+    room: str = Field(default=DEFAULT_ROOM, pattern=ROOM_PATTERN, description="The room the message is posted to")
+    recipient: str | None = Field(default=None, description="The receiver of a direct message, None for the room")
 
 
 class CreateMessageResponse(BaseModel):
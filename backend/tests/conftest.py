@@ -14,7 +14,7 @@ from httpx import ASGITransport, AsyncClient
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 
 from src.core.redis_client import get_redis_connection
-from src.database.db import get_db
+from src.database.db import get_db, get_session_factory
 from src.database.models.base import Base
 from src.routes.chat import router
 from src.schemas.config import settings
@@ -39,7 +39,7 @@ TestingAsyncSessionLocal = async_sessionmaker(
 
 @pytest_asyncio.fixture(scope="session")
 async def redis_connection() -> Any:
-    redis_connection = fakeredis.FakeAsyncRedis()
+    redis_connection = fakeredis.FakeAsyncRedis(decode_responses=True)
     yield redis_connection
     await redis_connection.aclose()
 
@@ -64,8 +64,10 @@ async def db() -> AsyncGenerator[AsyncSession, None]:
             await session.close()
 
 
-@pytest_asyncio.fixture(scope="session")
-async def app(db: AsyncSession, redis_connection: FakeRedis) -> FastAPI:
+def create_test_app(
+    redis_connection: Any,
+    session_factory: async_sessionmaker[AsyncSession] = TestingAsyncSessionLocal,
+) -> FastAPI:
     @asynccontextmanager
     async def test_lifespan(_: FastAPI) -> AsyncGenerator[None, Any]:
         await FastAPILimiter.init(redis_connection)
@@ -76,15 +78,21 @@ async def app(db: AsyncSession, redis_connection: FakeRedis) -> FastAPI:
     app.include_router(router, prefix="/api")
 
     async def override_get_session() -> AsyncGenerator[AsyncSession, Any]:
-        async with TestingAsyncSessionLocal() as session:
+        async with session_factory() as session:
             yield session
 
     app.dependency_overrides[get_db] = override_get_session
+    app.dependency_overrides[get_session_factory] = lambda: session_factory
     app.dependency_overrides[get_redis_connection] = lambda: redis_connection
 
     return app
 
 
+@pytest_asyncio.fixture(scope="session")
+async def app(db: AsyncSession, redis_connection: FakeRedis) -> FastAPI:
+    return create_test_app(redis_connection)
+
+
 @pytest_asyncio.fixture(scope="session")
 async def async_client(app: FastAPI) -> AsyncGenerator[AsyncClient, None]:
     async with LifespanManager(app) as manager:
@@ -0,0 +1,112 @@
+import asyncio
+from typing import AsyncGenerator
+
+import httpx
+import pytest
+from fastapi import Depends, FastAPI
+from pydantic import ValidationError
+
+from src.core.admission import AdmissionGate
+from src.core.metrics import ADMISSION_REJECTED
+from src.exceptions import ServiceOverloadedError
+from src.schemas.config import Settings
+
+
+async def hold(gate: AdmissionGate, release: asyncio.Event) -> None:
+    async with gate.admit():
+        await release.wait()
+
+
+@pytest.mark.asyncio
+async def test_gate_queues_then_sheds() -> None:
+    gate = AdmissionGate("test", limit=1, queue_size=1, queue_timeout=0.05, retry_after=3)
+    release = asyncio.Event()
+    holder = asyncio.create_task(hold(gate, release))
+    await asyncio.sleep(0)
+    queued = asyncio.create_task(hold(gate, release))
+    await asyncio.sleep(0)
+    full_queue = ADMISSION_REJECTED.value(budget="test", reason="queue_full")
+    timeouts = ADMISSION_REJECTED.value(budget="test", reason="queue_timeout")
+
+    # The one queue slot is taken: the next request is turned away at once
+    with pytest.raises(ServiceOverloadedError) as full:
+        async with gate.admit():
+            pass
+    assert full.value.status_code == 503
+    assert full.value.headers == {"Retry-After": "3", "X-Error-Code": "OVERLOADED"}
+    assert ADMISSION_REJECTED.value(budget="test", reason="queue_full") == full_queue + 1
+
+    # The queued request gives up after the queue timeout
+    with pytest.raises(ServiceOverloadedError):
+        await queued
+    assert ADMISSION_REJECTED.value(budget="test", reason="queue_timeout") == timeouts + 1
+    assert gate.waiting == 0
+
+    release.set()
+    await holder
+    async with gate.admit():
+        pass
+
+
+@pytest.mark.asyncio
+async def test_gate_admits_queued_request_when_a_slot_frees() -> None:
+    gate = AdmissionGate("test", limit=1, queue_size=1, queue_timeout=1.0)
+    release = asyncio.Event()
+    holder = asyncio.create_task(hold(gate, release))
+    await asyncio.sleep(0)
+    queued = asyncio.create_task(hold(gate, asyncio.Event()))
+    await asyncio.sleep(0)
+    assert gate.waiting == 1
+
+    release.set()
+    await holder
+    await asyncio.sleep(0)
+    assert gate.waiting == 0
+    queued.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await queued
+
+
+@pytest.mark.asyncio
+async def test_route_returns_fast_503() -> None:
+    gate = AdmissionGate("route", limit=1, queue_size=0, queue_timeout=1.0, retry_after=2)
+
+    async def admit() -> AsyncGenerator[None, None]:
+        async with gate.admit():
+            yield
+
+    release = asyncio.Event()
+    app = FastAPI()
+
+    @app.get("/slow", dependencies=[Depends(admit)])
+    async def slow() -> dict[str, bool]:
+        await release.wait()
+        return {"ok": True}
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        first = asyncio.create_task(client.get("/slow"))
+        while not gate._slots.locked():
+            await asyncio.sleep(0)
+        shed = await client.get("/slow")
+        release.set()
+        admitted = await first
+
+    assert shed.status_code == 503
+    assert shed.headers["Retry-After"] == "2"
+    assert admitted.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_zero_limit_admits_everything() -> None:
+    gate = AdmissionGate("off", limit=0, queue_size=0)
+
+    async with gate.admit():
+        async with gate.admit():
+            pass
+
+
+def test_budgets_must_fit_in_the_pool() -> None:
+    assert Settings(DB_POOL_SIZE=18, ADMISSION_AUTH_LIMIT=3, ADMISSION_WRITE_LIMIT=5, ADMISSION_READ_LIMIT=10)
+
+    with pytest.raises(ValidationError, match="exceeds DB_POOL_SIZE"):
+        Settings(DB_POOL_SIZE=10, ADMISSION_AUTH_LIMIT=3, ADMISSION_WRITE_LIMIT=5, ADMISSION_READ_LIMIT=10)
@@ -6,7 +6,7 @@ from src.schemas.config import settings
 from ..conftest import create_expired_token
 
 
-@pytest.mark.order(after="tests/test_api/test_update_message.py::test_update_message_with_expired_token")
+@pytest.mark.order(after="tests/test_api/test_messages.py::test_messages_invalid_cursor")
 @pytest.mark.asyncio
 async def test_delete_message_as_unauthorized(async_client: httpx.AsyncClient) -> None:
     message_request = {"id": "1"}
@@ -0,0 +1,77 @@
+from datetime import datetime
+
+import httpx
+import pytest
+
+from src.utils import create_access_token
+
+
+@pytest.mark.order(after="tests/test_api/test_delete_message.py::test_delete_unknown_message")
+@pytest.mark.asyncio
+async def test_send_direct_message(async_client: httpx.AsyncClient) -> None:
+    access_token = async_client.cookies.get("access_token")
+    message_request = {
+        "content": "Hello friend!",
+        "created_at": datetime(2026, 1, 2, 0, 0, 0).isoformat(),
+        # Ignored for direct messages: the sender is the token's user
+        "created_by": "someone_else",
+        "recipient": "friend",
+    }
+
+    response = await async_client.post(
+        "/api/send-message", json=message_request, headers={"Authorization": f"Bearer {access_token}"}
+    )
+
+    assert response.status_code == 200
+
+
+@pytest.mark.order(after="test_send_direct_message")
+@pytest.mark.asyncio
+async def test_direct_messages(async_client: httpx.AsyncClient) -> None:
+    access_token = async_client.cookies.get("access_token")
+    response = await async_client.get(
+        "/api/direct-messages", params={"with_user": "friend"}, headers={"Authorization": f"Bearer {access_token}"}
+    )
+
+    assert response.status_code == 200
+    messages = response.json()["messages"]
+    assert [(message["content"], message["created_by"], message["recipient"]) for message in messages] == [
+        ("Hello friend!", "testname", "friend")
+    ]
+
+
+@pytest.mark.order(after="test_direct_messages")
+@pytest.mark.asyncio
+async def test_direct_messages_as_unauthorized(async_client: httpx.AsyncClient) -> None:
+    response = await async_client.get("/api/direct-messages", params={"with_user": "friend"})
+
+    assert response.status_code == 401
+
+
+@pytest.mark.order(after="test_direct_messages_as_unauthorized")
+@pytest.mark.asyncio
+async def test_direct_messages_pages_both_directions(async_client: httpx.AsyncClient) -> None:
+    headers = {"Authorization": f"Bearer {async_client.cookies.get('access_token')}"}
+    friend_headers = {"Authorization": f"Bearer {create_access_token({'sub': 'friend'})}"}
+    for content in ("Hi!", "How are you?"):
+        message_request = {
+            "content": content,
+            "created_at": datetime(2026, 1, 2, 0, 0, 0).isoformat(),
+            "created_by": "friend",
+            "recipient": "testname",
+        }
+        await async_client.post("/api/send-message", json=message_request, headers=friend_headers)
+
+    newest = await async_client.get("/api/direct-messages", params={"with_user": "friend", "limit": 2}, headers=headers)
+    older = await async_client.get(
+        "/api/direct-messages",
+        params={"with_user": "friend", "limit": 2, "first_id": newest.json()["messages"][0]["id"]},
+        headers=headers,
+    )
+    too_many = await async_client.get(
+        "/api/direct-messages", params={"with_user": "friend", "limit": 10_000}, headers=headers
+    )
+
+    assert [message["content"] for message in newest.json()["messages"]] == ["Hi!", "How are you?"]
+    assert [message["content"] for message in older.json()["messages"]] == ["Hello friend!"]
+    assert too_many.status_code == 422
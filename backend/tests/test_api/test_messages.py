@@ -1,8 +1,13 @@
 from datetime import datetime
+from typing import Any
 
 import httpx
 import pytest
+from fastapi import FastAPI
 
+from src.core.page_cache import fresh_key
+from src.database.db import get_db
+from src.routes.chat import messages_cache_key
 from src.schemas.config import settings
 
 from ..conftest import create_expired_token
@@ -63,3 +68,231 @@ async def test_messages_not_empty(async_client: httpx.AsyncClient) -> None:
             "created_by": "testname",
         }
     ]
+
+
+@pytest.mark.order(after="test_messages_not_empty")
+@pytest.mark.asyncio
+async def test_messages_other_room_empty(async_client: httpx.AsyncClient) -> None:
+    access_token = async_client.cookies.get("access_token")
+    response = await async_client.get(
+        "/api/messages", params={"room": "other"}, headers={"Authorization": f"Bearer {access_token}"}
+    )
+
+    assert response.status_code == 200
+    assert response.json()["messages"] == []
+
+
+@pytest.mark.order(after="test_messages_other_room_empty")
+@pytest.mark.asyncio
+async def test_messages_not_modified(async_client: httpx.AsyncClient) -> None:
+    access_token = async_client.cookies.get("access_token")
+    headers = {"Authorization": f"Bearer {access_token}"}
+    response = await async_client.get("/api/messages", headers=headers)
+    etag = response.headers["ETag"]
+    assert response.headers["Cache-Control"] == "public, no-cache"
+
+    response = await async_client.get("/api/messages", headers={**headers, "If-None-Match": etag})
+
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert response.content == b""
+
+
+@pytest.mark.order(after="test_messages_not_modified")
+@pytest.mark.asyncio
+async def test_messages_stale_refreshed(async_client: httpx.AsyncClient, redis_connection: Any) -> None:
+    access_token = async_client.cookies.get("access_token")
+    headers = {"Authorization": f"Bearer {access_token}"}
+    messages = (await async_client.get("/api/messages", headers=headers)).json()
+    # The soft TTL of the newest page runs out
+    await redis_connection.delete(fresh_key(messages_cache_key("general", 20, "last")))
+
+    response = await async_client.get("/api/messages", headers=headers)
+
+    assert response.headers["X-Cache"] == "STALE"
+    assert response.json() == messages
+    response = await async_client.get("/api/messages", headers=headers)
+    assert response.headers["X-Cache"] == "HIT"
+
+
+@pytest.mark.order(after="test_messages_stale_refreshed")
+@pytest.mark.asyncio
+async def test_messages_gzipped(
+    async_client: httpx.AsyncClient, redis_connection: Any, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    access_token = async_client.cookies.get("access_token")
+    headers = {"Authorization": f"Bearer {access_token}"}
+    messages = (await async_client.get("/api/messages", headers=headers)).json()
+    monkeypatch.setattr(settings, "COMPRESS_MIN_BYTES", 0)
+    await redis_connection.delete(messages_cache_key("general", 20, "last"))
+
+    response = await async_client.get("/api/messages", headers={**headers, "Accept-Encoding": "gzip"})
+
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.json() == messages
+    assert (await redis_connection.get(messages_cache_key("general", 20, "last"))).startswith("gz:")
+    gzip_etag = response.headers["ETag"]
+    response = await async_client.get("/api/messages", headers={**headers, "Accept-Encoding": "identity"})
+    assert "Content-Encoding" not in response.headers
+    assert response.json() == messages
+    # Each content-coding has its own strong validator, and either one revalidates.
+    assert response.headers["ETag"] != gzip_etag
+    response = await async_client.get(
+        "/api/messages", headers={**headers, "Accept-Encoding": "gzip", "If-None-Match": gzip_etag}
+    )
+    assert response.status_code == 304
+    assert response.headers["ETag"] == gzip_etag
+
+
+@pytest.mark.order(after="test_messages_gzipped")
+@pytest.mark.asyncio
+async def test_messages_fill_opens_its_own_session(
+    app: FastAPI, async_client: httpx.AsyncClient, redis_connection: Any
+) -> None:
+    access_token = async_client.cookies.get("access_token")
+    headers = {"Authorization": f"Bearer {access_token}"}
+    await redis_connection.delete(messages_cache_key("general", 20, "last"))
+
+    # A fill may outlive the request that started it, so it cannot use the request's session.
+    def no_request_session() -> None:
+        raise AssertionError("request session used")
+
+    app.dependency_overrides[get_db], original = no_request_session, app.dependency_overrides[get_db]
+    try:
+        response = await async_client.get("/api/messages", headers=headers)
+    finally:
+        app.dependency_overrides[get_db] = original
+
+    assert response.status_code == 200
+    assert response.headers["X-Cache"] == "MISS"
+    assert response.json()["messages"]
+
+
+@pytest.mark.order(after="tests/test_api/test_update_message.py::test_update_message_with_expired_token")
+@pytest.mark.asyncio
+async def test_messages_cursor_pages(async_client: httpx.AsyncClient) -> None:
+    access_token = async_client.cookies.get("access_token")
+    headers = {"Authorization": f"Bearer {access_token}"}
+    for content in ("First", "Second", "Third"):
+        message_request = {
+            "content": content,
+            "created_at": datetime(2026, 1, 3, 0, 0, 0).isoformat(),
+            "created_by": "testname",
+            "room": "paging",
+        }
+        await async_client.post("/api/send-message", json=message_request, headers=headers)
+
+    newest = (await async_client.get("/api/messages", params={"room": "paging", "limit": 2}, headers=headers)).json()
+    older = (
+        await async_client.get(
+            "/api/messages", params={"room": "paging", "limit": 2, "cursor": newest["before_cursor"]}, headers=headers
+        )
+    ).json()
+    newer = (
+        await async_client.get(
+            "/api/messages", params={"room": "paging", "limit": 2, "cursor": older["after_cursor"]}, headers=headers
+        )
+    ).json()
+
+    assert [message["content"] for message in newest["messages"]] == ["Second", "Third"]
+    assert [message["content"] for message in older["messages"]] == ["First"]
+    assert older["before_cursor"] is None
+    assert newer["messages"] == newest["messages"]
+
+
+@pytest.mark.order(after="test_messages_cursor_pages")
+@pytest.mark.asyncio
+async def test_messages_by_time(async_client: httpx.AsyncClient) -> None:
+    access_token = async_client.cookies.get("access_token")
+    headers = {"Authorization": f"Bearer {access_token}"}
+    for content, day in (("Monday", 5), ("Tuesday", 6), ("Wednesday", 7)):
+        message_request = {
+            "content": content,
+            "created_at": datetime(2026, 1, day, 12, 0, 0).isoformat(),
+            "created_by": "testname",
+            "room": "calendar",
+        }
+        await async_client.post("/api/send-message", json=message_request, headers=headers)
+
+    before = (
+        await async_client.get(
+            "/api/messages",
+            params={"room": "calendar", "limit": 1, "before": "2026-01-07T00:00:00+00:00"},
+            headers=headers,
+        )
+    ).json()
+    after = (
+        await async_client.get(
+            "/api/messages", params={"room": "calendar", "after": "2026-01-06T13:00:00"}, headers=headers
+        )
+    ).json()
+    both = await async_client.get(
+        "/api/messages",
+        params={"room": "calendar", "before": "2026-01-07T00:00:00", "after": "2026-01-05T00:00:00"},
+        headers=headers,
+    )
+    older = (
+        await async_client.get(
+            "/api/messages", params={"room": "calendar", "cursor": before["before_cursor"]}, headers=headers
+        )
+    ).json()
+
+    assert [message["content"] for message in before["messages"]] == ["Tuesday"]
+    assert [message["content"] for message in after["messages"]] == ["Wednesday"]
+    assert both.status_code == 422
+    assert [message["content"] for message in older["messages"]] == ["Monday"]
+
+
+@pytest.mark.order(after="test_messages_by_time")
+@pytest.mark.asyncio
+async def test_messages_time_cursors_follow_time_order(async_client: httpx.AsyncClient) -> None:
+    access_token = async_client.cookies.get("access_token")
+    headers = {"Authorization": f"Bearer {access_token}"}
+    # Sent out of time order, two of them at the same moment.
+    for content, day in (("Thursday", 8), ("Monday", 5), ("Wednesday", 7), ("Wednesday again", 7), ("Tuesday", 6)):
+        message_request = {
+            "content": content,
+            "created_at": datetime(2026, 1, day, 12, 0, 0).isoformat(),
+            "created_by": "testname",
+            "room": "timeline",
+        }
+        await async_client.post("/api/send-message", json=message_request, headers=headers)
+
+    seen: list[str] = []
+    params: dict[str, str | int] = {"room": "timeline", "limit": 1, "after": "2026-01-01T00:00:00"}
+    while True:
+        page = (await async_client.get("/api/messages", params=params, headers=headers)).json()
+        if not page["messages"]:
+            break
+        seen.extend(message["content"] for message in page["messages"])
+        params = {"room": "timeline", "limit": 1, "cursor": page["after_cursor"]}
+
+    backwards: list[str] = []
+    params = {"room": "timeline", "limit": 2, "before": "2026-02-01T00:00:00"}
+    while True:
+        page = (await async_client.get("/api/messages", params=params, headers=headers)).json()
+        backwards[:0] = [message["content"] for message in page["messages"]]
+        if page["before_cursor"] is None:
+            break
+        params = {"room": "timeline", "limit": 2, "cursor": page["before_cursor"]}
+
+    expected = ["Monday", "Tuesday", "Wednesday", "Wednesday again", "Thursday"]
+    assert seen == expected
+    assert backwards == expected
+
+
+@pytest.mark.order(after="test_messages_time_cursors_follow_time_order")
+@pytest.mark.asyncio
+async def test_messages_invalid_cursor(async_client: httpx.AsyncClient) -> None:
+    access_token = async_client.cookies.get("access_token")
+    headers = {"Authorization": f"Bearer {access_token}"}
+    cursor = (await async_client.get("/api/messages", params={"room": "paging", "limit": 2}, headers=headers)).json()[
+        "before_cursor"
+    ]
+
+    # Cursors are bound to their room
+    response = await async_client.get("/api/messages", params={"cursor": cursor}, headers=headers)
+
+    assert response.status_code == 400
+    assert response.headers["X-Error-Code"] == "INVALID_CURSOR"
@@ -0,0 +1,37 @@
+import httpx
+import pytest
+
+
+@pytest.mark.order(after="tests/test_api/test_direct_messages.py::test_direct_messages_pages_both_directions")
+@pytest.mark.asyncio
+async def test_sync(async_client: httpx.AsyncClient) -> None:
+    access_token = async_client.cookies.get("access_token")
+    response = await async_client.get("/api/sync", headers={"Authorization": f"Bearer {access_token}"})
+
+    assert response.status_code == 200
+    data = response.json()
+    # The edited and then deleted message comes back once, as a tombstone; direct messages are left out
+    assert [(message["id"], message["content"], message["deleted"]) for message in data["messages"]] == [(1, "", True)]
+    assert data["cursor"] == data["messages"][0]["revision"]
+    assert data["has_more"] is False
+
+
+@pytest.mark.order(after="test_sync")
+@pytest.mark.asyncio
+async def test_sync_since_cursor(async_client: httpx.AsyncClient) -> None:
+    access_token = async_client.cookies.get("access_token")
+    headers = {"Authorization": f"Bearer {access_token}"}
+    cursor = (await async_client.get("/api/sync", headers=headers)).json()["cursor"]
+
+    response = await async_client.get("/api/sync", params={"since": cursor}, headers=headers)
+
+    assert response.status_code == 200
+    assert response.json() == {"messages": [], "cursor": cursor, "has_more": False}
+
+
+@pytest.mark.order(after="test_sync_since_cursor")
+@pytest.mark.asyncio
+async def test_sync_as_unauthorized(async_client: httpx.AsyncClient) -> None:
+    response = await async_client.get("/api/sync")
+
+    assert response.status_code == 401
@@ -1,16 +1,33 @@
+import msgpack
+import pytest
 from fastapi import FastAPI
 from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from src.core.connection_manager import manager
+from src.utils import create_access_token
+
+
+def ws_url(username: str) -> str:
+    return f"/api/ws?token={create_access_token({'sub': username})}"
+
+
+@pytest.fixture(autouse=True)
+def immediate_presence(monkeypatch: pytest.MonkeyPatch) -> None:
+    # Every TestClient WebSocket session runs on its own event loop, so a deferred roster flush
+    # scheduled from one session cannot be relied on to run; broadcast presence synchronously instead.
+    monkeypatch.setattr(manager, "presence_window", 0)
 
 
 def test_ws(app: FastAPI) -> None:
     client1 = TestClient(app)
     client2 = TestClient(app)
 
-    with client1.websocket_connect("/api/ws?username=testname1") as websocket1:
+    with client1.websocket_connect(ws_url("testname1")) as websocket1:
         data1 = websocket1.receive_json()
         assert data1["userlist"] == ["testname1"]
 
-        with client2.websocket_connect("/api/ws?username=testname2") as websocket2:
+        with client2.websocket_connect(ws_url("testname2")) as websocket2:
             data1 = websocket1.receive_json()
             data2 = websocket2.receive_json()
 
@@ -30,3 +47,97 @@ def test_ws(app: FastAPI) -> None:
 
         data1 = websocket1.receive_json()
         assert data1["userlist"] == ["testname1"]
+
+
+def test_ws_heartbeat(app: FastAPI, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(manager, "heartbeat_interval", 0.05)
+    client = TestClient(app)
+
+    with client.websocket_connect(ws_url("testname1")) as websocket:
+        assert websocket.receive_json()["userlist"] == ["testname1"]
+        assert websocket.receive_json() == {"type": "ping"}
+        websocket.send_text('{"type":"pong"}')
+        assert websocket.receive_json() == {"type": "ping"}
+
+
+def test_ws_msgpack(app: FastAPI) -> None:
+    client1 = TestClient(app)
+    client2 = TestClient(app)
+
+    with client1.websocket_connect(ws_url("testname1"), subprotocols=["chat.msgpack"]) as websocket1:
+        assert websocket1.accepted_subprotocol == "chat.msgpack"
+        assert msgpack.unpackb(websocket1.receive_bytes()) == {"userlist": ["testname1"]}
+
+        with client2.websocket_connect(ws_url("testname2")) as websocket2:
+            websocket1.receive_bytes()
+            websocket2.receive_json()
+
+            websocket1.send_bytes(msgpack.packb({"content": "Hi", "created_by": "testname1"}))
+            assert msgpack.unpackb(websocket1.receive_bytes()) == {"content": "Hi", "created_by": "testname1"}
+            assert websocket2.receive_json() == {"content": "Hi", "created_by": "testname1"}
+
+
+def test_ws_requires_token(app: FastAPI) -> None:
+    client = TestClient(app)
+
+    for url in ("/api/ws", "/api/ws?token=forged", "/api/ws?username=testname1"):
+        with pytest.raises(WebSocketDisconnect) as rejected:
+            with client.websocket_connect(url):
+                pass
+        assert rejected.value.code == 1008
+
+
+def test_ws_direct_message_sender_from_token(app: FastAPI) -> None:
+    client1 = TestClient(app)
+    client2 = TestClient(app)
+
+    with client1.websocket_connect(ws_url("testname1")) as websocket1:
+        websocket1.receive_json()
+        with client2.websocket_connect(ws_url("testname2")) as websocket2:
+            websocket1.receive_json()
+            websocket2.receive_json()
+
+            websocket1.send_text('{"content": "psst", "created_by": "testname3", "recipient": "testname2"}')
+            expected = {"content": "psst", "created_by": "testname1", "recipient": "testname2"}
+            assert websocket2.receive_json() == expected
+            assert websocket1.receive_json() == expected
+
+
+def test_ws_msgpack_bad_frames_keep_the_connection(app: FastAPI) -> None:
+    client = TestClient(app)
+
+    with client.websocket_connect(ws_url("testname1"), subprotocols=["chat.msgpack"]) as websocket:
+        websocket.receive_bytes()
+
+        websocket.send_bytes(msgpack.packb({"content": b"\x00\x01"}))
+        websocket.send_text('{"content": "Hi"}')
+
+        assert msgpack.unpackb(websocket.receive_bytes()) == {"content": "Hi"}
+
+
+def test_ws_oversized_malformed_frame_closes(app: FastAPI, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(manager, "max_frame_bytes", 64)
+    monkeypatch.setattr(manager, "limit_action", "close")
+    client = TestClient(app)
+
+    with client.websocket_connect(ws_url("testname1"), subprotocols=["chat.msgpack"]) as websocket:
+        websocket.receive_bytes()
+        websocket.send_bytes(b"\xc1" * 100)
+
+        with pytest.raises(WebSocketDisconnect) as closed:
+            websocket.receive_bytes()
+
+    assert closed.value.code == 1009
+
+
+def test_ws_unassigned_ids_are_not_replayed(app: FastAPI) -> None:
+    client1 = TestClient(app)
+    client2 = TestClient(app)
+
+    with client1.websocket_connect(ws_url("testname1") + "&room=replay") as websocket1:
+        websocket1.receive_json()
+        websocket1.send_text('{"id": 1000000000000, "content": "spoofed"}')
+        assert websocket1.receive_json()["content"] == "spoofed"
+
+        with client2.websocket_connect(ws_url("testname2") + "&room=replay&last_seen_id=0") as websocket2:
+            assert websocket2.receive_json() == {"type": "replay_gap", "last_seen_id": 0}
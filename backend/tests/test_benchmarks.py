@@ -0,0 +1,61 @@
+import pytest
+
+from benchmarks.stats import compare, percentile, summarize
+from benchmarks.ws_fanout import parse_args, run
+
+
+def test_percentile() -> None:
+    values = [float(value) for value in range(1, 101)]
+
+    assert percentile(values, 50) == 50
+    assert percentile(values, 95) == 95
+    assert percentile(values, 99) == 99
+    assert percentile([], 50) == 0
+
+
+def test_summarize() -> None:
+    summary = summarize([0.001, 0.002, 0.003, 0.004], elapsed=2, errors=1)
+
+    assert summary["requests"] == 4
+    assert summary["errors"] == 1
+    assert summary["error_rate"] == 0.25
+    assert summary["rps"] == 2
+    assert summary["p50_ms"] == pytest.approx(2)
+    assert summary["max_ms"] == pytest.approx(4)
+
+
+def test_compare_detects_regressions() -> None:
+    baseline = {"messages": {"p50_ms": 10.0, "p95_ms": 20.0, "p99_ms": 30.0, "rps": 100.0}}
+    current = {"messages": {"p50_ms": 10.5, "p95_ms": 25.0, "p99_ms": 30.0, "rps": 80.0}}
+
+    regressions = compare(baseline, current, threshold=0.1)
+
+    assert len(regressions) == 2
+    assert regressions[0].startswith("messages.p95_ms")
+    assert regressions[1].startswith("messages.rps")
+
+
+def test_compare_detects_new_errors() -> None:
+    baseline = {"token": {"p50_ms": 10.0, "rps": 100.0, "error_rate": 0.0}}
+    current = {"token": {"p50_ms": 2.0, "rps": 400.0, "error_rate": 0.36}}
+
+    assert compare(baseline, current, threshold=0.1) == ["token.error_rate: 0.0000 -> 0.3600"]
+
+
+def test_compare_ignores_unknown_scenarios() -> None:
+    current = {"token": {"p50_ms": 10.0, "p95_ms": 20.0, "p99_ms": 30.0, "rps": 100.0}}
+
+    assert compare({}, current, threshold=0.1) == []
+
+
+@pytest.mark.asyncio
+async def test_ws_fanout_smoke() -> None:
+    args = parse_args(["--clients", "20", "--messages", "5", "--rate", "1000", "--scenarios", "baseline", "slow"])
+    args.slow_delay = 0.001
+
+    results = await run(args)
+
+    assert results["baseline"]["delivered"] == 100
+    assert results["baseline"]["undelivered"] == 0
+    assert results["slow"]["delivered"] == 100
+    assert results["slow"]["p99_ms"] >= 1
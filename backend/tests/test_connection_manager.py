@@ -0,0 +1,435 @@
+import asyncio
+import json
+from typing import Any
+
+import msgpack
+import pytest
+from fastapi import status
+
+from src.core.connection_manager import (
+    HEARTBEAT_TIMEOUT_CLOSE_CODE,
+    PING_FRAME,
+    ConnectionManager,
+    direct_recipient,
+    message_id,
+)
+from src.core.metrics import WS_EVICTIONS, WS_REJECTED_FRAMES
+from src.core.ws_protocol import MSGPACK_PROTOCOL
+
+
+class StubWebSocket:
+    def __init__(self) -> None:
+        self.sent: list[str] = []
+        self.sent_bytes: list[bytes] = []
+        self.closed_with: int | None = None
+
+    async def accept(self, subprotocol: str | None = None) -> None:
+        return None
+
+    async def close(self, code: int = 1000, reason: str | None = None) -> None:
+        self.closed_with = code
+
+    async def send_text(self, data: str) -> None:
+        self.sent.append(data)
+
+    async def send_bytes(self, data: bytes) -> None:
+        self.sent_bytes.append(data)
+
+    def userlists(self) -> list[Any]:
+        return [json.loads(frame)["userlist"] for frame in self.sent if frame.startswith('{"userlist"')]
+
+
+class BrokenWebSocket(StubWebSocket):
+    async def send_text(self, data: str) -> None:
+        if self.sent:
+            raise RuntimeError("Connection reset by peer")
+        await super().send_text(data)
+
+
+class StalledWebSocket(StubWebSocket):
+    async def send_text(self, data: str) -> None:
+        if self.sent:
+            await asyncio.Event().wait()
+        await super().send_text(data)
+
+
+@pytest.mark.asyncio
+async def test_single_join_is_broadcast_immediately() -> None:
+    manager = ConnectionManager(presence_window=10)
+    websocket = StubWebSocket()
+
+    await manager.connect(websocket, "testname1")  # type: ignore[arg-type]
+
+    assert websocket.userlists() == [["testname1"]]
+
+
+@pytest.mark.asyncio
+async def test_connect_storm_is_coalesced() -> None:
+    manager = ConnectionManager(presence_window=0.05)
+    websockets = [StubWebSocket() for _ in range(10)]
+
+    for index, websocket in enumerate(websockets):
+        await manager.connect(websocket, f"testname{index}")  # type: ignore[arg-type]
+    await manager.disconnect(websockets[-1])  # type: ignore[arg-type]
+    await asyncio.sleep(0.1)
+
+    assert websockets[0].userlists() == [["testname0"], [f"testname{index}" for index in range(9)]]
+    assert websockets[1].userlists() == [[f"testname{index}" for index in range(9)]]
+
+
+@pytest.mark.asyncio
+async def test_zero_window_broadcasts_every_change() -> None:
+    manager = ConnectionManager(presence_window=0)
+    websocket1, websocket2 = StubWebSocket(), StubWebSocket()
+
+    await manager.connect(websocket1, "testname1")  # type: ignore[arg-type]
+    await manager.connect(websocket2, "testname2")  # type: ignore[arg-type]
+    await manager.disconnect(websocket2)  # type: ignore[arg-type]
+
+    assert websocket1.userlists() == [["testname1"], ["testname1", "testname2"], ["testname1"]]
+
+
+@pytest.mark.asyncio
+async def test_heartbeat_pings_live_socket() -> None:
+    manager = ConnectionManager(presence_window=0, heartbeat_interval=0.01, heartbeat_timeout=10)
+    websocket = StubWebSocket()
+    await manager.connect(websocket, "testname1")  # type: ignore[arg-type]
+
+    assert await manager.heartbeat(websocket) is True  # type: ignore[arg-type]
+    assert websocket.sent[-1] == PING_FRAME
+
+
+@pytest.mark.asyncio
+async def test_heartbeat_evicts_stalled_socket_after_send_timeout() -> None:
+    manager = ConnectionManager(presence_window=0, heartbeat_interval=10, heartbeat_timeout=60, send_timeout=0.01)
+    websocket = StalledWebSocket()
+    await manager.connect(websocket, "testname1")  # type: ignore[arg-type]
+    evictions = WS_EVICTIONS.value(reason="send_timeout")
+
+    assert await asyncio.wait_for(manager.heartbeat(websocket), timeout=1) is False  # type: ignore[arg-type]
+
+    assert websocket not in manager.activate_connections
+    assert WS_EVICTIONS.value(reason="send_timeout") == evictions + 1
+
+
+@pytest.mark.asyncio
+async def test_heartbeat_evicts_silent_socket() -> None:
+    manager = ConnectionManager(presence_window=0, heartbeat_interval=0.01, heartbeat_timeout=0.01)
+    websocket1, websocket2 = StubWebSocket(), StubWebSocket()
+    await manager.connect(websocket1, "testname1")  # type: ignore[arg-type]
+    await manager.connect(websocket2, "testname2")  # type: ignore[arg-type]
+    evictions = WS_EVICTIONS.value(reason="heartbeat")
+
+    await asyncio.sleep(0.02)
+    manager.touch(websocket1)  # type: ignore[arg-type]
+
+    assert await manager.reap() == 1
+    assert websocket2.closed_with == HEARTBEAT_TIMEOUT_CLOSE_CODE
+    assert websocket1.userlists()[-1] == ["testname1"]
+    assert WS_EVICTIONS.value(reason="heartbeat") == evictions + 1
+    assert await manager.heartbeat(websocket2) is False  # type: ignore[arg-type]
+
+
+@pytest.mark.asyncio
+async def test_broadcast_evicts_broken_socket() -> None:
+    manager = ConnectionManager(presence_window=0)
+    websocket, broken = StubWebSocket(), BrokenWebSocket()
+    await manager.connect(broken, "broken")  # type: ignore[arg-type]
+    await manager.connect(websocket, "testname1")  # type: ignore[arg-type]
+
+    await manager.broadcast("Hello there")
+
+    assert "Hello there" in websocket.sent
+    assert list(manager.activate_connections) == [websocket]
+
+
+@pytest.mark.asyncio
+async def test_broadcast_evicts_stalled_socket() -> None:
+    manager = ConnectionManager(presence_window=0, send_timeout=0.05)
+    stalled, websocket = StalledWebSocket(), StubWebSocket()
+    evictions = WS_EVICTIONS.value(reason="send_timeout")
+    await manager.connect(stalled, "stalled")  # type: ignore[arg-type]
+    # Joining alone, the stalled peer has taken its roster; it stops reading from here on.
+    await manager.connect(websocket, "testname1")  # type: ignore[arg-type]
+
+    await asyncio.wait_for(manager.broadcast("Hello there"), timeout=1)
+
+    assert "Hello there" in websocket.sent
+    assert list(manager.activate_connections) == [websocket]
+    assert WS_EVICTIONS.value(reason="send_timeout") == evictions + 1
+
+
+@pytest.mark.asyncio
+async def test_admit_drops_frames_over_rate() -> None:
+    manager = ConnectionManager(presence_window=0, rate_limit=0.001, rate_burst=2, limit_action="drop")
+    websocket = StubWebSocket()
+    await manager.connect(websocket, "testname1")  # type: ignore[arg-type]
+    dropped = WS_REJECTED_FRAMES.value(reason="rate", action="drop")
+
+    results = [await manager.admit(websocket, "Hi") for _ in range(3)]  # type: ignore[arg-type]
+
+    assert results == [True, True, False]
+    assert websocket in manager.activate_connections
+    assert WS_REJECTED_FRAMES.value(reason="rate", action="drop") == dropped + 1
+
+
+@pytest.mark.asyncio
+async def test_admit_throttles_frames_over_rate() -> None:
+    manager = ConnectionManager(presence_window=0, rate_limit=100, rate_burst=1, limit_action="throttle")
+    websocket = StubWebSocket()
+    await manager.connect(websocket, "testname1")  # type: ignore[arg-type]
+
+    assert await manager.admit(websocket, "Hi") is True  # type: ignore[arg-type]
+    assert await manager.admit(websocket, "Hi") is True  # type: ignore[arg-type]
+
+
+@pytest.mark.asyncio
+async def test_admit_rate_limit_zero_is_off() -> None:
+    manager = ConnectionManager(presence_window=0, rate_limit=0, rate_burst=1, limit_action="throttle")
+    websocket = StubWebSocket()
+    await manager.connect(websocket, "testname1")  # type: ignore[arg-type]
+
+    for _ in range(3):
+        assert await asyncio.wait_for(manager.admit(websocket, "Hi"), timeout=1) is True  # type: ignore[arg-type]
+
+
+@pytest.mark.asyncio
+async def test_admit_closes_on_rate() -> None:
+    manager = ConnectionManager(presence_window=0, rate_limit=0.001, rate_burst=1, limit_action="close")
+    websocket = StubWebSocket()
+    await manager.connect(websocket, "testname1")  # type: ignore[arg-type]
+
+    assert await manager.admit(websocket, "Hi") is True  # type: ignore[arg-type]
+    assert await manager.admit(websocket, "Hi") is False  # type: ignore[arg-type]
+    assert websocket.closed_with == status.WS_1008_POLICY_VIOLATION
+    assert websocket not in manager.activate_connections
+
+
+@pytest.mark.asyncio
+async def test_admit_rejects_oversized_frame() -> None:
+    manager = ConnectionManager(presence_window=0, max_frame_bytes=8, limit_action="close")
+    websocket = StubWebSocket()
+    await manager.connect(websocket, "testname1")  # type: ignore[arg-type]
+
+    assert await manager.admit(websocket, "Hi") is True  # type: ignore[arg-type]
+    assert await manager.admit(websocket, "Привет") is False  # type: ignore[arg-type]
+    assert websocket.closed_with == status.WS_1009_MESSAGE_TOO_BIG
+
+
+@pytest.mark.asyncio
+async def test_admit_limits_malformed_frames() -> None:
+    manager = ConnectionManager(
+        presence_window=0, rate_limit=0.001, rate_burst=2, max_frame_bytes=8, limit_action="drop"
+    )
+    websocket = StubWebSocket()
+    await manager.connect(websocket, "testname1")  # type: ignore[arg-type]
+    malformed = WS_REJECTED_FRAMES.value(reason="malformed", action="drop")
+    oversized = WS_REJECTED_FRAMES.value(reason="size", action="drop")
+    flooded = WS_REJECTED_FRAMES.value(reason="rate", action="drop")
+
+    # Undecodable frames take tokens from the bucket like any other, and are then dropped.
+    assert await manager.admit(websocket, None, 4) is False  # type: ignore[arg-type]
+    assert await manager.admit(websocket, None, 4) is False  # type: ignore[arg-type]
+    assert await manager.admit(websocket, None, 4) is False  # type: ignore[arg-type]
+    assert await manager.admit(websocket, None, 9) is False  # type: ignore[arg-type]
+
+    assert WS_REJECTED_FRAMES.value(reason="malformed", action="drop") == malformed + 2
+    assert WS_REJECTED_FRAMES.value(reason="rate", action="drop") == flooded + 1
+    assert WS_REJECTED_FRAMES.value(reason="size", action="drop") == oversized + 1
+
+
+@pytest.mark.asyncio
+async def test_admit_closes_on_malformed_flood() -> None:
+    manager = ConnectionManager(presence_window=0, rate_limit=0.001, rate_burst=1, limit_action="close")
+    websocket = StubWebSocket()
+    await manager.connect(websocket, "testname1")  # type: ignore[arg-type]
+
+    assert await manager.admit(websocket, None, 4) is False  # type: ignore[arg-type]
+    assert websocket in manager.activate_connections
+    assert await manager.admit(websocket, None, 4) is False  # type: ignore[arg-type]
+    assert websocket.closed_with == status.WS_1008_POLICY_VIOLATION
+
+
+@pytest.mark.asyncio
+async def test_rooms_are_isolated() -> None:
+    manager = ConnectionManager(presence_window=0)
+    websocket1, websocket2, websocket3 = StubWebSocket(), StubWebSocket(), StubWebSocket()
+    await manager.connect(websocket1, "testname1", "room1")  # type: ignore[arg-type]
+    await manager.connect(websocket2, "testname2", "room1")  # type: ignore[arg-type]
+    await manager.connect(websocket3, "testname3", "room2")  # type: ignore[arg-type]
+
+    await manager.broadcast("Hello there", "room1")
+
+    assert "Hello there" in websocket1.sent
+    assert "Hello there" in websocket2.sent
+    assert "Hello there" not in websocket3.sent
+    assert websocket1.userlists()[-1] == ["testname1", "testname2"]
+    assert websocket3.userlists() == [["testname3"]]
+
+    await manager.disconnect(websocket3)  # type: ignore[arg-type]
+    assert "room2" not in manager.rooms
+
+
+@pytest.mark.asyncio
+async def test_send_direct_reaches_only_both_users() -> None:
+    manager = ConnectionManager(presence_window=0)
+    sender, sender_tab, recipient, recipient_tab, other = (StubWebSocket() for _ in range(5))
+    await manager.connect(sender, "testname1")  # type: ignore[arg-type]
+    await manager.connect(sender_tab, "testname1")  # type: ignore[arg-type]
+    await manager.connect(recipient, "testname2", "room2")  # type: ignore[arg-type]
+    await manager.connect(recipient_tab, "testname2")  # type: ignore[arg-type]
+    await manager.connect(other, "testname3")  # type: ignore[arg-type]
+
+    await manager.send_direct("testname1", "testname2", "psst")
+
+    assert all("psst" in websocket.sent for websocket in (sender, sender_tab, recipient, recipient_tab))
+    assert "psst" not in other.sent
+
+    await manager.disconnect(recipient)  # type: ignore[arg-type]
+    await manager.disconnect(recipient_tab)  # type: ignore[arg-type]
+    assert "testname2" not in manager.users
+
+
+def test_direct_recipient() -> None:
+    assert direct_recipient('{"content": "Hi", "recipient": "testname2"}') == "testname2"
+    assert direct_recipient('{"content": "Hi"}') is None
+    assert direct_recipient('{"content": "Hi", "recipient": null}') is None
+    assert direct_recipient('"recipient"') is None
+
+
+@pytest.mark.asyncio
+async def test_reconnect_replays_missed_messages() -> None:
+    manager = ConnectionManager(presence_window=0, replay_buffer_size=10)
+    websocket = StubWebSocket()
+    await manager.connect(websocket, "testname1")  # type: ignore[arg-type]
+    frames = [json.dumps({"id": index, "content": f"message{index}"}) for index in (1, 2, 3)]
+    for index, frame in enumerate(frames, 1):
+        await manager.broadcast(frame, frame_id=index)
+
+    reconnected = StubWebSocket()
+    await manager.connect(reconnected, "testname2", last_seen_id=1)  # type: ignore[arg-type]
+
+    assert reconnected.sent[:2] == frames[1:]
+    assert reconnected.userlists() == [["testname1", "testname2"]]
+
+
+@pytest.mark.asyncio
+async def test_reconnect_past_buffer_reports_gap() -> None:
+    manager = ConnectionManager(presence_window=0, replay_buffer_size=2)
+    await manager.connect(StubWebSocket(), "testname1")  # type: ignore[arg-type]
+    for index in (1, 2, 3, 4):
+        await manager.broadcast(json.dumps({"id": index, "content": f"message{index}"}), frame_id=index)
+
+    websocket = StubWebSocket()
+    await manager.connect(websocket, "testname2", last_seen_id=1)  # type: ignore[arg-type]
+
+    assert json.loads(websocket.sent[0]) == {"type": "replay_gap", "last_seen_id": 1}
+
+
+@pytest.mark.asyncio
+async def test_replay_buffer_dropped_with_the_room() -> None:
+    manager = ConnectionManager(presence_window=0, replay_buffer_size=10)
+    websocket = StubWebSocket()
+    await manager.connect(websocket, "testname1", "room1")  # type: ignore[arg-type]
+    await manager.broadcast(json.dumps({"id": 1, "content": "Hi"}), "room1", frame_id=1)
+    assert "room1" in manager.replay_buffers
+
+    await manager.disconnect(websocket)  # type: ignore[arg-type]
+    await manager.broadcast(json.dumps({"id": 2, "content": "Hi"}), "room1", frame_id=2)
+
+    assert manager.replay_buffers == {}
+
+
+@pytest.mark.asyncio
+async def test_client_frame_ids_are_not_replayed() -> None:
+    manager = ConnectionManager(presence_window=0, replay_buffer_size=10)
+    await manager.connect(StubWebSocket(), "testname1")  # type: ignore[arg-type]
+    await manager.broadcast(json.dumps({"id": 10**12, "content": "spoofed"}))
+    await manager.broadcast(json.dumps({"id": 1, "content": "Hi"}), frame_id=1)
+
+    websocket = StubWebSocket()
+    await manager.connect(websocket, "testname2", last_seen_id=0)  # type: ignore[arg-type]
+
+    assert websocket.sent[0] == json.dumps({"id": 1, "content": "Hi"})
+    assert "spoofed" not in "".join(websocket.sent)
+
+
+def test_message_id() -> None:
+    assert message_id('{"id": 3, "content": "Hi"}') == 3
+    assert message_id('{"content": "Hi"}') is None
+    assert message_id('{"id": "3"}') is None
+    assert message_id("Hello there") is None
+
+
+@pytest.mark.asyncio
+async def test_mixed_protocols_share_one_encoding() -> None:
+    manager = ConnectionManager(presence_window=0)
+    json_sockets = [StubWebSocket(), StubWebSocket()]
+    msgpack_sockets = [StubWebSocket(), StubWebSocket()]
+    for index, websocket in enumerate(json_sockets):
+        await manager.connect(websocket, f"json{index}")  # type: ignore[arg-type]
+    for index, websocket in enumerate(msgpack_sockets):
+        await manager.connect(websocket, f"msgpack{index}", subprotocol=MSGPACK_PROTOCOL)  # type: ignore[arg-type]
+
+    frame = json.dumps({"id": 1, "content": "Hi", "created_by": "json0"})
+    await manager.broadcast(frame)
+
+    assert [websocket.sent[-1] for websocket in json_sockets] == [frame, frame]
+    assert msgpack.unpackb(msgpack_sockets[0].sent_bytes[-1]) == json.loads(frame)
+    assert msgpack_sockets[0].sent_bytes[-1] is msgpack_sockets[1].sent_bytes[-1]
+    assert msgpack.unpackb(msgpack_sockets[1].sent_bytes[0]) == {"userlist": ["json0", "json1", "msgpack0", "msgpack1"]}
+    assert msgpack_sockets[0].sent == []
+
+
+@pytest.mark.asyncio
+async def test_quiet_room_is_not_batched() -> None:
+    manager = ConnectionManager(presence_window=0, batch_window=10, batch_rate_threshold=5)
+    websocket = StubWebSocket()
+    await manager.connect(websocket, "testname1")  # type: ignore[arg-type]
+
+    await manager.broadcast("Hello there")
+
+    assert websocket.sent[-1] == "Hello there"
+
+
+@pytest.mark.asyncio
+async def test_busy_room_is_batched() -> None:
+    manager = ConnectionManager(presence_window=0, batch_window=0.05, batch_rate_threshold=2)
+    websocket = StubWebSocket()
+    await manager.connect(websocket, "testname1")  # type: ignore[arg-type]
+
+    frames = [json.dumps({"id": index, "content": f"message{index}"}) for index in range(5)]
+    for frame in frames:
+        await manager.broadcast(frame)
+    await manager.broadcast("Hello there")
+    assert websocket.sent[1:] == frames[:2]
+
+    await asyncio.sleep(0.1)
+    assert json.loads(websocket.sent[-1]) == [json.loads(frame) for frame in frames[2:]] + ["Hello there"]
+
+
+@pytest.mark.asyncio
+async def test_drain_waits_for_batches() -> None:
+    manager = ConnectionManager(presence_window=0, batch_window=0.05, batch_rate_threshold=0)
+    websocket = StubWebSocket()
+    await manager.connect(websocket, "testname1")  # type: ignore[arg-type]
+
+    await manager.broadcast("Hello there")
+    assert websocket.sent[-1] != "Hello there"
+    await manager.drain(timeout=1)
+
+    assert json.loads(websocket.sent[-1]) == ["Hello there"]
+
+
+@pytest.mark.asyncio
+async def test_shutdown_cancels_pending_batches() -> None:
+    manager = ConnectionManager(presence_window=0, batch_window=10, batch_rate_threshold=0)
+    websocket = StubWebSocket()
+    await manager.connect(websocket, "testname1")  # type: ignore[arg-type]
+    await manager.broadcast("Hello there")
+    (flush,) = manager._batch_flushes.values()
+
+    await manager.shutdown()
+
+    assert flush.cancelled()
+    assert "Hello there" not in "".join(websocket.sent)
@@ -0,0 +1,31 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from src.core.cursor import decode_cursor, encode_cursor
+from src.exceptions import InvalidCursorError
+
+
+def test_cursor_round_trip() -> None:
+    assert decode_cursor("general", encode_cursor("general", "before", 42)) == ("before", 42, None)
+    assert decode_cursor("general", encode_cursor("general", "after", 7)) == ("after", 7, None)
+
+
+def test_time_cursor_round_trip() -> None:
+    created_at = datetime(2026, 1, 6, 12, 0, 0, 123456, tzinfo=timezone.utc)
+
+    assert decode_cursor("general", encode_cursor("general", "before", 42, created_at)) == ("before", 42, created_at)
+    # Stored timestamps may come back naive; they are UTC.
+    naive = created_at.replace(tzinfo=None)
+    assert decode_cursor("general", encode_cursor("general", "after", 7, naive)) == ("after", 7, created_at)
+
+
+@pytest.mark.parametrize("cursor", ["", "garbage", "YjQy.", "YTc.AAAAAAAAAAAAAAAA"])
+def test_invalid_cursor(cursor: str) -> None:
+    with pytest.raises(InvalidCursorError):
+        decode_cursor("general", cursor)
+
+
+def test_cursor_bound_to_room() -> None:
+    with pytest.raises(InvalidCursorError):
+        decode_cursor("other", encode_cursor("general", "before", 42))
@@ -0,0 +1,112 @@
+import io
+import json
+import logging
+import sys
+from logging.handlers import QueueHandler
+from typing import Any, Generator
+
+import pytest
+
+from src.core.logging_setup import JsonFormatter, RequestIdFilter, SamplingFilter, configure_logging
+from src.core.tracing import Trace, _trace
+
+
+def make_record(name: str, level: int = logging.DEBUG) -> logging.LogRecord:
+    return logging.LogRecord(name, level, __file__, 1, "Messages cache hit", None, None)
+
+
+@pytest.fixture
+def restore_root_logger() -> Generator[None, None, None]:
+    root = logging.getLogger()
+    handlers, level = list(root.handlers), root.level
+    yield
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    for handler in handlers:
+        root.addHandler(handler)
+    root.setLevel(level)
+
+
+def test_sampling_filter_keeps_one_in_every_interval() -> None:
+    sampling = SamplingFilter({"src.routes": 0.25, "src.routes.auth": 1.0, "src.noisy": 0})
+
+    kept = [sampling.filter(make_record("src.routes.chat")) for _ in range(8)]
+
+    assert kept == [True, False, False, False, True, False, False, False]
+    assert sampling.filter(make_record("src.routes.auth"))
+    assert not sampling.filter(make_record("src.noisy"))
+    assert sampling.filter(make_record("src.app"))
+    assert sampling.filter(make_record("src.noisy", logging.WARNING))
+
+
+def test_json_formatter() -> None:
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        record = logging.LogRecord("src.app", logging.ERROR, __file__, 1, "Failed %s", ("twice",), sys.exc_info())
+
+    entry = json.loads(JsonFormatter().format(record))
+
+    assert entry["level"] == "ERROR"
+    assert entry["logger"] == "src.app"
+    assert entry["message"] == "Failed twice"
+    assert "ValueError: boom" in entry["exc_info"]
+    assert "request_id" not in entry
+
+
+def test_json_formatter_includes_request_id() -> None:
+    record = make_record("src.routes.chat", logging.INFO)
+    token = _trace.set(Trace(request_id="ab" * 16))
+    try:
+        RequestIdFilter().filter(record)
+    finally:
+        _trace.reset(token)
+
+    assert json.loads(JsonFormatter().format(record))["request_id"] == "ab" * 16
+
+
+def test_configure_logging_writes_from_queue(tmp_path: Any, restore_root_logger: None) -> None:
+    log_path = tmp_path / "app.log"
+    config_path = tmp_path / "logging.ini"
+    config_path.write_text(
+        "[loggers]\nkeys=root\n[handlers]\nkeys=file\n[formatters]\nkeys=plain\n"
+        "[logger_root]\nlevel=DEBUG\nhandlers=file\n"
+        f"[handler_file]\nclass=FileHandler\nlevel=DEBUG\nformatter=plain\nargs=({str(log_path)!r},)\n"
+        "[formatter_plain]\nformat=%(message)s\n"
+    )
+
+    (listener,) = configure_logging(str(config_path), "json", {"src.routes.chat": 0.5})
+    for _ in range(4):
+        logging.getLogger("src.routes.chat").debug("Messages cache hit")
+    logging.getLogger("src.app").info("Started")
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
+
+    entries = [json.loads(line) for line in log_path.read_text().splitlines()]
+    assert [entry["message"] for entry in entries] == ["Messages cache hit", "Messages cache hit", "Started"]
+
+
+def test_configure_logging_queues_uvicorn_handlers(tmp_path: Any, restore_root_logger: None) -> None:
+    config_path = tmp_path / "logging.ini"
+    config_path.write_text(
+        "[loggers]\nkeys=root\n[handlers]\nkeys=\n[formatters]\nkeys=\n[logger_root]\nlevel=DEBUG\nhandlers=\n"
+    )
+    access = logging.getLogger("uvicorn.access")
+    stream = io.StringIO()
+    # As uvicorn's default config leaves it when it runs the app
+    access_handler = logging.StreamHandler(stream)
+    access.addHandler(access_handler)
+    try:
+        listeners = configure_logging(str(config_path), "text", {})
+        assert [type(handler) for handler in access.handlers] == [QueueHandler]
+
+        access.info('127.0.0.1:5000 - "GET /api/messages HTTP/1.1" 200')
+        for listener in listeners:
+            listener.stop()
+    finally:
+        for handler in list(access.handlers):
+            access.removeHandler(handler)
+
+    assert listeners[1].handlers == (access_handler,)
+    assert stream.getvalue() == '127.0.0.1:5000 - "GET /api/messages HTTP/1.1" 200\n'
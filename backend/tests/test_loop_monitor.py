@@ -0,0 +1,48 @@
+import asyncio
+import logging
+import time
+
+import pytest
+
+from src.core.loop_monitor import LoopMonitor
+from src.core.metrics import EVENT_LOOP_BLOCKS, EVENT_LOOP_LAG
+
+
+def hold_the_loop(seconds: float) -> None:
+    time.sleep(seconds)
+
+
+@pytest.mark.asyncio
+async def test_blocking_call_is_measured_and_logged(caplog: pytest.LogCaptureFixture) -> None:
+    lag_samples, blocks = EVENT_LOOP_LAG.count(), EVENT_LOOP_BLOCKS.value()
+    monitor = LoopMonitor(interval=0.01, threshold=0.05)
+    task = asyncio.create_task(monitor.run())
+
+    with caplog.at_level(logging.WARNING, logger="src.core.loop_monitor"):
+        await asyncio.sleep(0.05)
+        hold_the_loop(0.3)
+        await asyncio.sleep(0.05)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    assert EVENT_LOOP_LAG.count() > lag_samples
+    assert EVENT_LOOP_LAG.sum() >= 0.2
+    # One stall, one report, with the blocking call in the captured stack
+    assert EVENT_LOOP_BLOCKS.value() == blocks + 1
+    (record,) = caplog.records
+    assert "Event loop blocked for" in record.getMessage()
+    assert "in hold_the_loop" in record.getMessage()
+
+
+@pytest.mark.asyncio
+async def test_idle_loop_is_not_reported(caplog: pytest.LogCaptureFixture) -> None:
+    task = asyncio.create_task(LoopMonitor(interval=0.01, threshold=0.2).run())
+
+    with caplog.at_level(logging.WARNING, logger="src.core.loop_monitor"):
+        await asyncio.sleep(0.1)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    assert not caplog.records
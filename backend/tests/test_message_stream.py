@@ -0,0 +1,138 @@
+import json
+import os
+from datetime import datetime, timezone
+from typing import Any, AsyncGenerator
+
+import fakeredis
+import pytest
+import pytest_asyncio
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from src.core.connection_manager import ConnectionManager
+from src.core.message_stream import DEAD_LETTER_KEY, MessageStream
+from src.core.page_version import MODIFICATIONS_KEY
+from src.core.redis_client import CACHE_MESSAGES_PREFIX
+from src.database.models.base import Base
+from src.database.models.message import Message
+from tests.test_connection_manager import StubWebSocket
+
+CREATED_AT = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest_asyncio.fixture
+async def stream_redis() -> AsyncGenerator[Any, None]:
+    redis_connection = fakeredis.FakeAsyncRedis(decode_responses=True)
+    yield redis_connection
+    await redis_connection.aclose()
+
+
+@pytest_asyncio.fixture
+async def session_factory(tmp_path: Any) -> AsyncGenerator[async_sessionmaker[AsyncSession], None]:
+    engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(tmp_path, 'stream.db')}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield async_sessionmaker(bind=engine, autocommit=False, autoflush=False)
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_ids_continue_after_database(stream_redis: Any) -> None:
+    stream = MessageStream(stream_redis)
+    await stream.seed_ids(41)
+    await stream.seed_ids(7)
+
+    assert await stream.append("Hi", CREATED_AT, "testname1", "general") == 42
+
+
+@pytest.mark.asyncio
+async def test_fan_out_delivers_to_room_and_recipient(stream_redis: Any) -> None:
+    stream = MessageStream(stream_redis)
+    manager = ConnectionManager(presence_window=0)
+    websocket1, websocket2 = StubWebSocket(), StubWebSocket()
+    await manager.connect(websocket1, "testname1")  # type: ignore[arg-type]
+    await manager.connect(websocket2, "testname2", room="other")  # type: ignore[arg-type]
+
+    await stream.append("Hello there", CREATED_AT, "testname1", "general")
+    await stream.append("Psst", CREATED_AT, "testname1", "general", recipient="testname2")
+    await stream.fan_out(manager.deliver, last_id="0", block_ms=10)
+
+    room_frames = [json.loads(frame) for frame in websocket1.sent if '"id"' in frame]
+    direct_frames = [json.loads(frame) for frame in websocket2.sent if '"id"' in frame]
+    assert [frame["content"] for frame in room_frames] == ["Hello there", "Psst"]
+    assert [frame["content"] for frame in direct_frames] == ["Psst"]
+    assert direct_frames[0]["recipient"] == "testname2"
+
+
+@pytest.mark.asyncio
+async def test_persist_batch_writes_messages_once(
+    stream_redis: Any, session_factory: async_sessionmaker[AsyncSession]
+) -> None:
+    stream = MessageStream(stream_redis)
+    await stream.create_group()
+    await stream_redis.set(CACHE_MESSAGES_PREFIX + "general:last_messages", "{}")
+    first_id = await stream.append("Hello there", CREATED_AT, "testname1", "general")
+    second_id = await stream.append("Hi", CREATED_AT, "testname2", "general")
+
+    assert await stream.persist_batch(session_factory, "consumer1", block_ms=10) == 2
+    assert await stream.persist_batch(session_factory, "consumer1", block_ms=10) == 0
+
+    async with session_factory() as session:
+        messages = (await session.execute(select(Message).order_by(Message.id))).scalars().all()
+    assert [(message.id, message.content) for message in messages] == [(first_id, "Hello there"), (second_id, "Hi")]
+    assert await stream_redis.get(CACHE_MESSAGES_PREFIX + "general:last_messages") is None
+
+
+@pytest.mark.asyncio
+async def test_persist_batch_claims_abandoned_entries(
+    stream_redis: Any, session_factory: async_sessionmaker[AsyncSession]
+) -> None:
+    stream = MessageStream(stream_redis)
+    await stream.create_group()
+    await stream.append("Hello there", CREATED_AT, "testname1", "general")
+    # A persister that read the entry and died before acknowledging it
+    await stream_redis.xreadgroup("persisters", "crashed", {stream.key: ">"})
+
+    assert await stream.persist_batch(session_factory, "consumer1", block_ms=10, claim_idle_ms=0) == 1
+    assert (await stream_redis.xpending(stream.key, "persisters"))["pending"] == 0
+
+
+@pytest.mark.asyncio
+async def test_persist_batch_dead_letters_malformed_entries(
+    stream_redis: Any, session_factory: async_sessionmaker[AsyncSession]
+) -> None:
+    stream = MessageStream(stream_redis)
+    await stream.create_group()
+    first_id = await stream.append("Hello there", CREATED_AT, "testname1", "general")
+    await stream_redis.xadd(stream.key, {"room": "general", "created_by": "testname1", "frame": "not json"})
+    bad_date = json.dumps({"id": 99, "content": "Hi", "created_at": "yesterday", "created_by": "x", "room": "general"})
+    await stream_redis.xadd(stream.key, {"room": "general", "created_by": "x", "frame": bad_date})
+    second_id = await stream.append("Hi", CREATED_AT, "testname2", "general")
+
+    assert await stream.persist_batch(session_factory, "consumer1", block_ms=10) == 4
+
+    async with session_factory() as session:
+        messages = (await session.execute(select(Message).order_by(Message.id))).scalars().all()
+    assert [message.id for message in messages] == [first_id, second_id]
+    assert (await stream_redis.xpending(stream.key, "persisters"))["pending"] == 0
+    dead_letters = await stream_redis.xrange(DEAD_LETTER_KEY)
+    assert [fields["frame"] for _, fields in dead_letters] == ["not json", bad_date]
+
+
+@pytest.mark.asyncio
+async def test_persist_batch_out_of_order_bumps_modifications(
+    stream_redis: Any, session_factory: async_sessionmaker[AsyncSession]
+) -> None:
+    stream = MessageStream(stream_redis)
+    await stream.create_group()
+    await stream.append("Hello there", CREATED_AT, "testname1", "general")
+    await stream.append("Hi", CREATED_AT, "testname2", "general")
+    # A slow persister holds the first message while another one lands the second
+    await stream_redis.xreadgroup("persisters", "slow", {stream.key: ">"}, count=1)
+    await stream_redis.set(MODIFICATIONS_KEY, 1)
+
+    assert await stream.persist_batch(session_factory, "consumer1", block_ms=10) == 1
+    assert await stream_redis.get(MODIFICATIONS_KEY) == "1"
+
+    assert await stream.persist_batch(session_factory, "consumer1", block_ms=10, claim_idle_ms=0) == 1
+    assert await stream_redis.get(MODIFICATIONS_KEY) == "2"
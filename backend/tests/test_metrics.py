@@ -0,0 +1,70 @@
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from src.core.metrics import HTTP_REQUEST_DURATION, MetricsMiddleware, MetricsRegistry
+from src.routes.metrics import router as metrics_router
+
+
+def test_counter_render() -> None:
+    registry = MetricsRegistry()
+    counter = registry.counter("test_total", "Test counter", ("result",))
+    counter.inc(result="hit")
+    counter.inc(2, result="hit")
+    counter.inc(result="miss")
+
+    rendered = registry.render()
+    assert "# TYPE test_total counter" in rendered
+    assert 'test_total{result="hit"} 3' in rendered
+    assert 'test_total{result="miss"} 1' in rendered
+
+
+def test_gauge_callback() -> None:
+    registry = MetricsRegistry()
+    registry.gauge("test_gauge", "Test gauge", callback=lambda: 7)
+
+    assert "test_gauge 7" in registry.render()
+
+
+def test_histogram_buckets_are_cumulative() -> None:
+    registry = MetricsRegistry()
+    histogram = registry.histogram("test_seconds", "Test histogram", buckets=(0.1, 1.0))
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+    histogram.observe(5)
+
+    rendered = registry.render()
+    assert 'test_seconds_bucket{le="0.1"} 1' in rendered
+    assert 'test_seconds_bucket{le="1"} 2' in rendered
+    assert 'test_seconds_bucket{le="+Inf"} 3' in rendered
+    assert "test_seconds_count 3" in rendered
+    assert histogram.sum() == pytest.approx(5.55)
+
+
+def test_duplicate_metric_name() -> None:
+    registry = MetricsRegistry()
+    registry.counter("test_total", "Test counter")
+
+    with pytest.raises(ValueError):
+        registry.counter("test_total", "Test counter")
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_records_route_template() -> None:
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+    app.include_router(metrics_router)
+
+    @app.get("/items/{item_id}")
+    async def read_item(item_id: int) -> dict[str, int]:
+        return {"item_id": item_id}
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        await client.get("/items/1")
+        await client.get("/items/2")
+        response = await client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert HTTP_REQUEST_DURATION.count(method="GET", route="/items/{item_id}", status="200") == 2
+    assert 'route="/items/{item_id}"' in response.text
@@ -0,0 +1,23 @@
+import fakeredis
+import pytest
+
+from src.core.page_cache import CachePolicy, fresh_key, get_cached, is_fresh, set_cached
+
+
+@pytest.mark.asyncio
+async def test_cached_value_turns_stale_after_soft_ttl() -> None:
+    redis_connection = fakeredis.FakeAsyncRedis(decode_responses=True)
+    policy = CachePolicy(soft_ttl=60, hard_ttl=3600)
+    assert await get_cached(redis_connection, "page") == (None, False)
+
+    await set_cached(redis_connection, "page", "value", policy)
+
+    assert await get_cached(redis_connection, "page") == ("value", False)
+    assert await is_fresh(redis_connection, "page")
+    assert 3590 < await redis_connection.ttl("page") <= 3600
+    assert 50 < await redis_connection.ttl(fresh_key("page")) <= 60
+
+    await redis_connection.delete(fresh_key("page"))
+
+    assert await get_cached(redis_connection, "page") == ("value", True)
+    assert not await is_fresh(redis_connection, "page")
@@ -0,0 +1,34 @@
+import gzip
+
+from src.core.page_codec import accepts_gzip, decode_page, encode_page, gzipped_page
+
+
+def test_small_pages_stay_plain() -> None:
+    entry = encode_page('{"messages": []}', 1024, 6)
+
+    assert entry == '{"messages": []}'
+    assert gzipped_page(entry) is None
+    assert decode_page(entry) == '{"messages": []}'
+
+
+def test_large_pages_are_gzipped() -> None:
+    serialized = '{"messages": [' + ", ".join(['{"content": "Hello world!"}'] * 100) + "]}"
+    entry = encode_page(serialized, 1024, 6)
+
+    assert entry.startswith("gz:")
+    assert len(entry) < len(serialized) / 4
+    gzipped = gzipped_page(entry)
+    assert gzipped is not None
+    assert gzip.decompress(gzipped).decode() == serialized
+    assert decode_page(entry) == serialized
+    assert encode_page(serialized, 1024, 6) == entry
+
+
+def test_accepts_gzip() -> None:
+    assert accepts_gzip("gzip, deflate, br")
+    assert accepts_gzip("br;q=1.0, GZIP;q=0.5")
+    assert accepts_gzip("*")
+    assert not accepts_gzip("gzip;q=0")
+    assert not accepts_gzip("identity")
+    assert not accepts_gzip("gzip;q=x")
+    assert not accepts_gzip(None)
@@ -0,0 +1,55 @@
+import fakeredis
+import pytest
+
+from src.core.page_version import (
+    bump_max_id,
+    bump_modifications,
+    etag_matches,
+    get_page_version,
+    gzip_etag,
+    page_etag,
+)
+
+
+def test_page_etag() -> None:
+    newest = page_etag("general", "last", 20, "5", "1")
+
+    assert page_etag("general", "last", 20, "6", "1") != newest
+    assert page_etag("general", "last", 20, "5", "2") != newest
+    assert page_etag("other", "last", 20, "5", "1") != newest
+    assert page_etag("general", "last", 50, "5", "1") != newest
+    # Older pages do not change when newer messages arrive, newer pages do
+    assert page_etag("general", "b3", 20, "5", "1") == page_etag("general", "b3", 20, "6", "1")
+    assert page_etag("general", "a3", 20, "5", "1") != page_etag("general", "a3", 20, "6", "1")
+
+
+def test_gzip_etag() -> None:
+    assert gzip_etag('"abc"') == '"abc-gzip"'
+
+
+def test_etag_matches() -> None:
+    assert etag_matches('"abc"', '"abc"')
+    assert etag_matches('"xyz", W/"abc"', '"abc"')
+    assert etag_matches("*", '"abc"')
+    assert not etag_matches('"xyz"', '"abc"')
+    assert not etag_matches(None, '"abc"')
+
+
+@pytest.mark.asyncio
+async def test_page_version_changes_with_messages_and_edits() -> None:
+    redis_connection = fakeredis.FakeAsyncRedis(decode_responses=True)
+    initial = await get_page_version(redis_connection, "general")
+    assert initial == await get_page_version(redis_connection, "general")
+
+    await bump_max_id(redis_connection, "general", 5)
+    await bump_max_id(redis_connection, "general", 4)
+    max_id, modifications = await get_page_version(redis_connection, "general")
+    assert (max_id, modifications) == ("5", initial[1])
+
+    await bump_modifications(redis_connection)
+    assert (await get_page_version(redis_connection, "general"))[1] != modifications
+
+    # A counter lost with the Redis data never comes back with an earlier value
+    await redis_connection.flushdb()
+    assert int((await get_page_version(redis_connection, "general"))[1]) > int(modifications)
+    await redis_connection.aclose()
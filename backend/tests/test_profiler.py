@@ -0,0 +1,121 @@
+import os
+import threading
+from collections import Counter
+from typing import Any, AsyncGenerator
+
+import httpx
+import pytest
+import pytest_asyncio
+from fastapi import FastAPI
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from src.core.profiler import Profile, sample, to_collapsed, to_speedscope
+from src.database.db import get_db
+from src.database.models.base import Base
+from src.database.models.user import User
+from src.routes.admin import router
+from src.schemas.config import settings
+from src.utils import create_access_token
+
+
+def spin(stop: threading.Event) -> None:
+    while not stop.is_set():
+        pass
+
+
+def test_sample_sees_other_threads() -> None:
+    stop = threading.Event()
+    worker = threading.Thread(target=spin, args=(stop,), name="spinner")
+    worker.start()
+    try:
+        profile = sample(0.05, 0.005)
+    finally:
+        stop.set()
+        worker.join()
+
+    spinner = [stack for stack in profile.stacks if stack[0] == "spinner"]
+    assert spinner
+    assert any(stack[-1].startswith("spin (tests/test_profiler.py:") for stack in spinner)
+    assert profile.duration >= 0.05
+
+
+def test_profile_formats() -> None:
+    profile = Profile(0.01, 0.05, Counter({("MainThread", "main", "serve"): 3, ("MainThread", "main"): 2}))
+
+    assert to_collapsed(profile) == "MainThread;main 2\nMainThread;main;serve 3\n"
+    speedscope = to_speedscope(profile)
+    assert speedscope["shared"]["frames"] == [{"name": "main"}, {"name": "serve"}]
+    (thread,) = speedscope["profiles"]
+    assert thread["name"] == "MainThread"
+    assert thread["samples"] == [[0], [0, 1]]
+    assert thread["weights"] == pytest.approx([0.02, 0.03])
+
+
+@pytest_asyncio.fixture
+async def admin_client(monkeypatch: pytest.MonkeyPatch, tmp_path: Any) -> AsyncGenerator[httpx.AsyncClient, None]:
+    monkeypatch.setattr(settings, "PROFILER_ENABLED", True)
+    engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(tmp_path, 'admin.db')}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(bind=engine, autocommit=False, autoflush=False)
+    async with session_factory() as session:
+        session.add_all(
+            [User(username="admin", hashed_password="-", is_admin=True), User(username="testname", hashed_password="-")]
+        )
+        await session.commit()
+
+    async def override_get_db() -> AsyncGenerator[AsyncSession, None]:
+        async with session_factory() as session:
+            yield session
+
+    app = FastAPI()
+    app.include_router(router, prefix="/api")
+    app.dependency_overrides[get_db] = override_get_db
+    yield httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+    await engine.dispose()
+
+
+def auth(username: str) -> dict[str, str]:
+    return {"Authorization": f"Bearer {create_access_token({'sub': username})}"}
+
+
+@pytest.mark.asyncio
+async def test_profile_endpoint(admin_client: httpx.AsyncClient) -> None:
+    async with admin_client as client:
+        collapsed = await client.get("/api/admin/profile", params={"seconds": 0.05}, headers=auth("admin"))
+        speedscope = await client.get(
+            "/api/admin/profile", params={"seconds": 0.05, "format": "speedscope"}, headers=auth("admin")
+        )
+
+    assert collapsed.status_code == 200
+    assert collapsed.headers["content-type"].startswith("text/plain")
+    # The event loop thread is sampled while it waits for the profile
+    assert "MainThread;" in collapsed.text
+    assert speedscope.status_code == 200
+    assert speedscope.json()["profiles"]
+
+
+@pytest.mark.asyncio
+async def test_profile_endpoint_is_admin_only(admin_client: httpx.AsyncClient) -> None:
+    async with admin_client as client:
+        anonymous = await client.get("/api/admin/profile")
+        user = await client.get("/api/admin/profile", headers=auth("testname"))
+        # A name with no account behind it, as an unregistered admin name would be
+        unknown = await client.get("/api/admin/profile", headers=auth("nobody"))
+        too_long = await client.get("/api/admin/profile", params={"seconds": 3600}, headers=auth("admin"))
+
+    assert anonymous.status_code == 401
+    assert user.status_code == 403
+    assert user.headers["X-Error-Code"] == "ADMIN_REQUIRED"
+    assert unknown.status_code == 403
+    assert too_long.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_profile_endpoint_disabled(admin_client: httpx.AsyncClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "PROFILER_ENABLED", False)
+
+    async with admin_client as client:
+        response = await client.get("/api/admin/profile", headers=auth("admin"))
+
+    assert response.status_code == 404
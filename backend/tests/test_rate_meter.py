@@ -0,0 +1,24 @@
+from time import sleep
+
+from src.core.rate_meter import RateMeter
+
+
+def test_rate_meter_counts_burst() -> None:
+    meter = RateMeter()
+
+    assert [meter.tick() for _ in range(3)] == [1, 2, 3]
+
+
+def test_rate_meter_forgets_idle_windows() -> None:
+    meter = RateMeter(window_start=0.0, current=50)
+
+    assert meter.tick() == 1
+
+
+def test_rate_meter_slides_over_previous_window() -> None:
+    meter = RateMeter()
+    meter.tick()
+    meter.window_start -= 1.0
+    sleep(0.01)
+
+    assert 1 < meter.tick() < 2
@@ -0,0 +1,48 @@
+from src.core.replay_buffer import ReplayBuffer
+
+
+def test_replay_buffer_since() -> None:
+    buffer = ReplayBuffer(size=3)
+    for message_id in (5, 6, 7):
+        buffer.append(message_id, f"frame{message_id}")
+
+    assert buffer.since(5) == ["frame6", "frame7"]
+    assert buffer.since(4) == ["frame5", "frame6", "frame7"]
+    assert buffer.since(7) == []
+
+
+def test_replay_buffer_gap() -> None:
+    buffer = ReplayBuffer(size=2)
+    assert buffer.since(1) is None
+
+    for message_id in (1, 2, 3):
+        buffer.append(message_id, f"frame{message_id}")
+
+    assert buffer.since(0) is None
+    assert buffer.since(1) == ["frame2", "frame3"]
+
+
+def test_replay_buffer_ignores_repeated_ids() -> None:
+    buffer = ReplayBuffer(size=3)
+    for message_id in (1, 2, 2, 1):
+        buffer.append(message_id, f"frame{message_id}")
+
+    assert buffer.since(0) == ["frame1", "frame2"]
+
+
+def test_replay_buffer_keeps_out_of_order_ids() -> None:
+    buffer = ReplayBuffer(size=3)
+    for message_id in (8, 11, 10):
+        buffer.append(message_id, f"frame{message_id}")
+
+    assert buffer.since(9) == ["frame10", "frame11"]
+
+
+def test_replay_buffer_late_id_past_the_end_moves_horizon() -> None:
+    buffer = ReplayBuffer(size=2)
+    for message_id in (8, 11, 12, 10):
+        buffer.append(message_id, f"frame{message_id}")
+
+    # 10 came too late to be kept, so a client that last saw 9 is told it has a gap.
+    assert buffer.since(9) is None
+    assert buffer.since(10) == ["frame11", "frame12"]
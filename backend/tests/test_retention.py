@@ -0,0 +1,85 @@
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncGenerator
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from src.database.db import (
+    archive_messages,
+    get_direct_messages,
+    get_max_message_id,
+    get_messages_by_time,
+    get_paginated_messages,
+)
+from src.database.models.base import Base
+from src.database.models.message import ArchivedMessage, Message
+
+NOW = datetime(2026, 10, 19, tzinfo=timezone.utc)
+
+
+@pytest_asyncio.fixture
+async def session(tmp_path: Any) -> AsyncGenerator[AsyncSession, None]:
+    engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(tmp_path, 'retention.db')}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with async_sessionmaker(bind=engine, autocommit=False, autoflush=False)() as session:
+        # Messages 1-5 are 50 to 10 days old, 6 and 7 are new; 2 was deleted just now and 3 is a direct message
+        session.add_all(
+            Message(
+                id=id,
+                content=f"Message {id}",
+                created_at=NOW - timedelta(days=60 - 10 * id) if id < 6 else NOW,
+                created_by="testname",
+                recipient="friend" if id == 3 else None,
+                revision=id,
+                deleted_at=NOW if id == 2 else None,
+            )
+            for id in range(1, 8)
+        )
+        await session.commit()
+        yield session
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_archive_moves_old_messages_in_batches(session: AsyncSession) -> None:
+    assert await archive_messages(session, NOW - timedelta(days=15), batch_size=2) == 2
+
+    archived = (await session.execute(select(ArchivedMessage.id).order_by(ArchivedMessage.id))).scalars().all()
+    live = (await session.execute(select(Message.id).order_by(Message.id))).scalars().all()
+    # The recent tombstone of message 2 stays for clients to sync, and direct messages are never archived
+    assert archived == [1, 4]
+    assert live == [2, 3, 5, 6, 7]
+    assert await get_max_message_id(session) == 7
+    assert await archive_messages(session, NOW - timedelta(days=15), batch_size=2) == 0
+
+
+@pytest.mark.asyncio
+async def test_tombstones_dropped_past_the_cutoff(session: AsyncSession) -> None:
+    # Deleted before the cutoff, the tombstone is dropped, and not counted as archived
+    assert await archive_messages(session, NOW + timedelta(days=1), batch_size=10) == 5
+
+    archived = (await session.execute(select(ArchivedMessage.id).order_by(ArchivedMessage.id))).scalars().all()
+    live = (await session.execute(select(Message.id).order_by(Message.id))).scalars().all()
+    assert archived == [1, 4, 5, 6, 7]
+    assert live == [3]
+
+
+@pytest.mark.asyncio
+async def test_pages_continue_into_archive(session: AsyncSession) -> None:
+    await archive_messages(session, NOW - timedelta(days=15), batch_size=10)
+
+    newest = await get_paginated_messages(session, 3)
+    older = await get_paginated_messages(session, 3, before=newest[0].id)
+    newer = await get_paginated_messages(session, 2, after=1)
+    by_time = await get_messages_by_time(session, 2, before=NOW - timedelta(days=5))
+    direct = await get_direct_messages(session, "testname", "friend", None, 10)
+
+    assert [message.id for message in newest] == [5, 6, 7]
+    assert [message.id for message in older] == [1, 4]
+    assert [message.id for message in newer] == [4, 5]
+    assert [message.content for message in by_time] == ["Message 4", "Message 5"]
+    assert [message.id for message in direct] == [3]
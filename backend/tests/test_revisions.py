@@ -0,0 +1,69 @@
+import asyncio
+import os
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Any, AsyncGenerator
+
+import pytest
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from src.database.db import create_message, get_message_changes, lock_revisions, next_revision
+from src.database.models.base import Base
+from src.database.models.message import Message
+
+NOW = datetime(2026, 10, 19, tzinfo=timezone.utc)
+
+
+@pytest_asyncio.fixture
+async def session_factory(tmp_path: Any) -> AsyncGenerator[async_sessionmaker[AsyncSession], None]:
+    engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(tmp_path, 'revisions.db')}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield async_sessionmaker(bind=engine, autocommit=False, autoflush=False, expire_on_commit=False)
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_interleaved_writers_commit_in_revision_order(
+    session_factory: async_sessionmaker[AsyncSession],
+) -> None:
+    async with session_factory() as first, session_factory() as second, session_factory() as reader:
+        # The first writer takes its revision and holds its transaction open.
+        await lock_revisions(first, ["general"])
+        first.add(Message(content="first", created_at=NOW, created_by="a", revision=next_revision(first)))
+        await first.flush()
+
+        # The second writer starts meanwhile and has to wait for it.
+        second_write = asyncio.create_task(create_message(second, "second", NOW, "b"))
+        await asyncio.sleep(0.05)
+        assert not second_write.done()
+        assert await get_message_changes(reader, "general", 0, 10) == []
+        await reader.commit()
+
+        await first.commit()
+        synced = await get_message_changes(reader, "general", 0, 10)
+        await reader.commit()
+        await second_write
+
+        # A client that synced right after the first commit gets the rest on its next sync.
+        later = await get_message_changes(reader, "general", synced[-1].revision, 10)
+        changes = [*synced, *later]
+        assert [message.content for message in changes] == ["first", "second"]
+        assert changes[0].revision < changes[1].revision
+
+
+@pytest.mark.asyncio
+async def test_lock_revisions_takes_sorted_room_locks_on_postgres() -> None:
+    statements: list[dict[str, Any]] = []
+
+    async def execute(statement: Any, params: dict[str, Any]) -> None:
+        statements.append(params)
+
+    session: Any = SimpleNamespace(
+        get_bind=lambda: SimpleNamespace(dialect=SimpleNamespace(name="postgresql")), execute=execute
+    )
+
+    await lock_revisions(session, ["random", "general", "random"])
+
+    assert [params["room"] for params in statements] == ["general", "random"]
@@ -0,0 +1,58 @@
+import asyncio
+
+import fakeredis
+import pytest
+
+from src.core.single_flight import LEASE_KEY_PREFIX, SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_concurrent_fills_share_one_query() -> None:
+    redis_connection = fakeredis.FakeAsyncRedis(decode_responses=True)
+    single_flight = SingleFlight(lease_ms=1000, wait=1.0)
+    calls = 0
+
+    async def fill() -> str:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        await redis_connection.set("page", "value")
+        return "value"
+
+    results = await asyncio.gather(*(single_flight.get(redis_connection, "page", fill) for _ in range(5)))
+
+    assert calls == 1
+    assert sorted(results) == [("value", False)] * 4 + [("value", True)]
+    assert await redis_connection.get(LEASE_KEY_PREFIX + "page") is None
+
+
+@pytest.mark.asyncio
+async def test_waits_for_fill_on_another_worker() -> None:
+    redis_connection = fakeredis.FakeAsyncRedis(decode_responses=True)
+    single_flight = SingleFlight(lease_ms=1000, wait=1.0)
+    await redis_connection.set(LEASE_KEY_PREFIX + "page", "other-worker")
+
+    async def fill() -> str:
+        raise AssertionError("the lease holder fills the page")
+
+    async def other_worker_fill() -> None:
+        await asyncio.sleep(0.1)
+        await redis_connection.set("page", "value")
+
+    filler = asyncio.create_task(other_worker_fill())
+    assert await single_flight.get(redis_connection, "page", fill) == ("value", False)
+    await filler
+
+
+@pytest.mark.asyncio
+async def test_fills_after_waiting_in_vain() -> None:
+    redis_connection = fakeredis.FakeAsyncRedis(decode_responses=True)
+    single_flight = SingleFlight(lease_ms=1000, wait=0.1)
+    await redis_connection.set(LEASE_KEY_PREFIX + "page", "stuck-worker")
+
+    async def fill() -> str:
+        return "value"
+
+    assert await single_flight.get(redis_connection, "page", fill) == ("value", True)
+    # The lease of the other worker is not released by this one
+    assert await redis_connection.get(LEASE_KEY_PREFIX + "page") == "stuck-worker"
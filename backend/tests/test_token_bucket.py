@@ -0,0 +1,28 @@
+from time import sleep
+
+from src.core.token_bucket import TokenBucket
+
+
+def test_token_bucket_burst() -> None:
+    bucket = TokenBucket(rate=1, capacity=3)
+
+    assert [bucket.consume() for _ in range(3)] == [0, 0, 0]
+    assert bucket.consume() > 0
+
+
+def test_token_bucket_refill() -> None:
+    bucket = TokenBucket(rate=100, capacity=1)
+    assert bucket.consume() == 0
+
+    wait = bucket.consume()
+    assert 0 < wait <= 0.01
+
+    sleep(wait)
+    assert bucket.consume() == 0
+
+
+def test_token_bucket_without_rate() -> None:
+    bucket = TokenBucket(rate=0, capacity=1)
+    assert bucket.consume() == 0
+
+    assert bucket.consume() == float("inf")
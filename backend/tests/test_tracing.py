@@ -0,0 +1,145 @@
+import json
+import logging
+import os
+from typing import Any
+
+import fakeredis
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from src.core.tracing import (
+    REQUEST_ID_HEADER,
+    FileSpanExporter,
+    Trace,
+    TracedRedis,
+    TracingMiddleware,
+    _trace,
+    current_request_id,
+    instrument_engine,
+    span,
+)
+
+
+def test_spans_outside_a_request_are_not_recorded() -> None:
+    with span("serialize") as opened:
+        assert opened is None
+    assert current_request_id() is None
+
+
+def test_spans_nest_and_break_down_by_name() -> None:
+    trace = Trace()
+    token = _trace.set(trace)
+    try:
+        with span("cache.scan") as outer:
+            with span("redis.scan") as inner:
+                pass
+            with span("redis.scan"):
+                pass
+        assert current_request_id() == trace.request_id
+    finally:
+        _trace.reset(token)
+
+    assert outer is not None and inner is not None
+    assert inner.parent_id == outer.span_id
+    assert outer.parent_id is None
+    assert [(name, count) for name, count, _ in trace.breakdown()] == [("cache.scan", 1), ("redis.scan", 2)]
+
+
+@pytest.mark.asyncio
+async def test_engine_and_redis_spans(tmp_path: Any) -> None:
+    engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(tmp_path, 'tracing.db')}")
+    instrument_engine(engine.sync_engine)
+    redis_connection = TracedRedis(connection_pool=fakeredis.FakeAsyncRedis(decode_responses=True).connection_pool)
+
+    trace = Trace()
+    token = _trace.set(trace)
+    try:
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+        await redis_connection.set("key", "value")
+        assert await redis_connection.get("key") == "value"
+    finally:
+        _trace.reset(token)
+        await engine.dispose()
+
+    db_spans = [recorded for recorded in trace.spans if recorded.name == "db.execute"]
+    assert [recorded.attributes["db.statement"] for recorded in db_spans] == ["SELECT 1"]
+    assert db_spans[0].duration_ns > 0
+    assert [recorded.name for recorded in trace.spans if recorded.name.startswith("redis.")] == [
+        "redis.set",
+        "redis.get",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_failed_statement_span_is_closed(tmp_path: Any) -> None:
+    engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(tmp_path, 'tracing.db')}")
+    instrument_engine(engine.sync_engine)
+
+    trace = Trace()
+    token = _trace.set(trace)
+    try:
+        async with engine.connect() as conn:
+            with pytest.raises(OperationalError):
+                await conn.execute(text("SELECT * FROM missing"))
+            # Nothing left on the pooled connection
+            assert conn.sync_connection is not None
+            assert not conn.sync_connection.info.get("trace_spans")
+    finally:
+        _trace.reset(token)
+        await engine.dispose()
+
+    (failed,) = trace.spans
+    assert failed.attributes["error"] == "OperationalError"
+    assert failed.duration_ns > 0
+
+
+def create_traced_app(**middleware_options: Any) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    async def item(item_id: int) -> dict[str, int]:
+        with span("serialize"):
+            return {"id": item_id}
+
+    app.add_middleware(TracingMiddleware, **middleware_options)
+    return app
+
+
+@pytest.mark.asyncio
+async def test_middleware_logs_slow_requests(caplog: pytest.LogCaptureFixture) -> None:
+    app = create_traced_app(slow_request_ms=1e-6)
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        with caplog.at_level(logging.WARNING, logger="src.core.tracing"):
+            response = await client.get("/items/1")
+
+    request_id = response.headers[REQUEST_ID_HEADER]
+    assert len(request_id) == 32
+    assert "Slow request GET /items/{item_id} took" in caplog.text
+    assert f"[{request_id}]: serialize 1x" in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_middleware_exports_otlp_lines(tmp_path: Any) -> None:
+    path = os.path.join(tmp_path, "traces.jsonl")
+    exporter = FileSpanExporter(path)
+    app = create_traced_app(slow_request_ms=0, exporter=exporter)
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.get("/items/1")
+    exporter.shutdown()
+
+    with open(path, encoding="utf-8") as file:
+        (line,) = file.readlines()
+    spans = json.loads(line)["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    root, child = spans
+    assert root["traceId"] == child["traceId"] == response.headers[REQUEST_ID_HEADER]
+    assert root["name"] == "GET /items/{item_id}"
+    assert {"key": "http.response.status_code", "value": {"intValue": "200"}} in root["attributes"]
+    assert child["name"] == "serialize"
+    assert child["parentSpanId"] == root["spanId"]
@@ -0,0 +1,42 @@
+import json
+
+import msgpack
+import pytest
+
+from src.core.ws_protocol import JSON_PROTOCOL, MSGPACK_PROTOCOL, EncodedFrame, decode_msgpack, negotiate
+
+
+def test_negotiate() -> None:
+    assert negotiate([JSON_PROTOCOL, MSGPACK_PROTOCOL]) == MSGPACK_PROTOCOL
+    assert negotiate([JSON_PROTOCOL]) == JSON_PROTOCOL
+    assert negotiate(["graphql-ws"]) is None
+    assert negotiate([]) is None
+
+
+def test_encoded_frame() -> None:
+    frame = EncodedFrame(json.dumps({"content": "Hi"}))
+    assert msgpack.unpackb(frame.binary) == {"content": "Hi"}
+    assert frame.binary is frame.binary
+
+    assert msgpack.unpackb(EncodedFrame("Hello there").binary) == "Hello there"
+    assert EncodedFrame.from_payload({"userlist": ["testname1"]}).text == '{"userlist": ["testname1"]}'
+
+
+def test_decode_msgpack() -> None:
+    assert json.loads(decode_msgpack(msgpack.packb({"type": "pong"}))) == {"type": "pong"}
+    assert decode_msgpack(msgpack.packb("Hello there")) == "Hello there"
+
+
+@pytest.mark.parametrize(
+    "frame",
+    [
+        b"\xc1",
+        msgpack.packb({"content": b"\x00\x01"}),
+        msgpack.packb({"content": msgpack.ExtType(1, b"x")}),
+        msgpack.packb({1: "not a string key"}),
+        msgpack.packb({"content": "Hi"}) + b"\x00",
+    ],
+)
+def test_decode_msgpack_rejects_frames_json_cannot_carry(frame: bytes) -> None:
+    with pytest.raises(ValueError):
+        decode_msgpack(frame)
@@ -1,2 +1,2 @@
 export const API_BASE_URL = import.meta.env.VITE_API_BASE_URL || 'http://localhost:8000/api/'
-export const WS_BASE_URL = import.meta.env.WS_BASE_URL || 'ws://localhost:8000/api/ws?username='
+export const WS_BASE_URL = import.meta.env.WS_BASE_URL || 'ws://localhost:8000/api/ws?token='
@@ -4,7 +4,7 @@ import { parseTimestamp } from '../utils/dateUtils';
 
 import { WS_BASE_URL } from '../config/api';
 
-export function useWebSocket({ username, onMessage, onOnlineCount, hasTodayMessagesRef }) {
+export function useWebSocket({ username, token, onMessage, onOnlineCount, hasTodayMessagesRef }) {
     const ws = useRef(null);
     const [userlist, setUserlist] = useState([])
     const onMessageRef = useRef(onMessage);
@@ -15,7 +15,7 @@ export function useWebSocket({ username, onMessage, onOnlineCount, hasTodayMessa
     useEffect(() => { onOnlineCountRef.current = onOnlineCount }, [onOnlineCount]);
 
     useEffect(() => {
-        ws.current = new WebSocket(WS_BASE_URL + username);
+        ws.current = new WebSocket(WS_BASE_URL + encodeURIComponent(token));
 
         ws.current.onopen = () => {
             const newMessage = {
@@ -32,8 +32,11 @@ export function useWebSocket({ username, onMessage, onOnlineCount, hasTodayMessa
             );
         };
 
-        ws.current.onmessage = (event) => {
-            const eventJSON = JSON.parse(event.data);
+        const handleEvent = (eventJSON) => {
+            if(eventJSON.type === 'ping') {
+                ws.current.send(JSON.stringify({ type: 'pong' }));
+                return;
+            }
             if(eventJSON.userlist) {
                 var userlist = Object.keys(eventJSON.userlist).map((key) => [key, eventJSON.userlist[key]]);
                 onOnlineCountRef.current && onOnlineCountRef.current(userlist.length);
@@ -89,6 +92,12 @@ export function useWebSocket({ username, onMessage, onOnlineCount, hasTodayMessa
             }
         };
 
+        ws.current.onmessage = (event) => {
+            const eventJSON = JSON.parse(event.data);
+            // Busy rooms get several chat messages batched into one array frame
+            (Array.isArray(eventJSON) ? eventJSON : [eventJSON]).forEach(handleEvent);
+        };
+
         const handleBeforeUnload = () => {
             if (ws.current && ws.current.readyState === WebSocket.OPEN) {
                 const newMessage = {
@@ -117,7 +126,7 @@ export function useWebSocket({ username, onMessage, onOnlineCount, hasTodayMessa
                 ws.current.close();
             }
         };
-    }, [username]);
+    }, [username, token]);
 
     const sendMessage = (msgObj) => {
         if (ws.current && ws.current.readyState === WebSocket.OPEN) {
@@ -19,12 +19,13 @@ export function Chat() {
 	const messagesRef = useRef(messages);
 	const [loading, setLoading] = useState(false);
     const [hasMore, setHasMore] = useState(true);
+	const olderCursorRef = useRef(null);
 	const chatContainerRef = useRef(null);
 	const messagesEndRef = useRef(null);
 	const hasTodayMessagesRef = useRef(false);
 	const [inputValue, setInputValue] = useState('');
 	const inputRef = useRef(null);
-	const { user } = useAuth();
+	const { user, token } = useAuth();
 	const username = user?.username || "";
 	const [onlineUsers, setOnlineUsers] = useState(0);
 	const onMessage = useCallback(
@@ -39,6 +40,7 @@ export function Chat() {
 	);
 	const { ws, sendMessage, userlist } = useWebSocket({
 		username: username,
+		token,
 		onMessage,
 		onOnlineCount,
 		hasTodayMessagesRef
@@ -117,7 +119,8 @@ export function Chat() {
 
 		try {
 			const params = new URLSearchParams();
-			if (firstId !== null) params.append('first_id', firstId);
+			if (olderCursorRef.current !== null) params.append('cursor', olderCursorRef.current);
+			else if (firstId !== null) params.append('first_id', firstId);
 			params.append('limit', 20);
 
 			const response = await makeRequest(`messages?${params.toString()}`, {
@@ -132,7 +135,8 @@ export function Chat() {
 				sender: element.created_by,
 			  }));
 
-			if (olderMessages.length < 20) {
+			olderCursorRef.current = response.before_cursor;
+			if (response.before_cursor === null) {
 				setHasMore(false);
 			}
 